@@ -6,11 +6,30 @@ DB_PORT = 3306
 DB_USER = 'root'
 DB_PASS = '123456'
 DB_NAME = 'smartparking'
+DB_POOL_SIZE = 10               # Số kết nối tối đa trong pool (mỗi request mượn một kết nối)
+DB_POOL_TIMEOUT = 30            # Số giây chờ kết nối rảnh trước khi báo lỗi
+DB_POOL_PING_INTERVAL = 30      # Ping (tự reconnect) kết nối đã rảnh lâu hơn số giây này
 
 # Face Recognition Configuration
 FACE_DETECTION_CONFIDENCE = 0.5  # YOLOv8 detection confidence threshold
 FACE_SIMILARITY_THRESHOLD = 0.6  # Cosine similarity threshold for face matching
 EMBEDDING_DIMENSION = 512         # ArcFace embedding dimension
+EMBEDDING_MICRO_BATCHING = True  # Gom crop khuôn mặt của các request đồng thời thành một lần chạy ArcFace
+EMBEDDING_BATCH_SIZE = 16         # Số crop tối đa mỗi batch
+EMBEDDING_BATCH_WAIT_MS = 5       # Thời gian chờ gom batch tối đa (mili giây)
+EMBEDDING_STORAGE_FORMAT = 'float32'  # 'float32' / 'float16' (BLOB little-endian) hoặc 'json' (cột JSON cũ)
+
+# API Server Configuration
+INFERENCE_WORKERS = 4            # Số thread chạy inference song song (ONNX Runtime nhả GIL)
+INFERENCE_QUEUE_LIMIT = 32       # Số request inference đang chạy + chờ tối đa, vượt quá trả 503
+INFERENCE_TIMEOUT = 30           # Timeout (giây) cho mỗi request inference, quá hạn trả 504
+DB_TIMEOUT = 10                  # Timeout (giây) cho mỗi thao tác database từ API
+
+# ONNX Runtime Configuration
+ORT_SESSION_PROFILE = 'throughput'  # 'latency' (1 request dùng hết core), 'throughput' (nhiều request song song) hoặc 'default'
+ORT_INTRA_OP_THREADS = None         # Số thread mỗi session.run, None = theo profile
+ORT_OPTIMIZED_MODEL_DIR = None      # Thư mục lưu graph đã tối ưu để lần khởi động sau load nhanh (vd '~/.insightface/ort_cache'), None = tắt
+ORT_SHARED_SESSIONS = False         # True = các FaceAnalysis trong cùng process dùng chung session của mỗi model
 
 # Image Processing Configuration
 INPUT_IMAGE_SIZE = (640, 640)    # YOLOv8 input size
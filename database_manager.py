@@ -1,23 +1,187 @@
 import pymysql
 import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
 import numpy as np
-from config import DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME
+from config import (
+    DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME,
+    DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_PING_INTERVAL,
+    EMBEDDING_DIMENSION, EMBEDDING_STORAGE_FORMAT
+)
 import logging
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Kiểu dữ liệu little-endian cho từng định dạng lưu BLOB
+EMBEDDING_DTYPES = {
+    'float32': np.dtype('<f4'),
+    'float16': np.dtype('<f2'),
+}
+
+def encode_embedding(embedding, storage_format=EMBEDDING_STORAGE_FORMAT):
+    """
+    Mã hóa embedding để lưu vào cột embedding
+    
+    Args:
+        embedding (np.ndarray): Vector embedding
+        storage_format (str): 'float32', 'float16' hoặc 'json'
+    
+    Returns:
+        bytes | str: BLOB little-endian hoặc chuỗi JSON
+    """
+    if storage_format == 'json':
+        return json.dumps(np.asarray(embedding, dtype=np.float32).tolist())
+    if storage_format not in EMBEDDING_DTYPES:
+        raise ValueError(f"Định dạng lưu embedding không hợp lệ: {storage_format}")
+    return np.ascontiguousarray(embedding, dtype=EMBEDDING_DTYPES[storage_format]).tobytes()
+
+def decode_embedding(value, dimension=EMBEDDING_DIMENSION):
+    """
+    Giải mã embedding đọc từ database (BLOB float32/float16 hoặc JSON cũ)
+    
+    Args:
+        value (bytes | str): Giá trị cột embedding
+        dimension (int): Số chiều embedding
+    
+    Returns:
+        np.ndarray: Embedding float32
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        nbytes = len(value)
+        if nbytes == dimension * 4:
+            # Zero-copy: view trực tiếp trên buffer trả về từ driver
+            return np.frombuffer(value, dtype=EMBEDDING_DTYPES['float32'])
+        if nbytes == dimension * 2:
+            return np.frombuffer(value, dtype=EMBEDDING_DTYPES['float16']).astype(np.float32)
+        value = bytes(value).decode('utf-8')
+    return np.array(json.loads(value), dtype=np.float32)
+
+class ConnectionPool:
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, ping_interval=DB_POOL_PING_INTERVAL, **connect_kwargs):
+        """
+        Pool kết nối pymysql an toàn cho nhiều thread
+        
+        Mỗi request mượn riêng một kết nối (không dùng chung cursor/socket),
+        kết nối rảnh lâu được ping và tự reconnect trước khi trả ra.
+        
+        Args:
+            size (int): Số kết nối tối đa
+            timeout (float): Số giây chờ kết nối rảnh
+            ping_interval (float): Ping kết nối đã rảnh lâu hơn số giây này
+            **connect_kwargs: Tham số cho pymysql.connect
+        """
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.connect_kwargs = connect_kwargs
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+    
+    def _create_connection(self):
+        return pymysql.connect(**self.connect_kwargs)
+    
+    def acquire(self):
+        """
+        Mượn một kết nối từ pool
+        
+        Returns:
+            pymysql.connections.Connection: Kết nối đã kiểm tra
+        """
+        if self._closed:
+            raise RuntimeError("Connection pool đã đóng")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Không có kết nối database rảnh sau {self.timeout}s (pool size={self.size})")
+        
+        try:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._create_connection()
+            
+            if time.monotonic() - last_used > self.ping_interval:
+                try:
+                    connection.ping(reconnect=True)
+                except Exception as e:
+                    logger.warning(f"Kết nối database hỏng, tạo kết nối mới: {e}")
+                    self._close_quietly(connection)
+                    connection = self._create_connection()
+            return connection
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def release(self, connection, discard=False):
+        """
+        Trả kết nối về pool
+        
+        Args:
+            connection: Kết nối đã mượn
+            discard (bool): Đóng kết nối thay vì trả lại (khi kết nối bị lỗi)
+        """
+        try:
+            if discard or self._closed:
+                self._close_quietly(connection)
+            else:
+                self._idle.put((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+    
+    @contextmanager
+    def connection(self):
+        """Context manager mượn/trả kết nối cho một request"""
+        connection = self.acquire()
+        discard = False
+        try:
+            yield connection
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(connection, discard=discard)
+    
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+    
+    def close(self):
+        """Đóng tất cả kết nối rảnh"""
+        self._closed = True
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_quietly(connection)
+
 class DatabaseManager:
-    def __init__(self):
-        self.connection = None
+    def __init__(self, storage_format=EMBEDDING_STORAGE_FORMAT, pool_size=DB_POOL_SIZE):
+        """
+        Args:
+            storage_format (str): Định dạng lưu embedding khi ghi ('float32', 'float16' hoặc 'json')
+            pool_size (int): Số kết nối tối đa dùng song song
+        """
+        if storage_format != 'json' and storage_format not in EMBEDDING_DTYPES:
+            raise ValueError(f"Định dạng lưu embedding không hợp lệ: {storage_format}")
+        self.storage_format = storage_format
+        self.pool_size = pool_size
+        self.pool = None
         self.connect()
         self.create_table()
+        self.check_embedding_column()
     
     def connect(self):
-        """Kết nối đến MySQL database"""
+        """Tạo connection pool đến MySQL database"""
         try:
-            self.connection = pymysql.connect(
+            self.pool = ConnectionPool(
+                size=self.pool_size,
                 host=DB_HOST,
                 port=DB_PORT,
                 user=DB_USER,
@@ -26,18 +190,30 @@ class DatabaseManager:
                 charset='utf8mb4',
                 autocommit=True
             )
-            logger.info("Đã kết nối thành công đến database")
+            # Kiểm tra kết nối ngay khi khởi động
+            with self.pool.connection() as connection:
+                connection.ping(reconnect=False)
+            logger.info(f"Đã kết nối thành công đến database (pool size={self.pool_size})")
         except Exception as e:
             logger.error(f"Lỗi kết nối database: {e}")
             raise
     
+    @contextmanager
+    def cursor(self):
+        """Mượn một kết nối trong pool và trả về cursor của nó"""
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                yield cursor
+    
     def create_table(self):
         """Tạo bảng faces nếu chưa tồn tại"""
-        create_table_query = """
+        embedding_type = 'JSON' if self.storage_format == 'json' else 'BLOB'
+        create_table_query = f"""
         CREATE TABLE IF NOT EXISTS faces (
             face_id INT AUTO_INCREMENT PRIMARY KEY,
             name VARCHAR(255) NOT NULL,
-            embedding JSON NOT NULL,
+            description TEXT NULL,
+            embedding {embedding_type} NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
             INDEX idx_name (name)
@@ -45,13 +221,42 @@ class DatabaseManager:
         """
         
         try:
-            with self.connection.cursor() as cursor:
+            with self.cursor() as cursor:
                 cursor.execute(create_table_query)
             logger.info("Đã tạo/kiểm tra bảng faces thành công")
         except Exception as e:
             logger.error(f"Lỗi tạo bảng: {e}")
             raise
     
+    def check_embedding_column(self):
+        """
+        Kiểm tra kiểu cột embedding của bảng đã tồn tại
+        
+        Bảng cũ với cột JSON không nhận BLOB, nên ghi JSON cho đến khi
+        chạy migrate_embedding_storage.py
+        """
+        query = """
+        SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'faces' AND COLUMN_NAME = 'embedding'
+        """
+        
+        try:
+            with self.cursor() as cursor:
+                cursor.execute(query, (DB_NAME,))
+                result = cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Lỗi kiểm tra cột embedding: {e}")
+            return
+        
+        # MariaDB báo cột JSON là longtext
+        text_types = ('json', 'text', 'mediumtext', 'longtext')
+        if result and str(result[0]).lower() in text_types and self.storage_format != 'json':
+            logger.warning(
+                f"Cột embedding đang là {result[0]}, tạm lưu JSON thay vì {self.storage_format}. "
+                f"Chạy migrate_embedding_storage.py để chuyển sang BLOB"
+            )
+            self.storage_format = 'json'
+    
     def save_face_embedding(self, name, embedding, description=None):
         """
         Lưu embedding của khuôn mặt vào database
@@ -65,16 +270,14 @@ class DatabaseManager:
             int: ID của record được tạo
         """
         try:
-            # Chuyển numpy array thành list để lưu JSON
-            embedding_list = embedding.tolist()
-            embedding_json = json.dumps(embedding_list)
+            embedding_value = encode_embedding(embedding, self.storage_format)
             
             insert_query = """
             INSERT INTO faces (name, description, embedding) VALUES (%s, %s, %s)
             """
             
-            with self.connection.cursor() as cursor:
-                cursor.execute(insert_query, (name, description, embedding_json))
+            with self.cursor() as cursor:
+                cursor.execute(insert_query, (name, description, embedding_value))
                 face_id = cursor.lastrowid
             
             logger.info(f"Đã lưu embedding cho {name} với ID: {face_id}")
@@ -94,16 +297,15 @@ class DatabaseManager:
         try:
             select_query = "SELECT face_id, name, description, embedding FROM faces"
             
-            with self.connection.cursor() as cursor:
+            with self.cursor() as cursor:
                 cursor.execute(select_query)
                 results = cursor.fetchall()
             
-            # Chuyển JSON string thành numpy array
+            # Giải mã BLOB (zero-copy) hoặc JSON thành numpy array
             face_data = []
             for result in results:
-                face_id, name, description, embedding_json = result[0], result[1], result[2], result[3]
-                embedding_list = json.loads(embedding_json)
-                embedding = np.array(embedding_list, dtype=np.float32)
+                face_id, name, description, embedding_value = result[0], result[1], result[2], result[3]
+                embedding = decode_embedding(embedding_value)
                 face_data.append({
                     'id': face_id, 
                     'name': name, 
@@ -128,7 +330,7 @@ class DatabaseManager:
         try:
             count_query = "SELECT COUNT(*) FROM faces"
             
-            with self.connection.cursor() as cursor:
+            with self.cursor() as cursor:
                 cursor.execute(count_query)
                 result = cursor.fetchone()
                 return result[0] if result else 0
@@ -150,14 +352,13 @@ class DatabaseManager:
         try:
             select_query = "SELECT face_id, name, description, embedding FROM faces WHERE name = %s"
             
-            with self.connection.cursor() as cursor:
+            with self.cursor() as cursor:
                 cursor.execute(select_query, (name,))
                 result = cursor.fetchone()
             
             if result:
-                face_id, name, description, embedding_json = result
-                embedding_list = json.loads(embedding_json)
-                embedding = np.array(embedding_list, dtype=np.float32)
+                face_id, name, description, embedding_value = result
+                embedding = decode_embedding(embedding_value)
                 return (face_id, name, description, embedding)
             
             return None
@@ -180,16 +381,15 @@ class DatabaseManager:
             bool: True nếu cập nhật thành công
         """
         try:
-            embedding_list = embedding.tolist()
-            embedding_json = json.dumps(embedding_list)
+            embedding_value = encode_embedding(embedding, self.storage_format)
             
             update_query = """
             UPDATE faces SET name = %s, description = %s, embedding = %s 
             WHERE face_id = %s
             """
             
-            with self.connection.cursor() as cursor:
-                affected_rows = cursor.execute(update_query, (name, description, embedding_json, face_id))
+            with self.cursor() as cursor:
+                affected_rows = cursor.execute(update_query, (name, description, embedding_value, face_id))
             
             if affected_rows > 0:
                 logger.info(f"Đã cập nhật embedding cho ID: {face_id}")
@@ -215,7 +415,7 @@ class DatabaseManager:
         try:
             delete_query = "DELETE FROM faces WHERE face_id = %s"
             
-            with self.connection.cursor() as cursor:
+            with self.cursor() as cursor:
                 affected_rows = cursor.execute(delete_query, (face_id,))
             
             if affected_rows > 0:
@@ -239,7 +439,7 @@ class DatabaseManager:
         try:
             select_query = "SELECT face_id, name, description, created_at, updated_at FROM faces ORDER BY created_at DESC"
             
-            with self.connection.cursor() as cursor:
+            with self.cursor() as cursor:
                 cursor.execute(select_query)
                 results = cursor.fetchall()
             
@@ -263,7 +463,7 @@ class DatabaseManager:
         try:
             select_query = "SELECT face_id, name, description, created_at, updated_at FROM faces WHERE face_id = %s"
             
-            with self.connection.cursor() as cursor:
+            with self.cursor() as cursor:
                 cursor.execute(select_query, (face_id,))
                 result = cursor.fetchone()
             
@@ -275,8 +475,8 @@ class DatabaseManager:
 
     def close(self):
         """Đóng kết nối database"""
-        if self.connection:
-            self.connection.close()
+        if self.pool:
+            self.pool.close()
             logger.info("Đã đóng kết nối database")
 
 if __name__ == "__main__":
@@ -50,23 +50,17 @@ from scipy.io import loadmat
 #        return inter / union  # [A,B]
 #
 def bbox_overlaps(boxes, query_boxes):
-    n_ = boxes.shape[0]
-    k_ = query_boxes.shape[0]
-    overlaps = np.zeros((n_, k_), dtype=np.float)
-    for k in range(k_):
-        query_box_area = (query_boxes[k, 2] - query_boxes[k, 0] +
-                          1) * (query_boxes[k, 3] - query_boxes[k, 1] + 1)
-        for n in range(n_):
-            iw = min(boxes[n, 2], query_boxes[k, 2]) - max(
-                boxes[n, 0], query_boxes[k, 0]) + 1
-            if iw > 0:
-                ih = min(boxes[n, 3], query_boxes[k, 3]) - max(
-                    boxes[n, 1], query_boxes[k, 1]) + 1
-                if ih > 0:
-                    box_area = (boxes[n, 2] - boxes[n, 0] +
-                                1) * (boxes[n, 3] - boxes[n, 1] + 1)
-                    all_area = float(box_area + query_box_area - iw * ih)
-                    overlaps[n, k] = iw * ih / all_area
+    """(N, K) IoU matrix of boxes against query_boxes, both x1y1x2y2."""
+    iw = (np.minimum(boxes[:, None, 2], query_boxes[None, :, 2]) -
+          np.maximum(boxes[:, None, 0], query_boxes[None, :, 0]) + 1)
+    ih = (np.minimum(boxes[:, None, 3], query_boxes[None, :, 3]) -
+          np.maximum(boxes[:, None, 1], query_boxes[None, :, 1]) + 1)
+    box_area = (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
+    query_box_area = (query_boxes[:, 2] - query_boxes[:, 0] + 1) * (query_boxes[:, 3] - query_boxes[:, 1] + 1)
+    inter = iw * ih
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overlaps = inter / (box_area[:, None] + query_box_area[None, :] - inter)
+    overlaps[(iw <= 0) | (ih <= 0)] = 0
     return overlaps
 
 def bbox_overlap(a, b):
@@ -195,11 +189,10 @@ def get_gt_boxes_from_txt(gt_path, cache_dir):
 def read_pred_file(filepath):
 
     with open(filepath, 'r') as f:
-        lines = f.readlines()
-        img_file = lines[0].rstrip('\n\r')
-        lines = lines[2:]
-
-    boxes = np.array(list(map(lambda x: [float(a) for a in x.rstrip('\r\n').split(' ')], lines))).astype('float')
+        img_file = f.readline().rstrip('\n\r')
+        f.readline()
+        # all box rows at once: x y w h score
+        boxes = np.array(f.read().split(), dtype=np.float64).reshape(-1, 5)
     return img_file.split('/')[-1], boxes
 
 
@@ -246,18 +239,15 @@ def norm_score(pred):
     return pred
 
 
-def image_eval(pred, gt, ignore, iou_thresh, mpp):
+def image_eval(pred, gt, ignore, iou_thresh):
     """ single image evaluation
     pred: Nx5
     gt: Nx4
     ignore:
     """
 
-    
     _pred = pred.copy()
     _gt = gt.copy()
-    pred_recall = np.zeros(_pred.shape[0])
-    recall_list = np.zeros(_gt.shape[0])
     proposal_list = np.ones(_pred.shape[0])
 
     _pred[:, 2] = _pred[:, 2] + _pred[:, 0]
@@ -265,89 +255,44 @@ def image_eval(pred, gt, ignore, iou_thresh, mpp):
     _gt[:, 2] = _gt[:, 2] + _gt[:, 0]
     _gt[:, 3] = _gt[:, 3] + _gt[:, 1]
 
-    gt_overlap_list = mpp.starmap(bbox_overlap, zip([_gt]*_pred.shape[0],[_pred[h] for h in range(_pred.shape[0])]))
-
-    #use_cuda = True
-    #if use_cuda:
-    #    _pred = torch.cuda.FloatTensor(_pred[:,:4])
-    #    _gt = torch.cuda.FloatTensor(_gt)
-    #else:
-    #    _pred = torch.FloatTensor(_pred[:,:4])
-    #    _gt = torch.FloatTensor(_gt)
-
-    #overlaps = jaccard(_pred, _gt).cpu().numpy()
-    #overlaps = compute_iou((_pred[:, :4]), (_gt))
-
-    #overlaps = bbox_overlaps(_pred, _gt)
-
-    #if use_cuda:
-    #    overlaps = overlaps.cpu().numpy()
-    #else:
-    #    overlaps = overlaps.numpy()
-
-    for h in range(_pred.shape[0]):
-
-        #gt_overlap = overlaps[h]
-        #gt_overlap = bbox_overlap(_gt, _pred[h])
-        gt_overlap = gt_overlap_list[h]
-        #if use_cuda:
-        #    gt_overlap = gt_overlap.cpu().numpy()
-        #else:
-        #    gt_overlap = gt_overlap.numpy()
-
-        #max_overlap, max_idx = gt_overlap.max(), gt_overlap.argmax()
-        #gt_overlap = compute_iou(_gt, _pred[h, :4])
-        #exit()
-        #exit()
-        #print ('overlap', gt_overlap)
-        max_overlap, max_idx = gt_overlap.max(), gt_overlap.argmax()
-
-        if max_overlap >= iou_thresh:
-            if ignore[max_idx] == 0:
-                recall_list[max_idx] = -1
-                proposal_list[h] = -1
-            elif recall_list[max_idx] == 0:
-                recall_list[max_idx] = 1
-
-        r_keep_index = np.where(recall_list == 1)[0]
-        pred_recall[h] = len(r_keep_index)
+    overlaps = bbox_overlaps(_pred[:, :4], _gt)
+    max_overlap, max_idx = overlaps.max(axis=1), overlaps.argmax(axis=1)
+    matched = max_overlap >= iou_thresh
+
+    # every pred matched to an ignored gt is dropped from the proposals, a
+    # kept gt is recalled from the first pred matched to it onwards
+    proposal_list[matched & (ignore[max_idx] == 0)] = -1
+    keep_hits = np.where(matched & (ignore[max_idx] != 0))[0]
+    _, first = np.unique(max_idx[keep_hits], return_index=True)
+    recalled = np.zeros(_pred.shape[0])
+    recalled[keep_hits[first]] = 1
+    pred_recall = np.cumsum(recalled)
 
     return pred_recall, proposal_list
 
 
 def img_pr_info(thresh_num, pred_info, proposal_list, pred_recall):
     pr_info = np.zeros((thresh_num, 2)).astype('float')
-    fp = np.zeros((pred_info.shape[0],), dtype=np.int)
-    last_info = [-1, -1]
-    for t in range(thresh_num):
-
-        thresh = 1 - (t+1)/thresh_num
-        r_index = np.where(pred_info[:, 4] >= thresh)[0]
-        if len(r_index) == 0:
-            pr_info[t, 0] = 0
-            pr_info[t, 1] = 0
-        else:
-            r_index = r_index[-1]
-            p_index = np.where(proposal_list[:r_index+1] == 1)[0]
-            pr_info[t, 0] = len(p_index) #valid pred number
-            pr_info[t, 1] = pred_recall[r_index] # valid gt number
-
-            if t>0 and pr_info[t, 0] > pr_info[t-1,0] and pr_info[t, 1]==pr_info[t-1,1]:
-                fp[r_index] = 1
-                #if thresh>=0.85:
-                #    print(thresh, t, pr_info[t])
-    #print(pr_info[:10,0])
-    #print(pr_info[:10,1])
+    fp = np.zeros((pred_info.shape[0],), dtype=int)
+    thresh = 1 - (np.arange(thresh_num) + 1) / thresh_num
+    # r_index: last pred scoring >= thresh, found on the suffix maxima of the
+    # scores so that unsorted predictions are handled too
+    score_max = np.maximum.accumulate(pred_info[::-1, 4])
+    r_index = pred_info.shape[0] - 1 - np.searchsorted(score_max, thresh, side='left')
+    valid = r_index >= 0
+    proposal_count = np.cumsum(proposal_list == 1)
+    pr_info[valid, 0] = proposal_count[r_index[valid]] #valid pred number
+    pr_info[valid, 1] = pred_recall[r_index[valid]] # valid gt number
+
+    new_fp = (pr_info[1:, 0] > pr_info[:-1, 0]) & (pr_info[1:, 1] == pr_info[:-1, 1])
+    fp[r_index[1:][new_fp]] = 1
     return pr_info, fp
 
 
 def dataset_pr_info(thresh_num, pr_curve, count_face):
     _pr_curve = np.zeros((thresh_num, 2))
-    for i in range(thresh_num):
-        #_pr_curve[i, 0] = round(pr_curve[i, 1] / pr_curve[i, 0], 4)
-        #_pr_curve[i, 1] = round(pr_curve[i, 1] / count_face, 4)
-        _pr_curve[i, 0] = pr_curve[i, 1] / pr_curve[i, 0]
-        _pr_curve[i, 1] = pr_curve[i, 1] / count_face
+    _pr_curve[:, 0] = pr_curve[:, 1] / pr_curve[:, 0]
+    _pr_curve[:, 1] = pr_curve[:, 1] / count_face
     return _pr_curve
 
 
@@ -361,8 +306,7 @@ def voc_ap(rec, prec):
     mpre = np.concatenate(([0.], prec, [0.]))
 
     # compute the precision envelope
-    for i in range(mpre.size - 1, 0, -1):
-        mpre[i - 1] = np.maximum(mpre[i - 1], mpre[i])
+    mpre = np.maximum.accumulate(mpre[::-1])[::-1]
 
     # to calculate area under PR curve, look for points
     # where X axis (recall) changes value
@@ -382,9 +326,6 @@ def wider_evaluation(pred, gt_path, iou_thresh=0.5, debug=False):
     event_num = len(event_list)
     settings = ['easy', 'medium', 'hard']
     setting_gts = [easy_gt_list, medium_gt_list, hard_gt_list]
-    from multiprocessing import Pool
-    #from multiprocessing.pool import ThreadPool
-    mpp = Pool(8)
     aps = [-1.0, -1.0, -1.0]
     meta = {}
     #setting_id = 2
@@ -429,7 +370,7 @@ def wider_evaluation(pred, gt_path, iou_thresh=0.5, debug=False):
                 #if len(keep_index) != 0:
                 #    ignore[keep_index-1] = 1
                 #assert len(keep_index)>0
-                ignore = np.zeros(gt_boxes.shape[0], dtype=np.int)
+                ignore = np.zeros(gt_boxes.shape[0], dtype=int)
                 if len(keep_index) != 0:
                     ignore[keep_index-1] = 1
                 pred_info = np_round(pred_info,1)
@@ -442,7 +383,7 @@ def wider_evaluation(pred, gt_path, iou_thresh=0.5, debug=False):
 
                 gt_boxes = np_round(gt_boxes)
                 #ignore = np_round(ignore)
-                pred_recall, proposal_list = image_eval(pred_info, gt_boxes, ignore, iou_th, mpp)
+                pred_recall, proposal_list = image_eval(pred_info, gt_boxes, ignore, iou_th)
                 #print(pred_recall[:10], proposal_list[:10])
                 #print('1 stage', pred_recall, proposal_list)
                 #print(pred_info.shape, pred_recall.shape)
@@ -523,7 +464,7 @@ def get_widerface_gts(gt_path):
                 #if len(keep_index) != 0:
                 #    ignore[keep_index-1] = 1
                 #assert len(keep_index)>0
-                #ignore = np.zeros(gt_boxes.shape[0], dtype=np.int)
+                #ignore = np.zeros(gt_boxes.shape[0], dtype=int)
                 #if len(keep_index) != 0:
                 #    ignore[keep_index-1] = 1
                 #print('ignore:', len(ignore), len(np.where(ignore==1)[0]))
@@ -547,7 +488,7 @@ if __name__ == '__main__':
     parser.add_argument('-g', '--gt', default='./ground_truth/')
 
     args = parser.parse_args()
-    evaluation(args.pred, args.gt)
+    wider_evaluation(get_preds(args.pred), args.gt)
 
 
 
@@ -6,13 +6,9 @@ Flask API để tích hợp với Java Spring Boot backend
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import os
 import base64
 import cv2
 import numpy as np
-from PIL import Image
-import io
-import uuid
 import logging
 from datetime import datetime
 
@@ -29,36 +25,27 @@ CORS(app)  # Cho phép CORS từ Spring Boot
 # Khởi tạo Face Recognition System
 face_system = FaceRecognitionSystem()
 
-# Thư mục lưu ảnh tạm
-TEMP_FOLDER = 'temp_images'
-os.makedirs(TEMP_FOLDER, exist_ok=True)
-
-def save_base64_image(base64_string, filename):
+def read_request_image(image_base64, field_name):
     """
-    Lưu ảnh từ base64 string
+    Lấy nội dung file ảnh từ request (base64 trong JSON hoặc file upload)
     
     Args:
-        base64_string (str): Base64 string của ảnh
-        filename (str): Tên file để lưu
+        image_base64 (str): Base64 string của ảnh (có thể None)
+        field_name (str): Tên field file upload trong form-data
     
     Returns:
-        str: Đường dẫn file đã lưu
+        bytes: Nội dung file ảnh hoặc None nếu không có
     """
     try:
-        # Decode base64
-        image_data = base64.b64decode(base64_string)
-        
-        # Tạo PIL Image
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Lưu file
-        filepath = os.path.join(TEMP_FOLDER, filename)
-        image.save(filepath)
-        
-        return filepath
+        if image_base64:
+            return FaceRecognitionSystem.decode_base64_image(image_base64)
+        if field_name in request.files:
+            file = request.files[field_name]
+            if file.filename != '':
+                return file.read()
     except Exception as e:
-        logger.error(f"Lỗi lưu ảnh base64: {e}")
-        return None
+        logger.error(f"Lỗi đọc ảnh từ request: {e}")
+    return None
 
 def image_to_base64(image_path):
     """
@@ -132,35 +119,17 @@ def register_face():
                 'message': 'Thiếu tham số name'
             }), 400
         
-        # Xử lý ảnh
-        image_path = None
-        
-        if image_base64:
-            # Từ base64
-            filename = f"register_{uuid.uuid4().hex}.jpg"
-            image_path = save_base64_image(image_base64, filename)
-        elif 'image' in request.files:
-            # Từ file upload
-            file = request.files['image']
-            if file.filename != '':
-                filename = f"register_{uuid.uuid4().hex}_{file.filename}"
-                image_path = os.path.join(TEMP_FOLDER, filename)
-                file.save(image_path)
+        # Xử lý ảnh trong bộ nhớ
+        image_bytes = read_request_image(image_base64, 'image')
         
-        if not image_path or not os.path.exists(image_path):
+        if not image_bytes:
             return jsonify({
                 'success': False,
                 'message': 'Không tìm thấy ảnh trong request'
             }), 400
         
         # Đăng ký khuôn mặt
-        result = face_system.register_face(image_path, name)
-        
-        # Xóa file tạm
-        try:
-            os.remove(image_path)
-        except:
-            pass
+        result = face_system.register_face_from_bytes(image_bytes, name, description or None)
         
         if result['success']:
             return jsonify({
@@ -214,43 +183,17 @@ def recognize_face():
             image_base64 = None
             threshold = float(request.form.get('threshold', 0.6))
         
-        # Xử lý ảnh
-        image_path = None
+        # Xử lý ảnh trong bộ nhớ
+        image_bytes = read_request_image(image_base64, 'image')
         
-        if image_base64:
-            # Từ base64
-            filename = f"recognize_{uuid.uuid4().hex}.jpg"
-            image_path = save_base64_image(image_base64, filename)
-        elif 'image' in request.files:
-            # Từ file upload
-            file = request.files['image']
-            if file.filename != '':
-                filename = f"recognize_{uuid.uuid4().hex}_{file.filename}"
-                image_path = os.path.join(TEMP_FOLDER, filename)
-                file.save(image_path)
-        
-        if not image_path or not os.path.exists(image_path):
+        if not image_bytes:
             return jsonify({
                 'success': False,
                 'message': 'Không tìm thấy ảnh trong request'
             }), 400
         
-        # Cập nhật threshold nếu cần
-        original_threshold = face_system.face_processor.face_similarity_threshold
-        if threshold != original_threshold:
-            face_system.face_processor.face_similarity_threshold = threshold
-        
-        # Nhận diện khuôn mặt
-        result = face_system.recognize_face(image_path)
-        
-        # Khôi phục threshold
-        face_system.face_processor.face_similarity_threshold = original_threshold
-        
-        # Xóa file tạm
-        try:
-            os.remove(image_path)
-        except:
-            pass
+        # Nhận diện khuôn mặt (threshold truyền theo request, không sửa state dùng chung)
+        result = face_system.recognize_face_from_bytes(image_bytes, threshold=float(threshold))
         
         if result['success']:
             # Format lại kết quả cho API
@@ -273,7 +216,7 @@ def recognize_face():
                     face_info.update({
                         'person_name': match['person_name'],
                         'match_similarity': float(match['match_similarity']),
-                        'face_id': match.get('face_id', None)
+                        'face_id': match.get('person_id', None)
                     })
                 
                 faces_data.append(face_info)
@@ -331,51 +274,18 @@ def compare_faces():
             image2_base64 = None
             threshold = float(request.form.get('threshold', 0.6))
         
-        # Xử lý ảnh 1
-        image1_path = None
-        if image1_base64:
-            filename1 = f"compare1_{uuid.uuid4().hex}.jpg"
-            image1_path = save_base64_image(image1_base64, filename1)
-        elif 'image1' in request.files:
-            file1 = request.files['image1']
-            if file1.filename != '':
-                filename1 = f"compare1_{uuid.uuid4().hex}_{file1.filename}"
-                image1_path = os.path.join(TEMP_FOLDER, filename1)
-                file1.save(image1_path)
-        
-        # Xử lý ảnh 2
-        image2_path = None
-        if image2_base64:
-            filename2 = f"compare2_{uuid.uuid4().hex}.jpg"
-            image2_path = save_base64_image(image2_base64, filename2)
-        elif 'image2' in request.files:
-            file2 = request.files['image2']
-            if file2.filename != '':
-                filename2 = f"compare2_{uuid.uuid4().hex}_{file2.filename}"
-                image2_path = os.path.join(TEMP_FOLDER, filename2)
-                file2.save(image2_path)
+        # Xử lý ảnh trong bộ nhớ
+        image1_bytes = read_request_image(image1_base64, 'image1')
+        image2_bytes = read_request_image(image2_base64, 'image2')
         
-        if not image1_path or not image2_path:
+        if not image1_bytes or not image2_bytes:
             return jsonify({
                 'success': False,
                 'message': 'Cần cung cấp cả hai ảnh để so sánh'
             }), 400
         
-        if not os.path.exists(image1_path) or not os.path.exists(image2_path):
-            return jsonify({
-                'success': False,
-                'message': 'Không thể lưu ảnh từ request'
-            }), 400
-        
         # So sánh hai ảnh
-        result = face_system.compare_two_images(image1_path, image2_path)
-        
-        # Xóa file tạm
-        try:
-            os.remove(image1_path)
-            os.remove(image2_path)
-        except:
-            pass
+        result = face_system.compare_images_from_bytes(image1_bytes, image2_bytes, threshold=float(threshold))
         
         if result['success']:
             comparison = result['comparison']
@@ -415,7 +325,7 @@ def compare_faces():
 def list_registered_faces():
     """API lấy danh sách tất cả khuôn mặt đã đăng ký"""
     try:
-        embeddings = face_system.db_manager.get_all_face_embeddings()
+        embeddings = face_system.gallery.records()
         
         faces_list = []
         for emb in embeddings:
@@ -445,7 +355,7 @@ def list_registered_faces():
 def delete_face(face_id):
     """API xóa khuôn mặt theo ID"""
     try:
-        success = face_system.db_manager.delete_face_by_id(face_id)
+        success = face_system.delete_face(face_id)
         
         if success:
             return jsonify({
@@ -496,5 +406,6 @@ if __name__ == '__main__':
     app.run(
         host='0.0.0.0',  # Cho phép truy cập từ bên ngoài
         port=5000,       # Port 5000
-        debug=True       # Debug mode
+        debug=True,      # Debug mode
+        threaded=True    # Mỗi request một thread, DB dùng connection pool
     )
\ No newline at end of file
@@ -8,9 +8,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import asyncio
+import threading
 import uvicorn
-import base64
 import logging
 import json
 from io import BytesIO
@@ -20,6 +22,10 @@ import numpy as np
 # Import existing modules
 from face_recognition_system import FaceRecognitionSystem
 from database_manager import DatabaseManager
+from config import (
+    DB_POOL_SIZE, DB_TIMEOUT,
+    INFERENCE_WORKERS, INFERENCE_QUEUE_LIMIT, INFERENCE_TIMEOUT
+)
 
 # Pydantic Models
 class HealthResponse(BaseModel):
@@ -106,10 +112,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class BoundedExecutor:
+    """Bounded thread pool for blocking work: 503 when the queue is full, 504 on timeout"""
+
+    def __init__(self, name: str, max_workers: int, queue_limit: int, timeout: float):
+        self.name = name
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _release(self, _future):
+        # Slot is freed only when the thread finishes, even after a timeout
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"Server busy ({self.name} queue full), retry later"
+                )
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(partial(func, *args, **kwargs))
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"{self.name} job timed out after {self.timeout}s")
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=f"Request timed out after {self.timeout}s"
+            )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
 # Global variables
 face_system = None
 db_manager = None
 
+# Inference (detection + embedding) and DB work run off the event loop
+inference_executor = BoundedExecutor("inference", INFERENCE_WORKERS, INFERENCE_QUEUE_LIMIT, INFERENCE_TIMEOUT)
+db_executor = BoundedExecutor("db", DB_POOL_SIZE, DB_POOL_SIZE * 4, DB_TIMEOUT)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
@@ -118,12 +176,12 @@ async def startup_event():
     try:
         logger.info("🚀 Starting Face Recognition FastAPI Server...")
         
-        # Initialize database
+        # Initialize database (one connection pool shared by all requests)
         db_manager = DatabaseManager()
         logger.info("✅ Database initialized")
         
-        # Initialize face recognition system
-        face_system = FaceRecognitionSystem()
+        # Initialize face recognition system on the same pool
+        face_system = FaceRecognitionSystem(db_manager=db_manager)
         logger.info("✅ Face Recognition System initialized")
         
         logger.info("🎉 FastAPI server started successfully!")
@@ -136,33 +194,45 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     global db_manager
+    inference_executor.shutdown()
+    db_executor.shutdown()
     if db_manager and hasattr(db_manager, 'close'):
         db_manager.close()
     logger.info("👋 FastAPI server shutdown complete")
 
-# Helper functions
-async def validate_base64_image(base64_string: str) -> bool:
-    """Validate base64 image string"""
+# Helper functions (decoding and validation run inside the inference job, not on the event loop)
+def load_image(image, detail: str = "Invalid base64 image format") -> bytes:
+    """Image file bytes from a base64 string or uploaded bytes, 400 if it is not an image"""
     try:
-        if not base64_string:
-            return False
-        
-        # Remove data URL prefix if present
-        if base64_string.startswith('data:image'):
-            base64_string = base64_string.split(',')[1]
-        
-        # Decode and validate
-        image_data = base64.b64decode(base64_string)
-        image = Image.open(BytesIO(image_data))
-        return True
+        if isinstance(image, str):
+            image = FaceRecognitionSystem.decode_base64_image(image)
+        if not image:
+            raise ValueError("empty image")
+        Image.open(BytesIO(image))
+        return image
     except Exception:
-        return False
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
+
+def register_image(image, name: str, description: Optional[str]) -> dict:
+    return face_system.register_face_from_bytes(load_image(image), name, description)
+
+def recognize_image(image, threshold: float) -> dict:
+    return face_system.recognize_best_face_from_bytes(load_image(image), threshold)
 
-async def process_uploaded_file(file: UploadFile) -> str:
-    """Convert uploaded file to base64"""
+def compare_images(image1, image2, threshold: float) -> dict:
+    return face_system.compare_faces_from_bytes(
+        load_image(image1, "Invalid first image format"),
+        load_image(image2, "Invalid second image format"),
+        threshold
+    )
+
+async def read_uploaded_file(file: UploadFile) -> bytes:
+    """Read uploaded file contents"""
     try:
-        contents = await file.read()
-        return base64.b64encode(contents).decode('utf-8')
+        return await file.read()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -182,9 +252,9 @@ async def root():
 async def health_check():
     """Health check endpoint"""
     try:
-        # Test database connection
+        # Test database connection (cheap query, never queued behind inference)
         if db_manager:
-            db_manager.get_all_faces()
+            await db_executor.run(db_manager.get_total_faces)
         
         return HealthResponse(
             message="All systems operational"
@@ -207,23 +277,16 @@ async def test_endpoint():
 @app.post("/api/v1/simple-face/register", response_model=FaceRegisterResponse)
 async def register_face(request: FaceRegisterRequest):
     """Register a new face"""
+    return await run_register(request.image, request.name, request.description)
+
+async def run_register(image, name: str, description: Optional[str]) -> FaceRegisterResponse:
+    """Register a face from a base64 string or uploaded bytes"""
     import time
     start_time = time.time()
     
     try:
-        # Validate base64 image
-        if not await validate_base64_image(request.image):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid base64 image format"
-            )
-        
-        # Register face from base64
-        result = face_system.register_face_from_base64(
-            base64_image=request.image,
-            person_name=request.name,
-            description=request.description
-        )
+        # Decode, validate and register in one inference job
+        result = await inference_executor.run(register_image, image, name, description)
         
         processing_time = time.time() - start_time
         
@@ -241,6 +304,8 @@ async def register_face(request: FaceRegisterRequest):
                 processing_time=processing_time
             )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Face registration error: {str(e)}")
         processing_time = time.time() - start_time
@@ -258,18 +323,8 @@ async def register_face_file(
 ):
     """Register face from uploaded file"""
     try:
-        # Convert file to base64
-        base64_image = await process_uploaded_file(file)
-        
-        # Create request object
-        request = FaceRegisterRequest(
-            name=name,
-            image=base64_image,
-            description=description
-        )
-        
-        # Use existing register endpoint
-        return await register_face(request)
+        contents = await read_uploaded_file(file)
+        return await run_register(contents, name, description)
     
     except HTTPException:
         raise
@@ -283,22 +338,16 @@ async def register_face_file(
 @app.post("/api/v1/simple-face/recognize", response_model=FaceRecognizeResponse)
 async def recognize_face(request: FaceRecognizeRequest):
     """Recognize a face"""
+    return await run_recognize(request.image, request.threshold)
+
+async def run_recognize(image, threshold: float) -> FaceRecognizeResponse:
+    """Recognize a face from a base64 string or uploaded bytes"""
     import time
     start_time = time.time()
     
     try:
-        # Validate base64 image
-        if not await validate_base64_image(request.image):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid base64 image format"
-            )
-        
-        # Recognize face from base64
-        result = face_system.recognize_face_from_base64(
-            base64_image=request.image,
-            threshold=request.threshold
-        )
+        # Decode, validate and recognize in one inference job
+        result = await inference_executor.run(recognize_image, image, threshold)
         
         processing_time = time.time() - start_time
         
@@ -312,6 +361,8 @@ async def recognize_face(request: FaceRecognizeRequest):
             processing_time=processing_time
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Face recognition error: {str(e)}")
         processing_time = time.time() - start_time
@@ -328,17 +379,8 @@ async def recognize_face_file(
 ):
     """Recognize face from uploaded file"""
     try:
-        # Convert file to base64
-        base64_image = await process_uploaded_file(file)
-        
-        # Create request object
-        request = FaceRecognizeRequest(
-            image=base64_image,
-            threshold=threshold
-        )
-        
-        # Use existing recognize endpoint
-        return await recognize_face(request)
+        contents = await read_uploaded_file(file)
+        return await run_recognize(contents, threshold)
     
     except HTTPException:
         raise
@@ -352,29 +394,16 @@ async def recognize_face_file(
 @app.post("/api/v1/simple-face/compare", response_model=FaceCompareResponse)
 async def compare_faces(request: FaceCompareRequest):
     """Compare two faces"""
+    return await run_compare(request.image1, request.image2, request.threshold)
+
+async def run_compare(image1, image2, threshold: float) -> FaceCompareResponse:
+    """Compare two faces from base64 strings or uploaded bytes"""
     import time
     start_time = time.time()
     
     try:
-        # Validate both images
-        if not await validate_base64_image(request.image1):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid first image format"
-            )
-        
-        if not await validate_base64_image(request.image2):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid second image format"
-            )
-        
-        # Compare faces from base64
-        result = face_system.compare_faces_from_base64(
-            base64_image1=request.image1,
-            base64_image2=request.image2,
-            threshold=request.threshold
-        )
+        # Decode, validate and compare in one inference job
+        result = await inference_executor.run(compare_images, image1, image2, threshold)
         
         processing_time = time.time() - start_time
         
@@ -386,6 +415,8 @@ async def compare_faces(request: FaceCompareRequest):
             processing_time=processing_time
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Face comparison error: {str(e)}")
         processing_time = time.time() - start_time
@@ -403,19 +434,9 @@ async def compare_faces_files(
 ):
     """Compare two faces from uploaded files"""
     try:
-        # Convert files to base64
-        base64_image1 = await process_uploaded_file(file1)
-        base64_image2 = await process_uploaded_file(file2)
-        
-        # Create request object
-        request = FaceCompareRequest(
-            image1=base64_image1,
-            image2=base64_image2,
-            threshold=threshold
-        )
-        
-        # Use existing compare endpoint
-        return await compare_faces(request)
+        contents1 = await read_uploaded_file(file1)
+        contents2 = await read_uploaded_file(file2)
+        return await run_compare(contents1, contents2, threshold)
     
     except HTTPException:
         raise
@@ -430,7 +451,7 @@ async def compare_faces_files(
 async def list_faces():
     """Get all registered faces"""
     try:
-        faces = db_manager.get_all_faces()
+        faces = await db_executor.run(db_manager.get_all_faces)
         
         face_info_list = []
         for face in faces:
@@ -470,15 +491,15 @@ async def delete_face(face_id: int):
             )
         
         # Check if face exists
-        face = db_manager.get_face_by_id(face_id)
+        face = await db_executor.run(db_manager.get_face_by_id, face_id)
         if not face:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Face not found"
             )
         
-        # Delete face
-        success = db_manager.delete_face(face_id)
+        # Delete face (database + in-memory gallery)
+        success = await db_executor.run(face_system.delete_face, face_id)
         
         if success:
             return DeleteFaceResponse(
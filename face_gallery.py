@@ -0,0 +1,299 @@
+import threading
+import numpy as np
+import logging
+from config import EMBEDDING_DIMENSION
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def match_embeddings(query_embeddings, gallery_embeddings, top_k=1):
+    """
+    Tìm top-k embedding gần nhất cho một batch query bằng một phép nhân ma trận
+
+    Args:
+        query_embeddings (np.ndarray): (Q, D) hoặc (D,) embedding cần tìm
+        gallery_embeddings (np.ndarray): (N, D) embedding đã normalize
+        top_k (int): Số kết quả cho mỗi query
+
+    Returns:
+        tuple: (indices (Q, k), scores (Q, k)) sắp xếp giảm dần theo similarity
+    """
+    queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    queries = queries / np.maximum(norms, 1e-12)
+
+    num_gallery = gallery_embeddings.shape[0]
+    k = min(int(top_k), num_gallery)
+    if k <= 0:
+        empty = np.zeros((queries.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    scores = queries @ gallery_embeddings.T
+    if k == 1:
+        indices = np.argmax(scores, axis=1)[:, None]
+        return indices, np.take_along_axis(scores, indices, axis=1)
+
+    if k < num_gallery:
+        indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(num_gallery), scores.shape)
+    top_scores = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+class FaceGallery:
+    def __init__(self, dimension=EMBEDDING_DIMENSION, initial_capacity=1024):
+        """
+        Gallery embedding nằm trong bộ nhớ của process
+
+        Embedding được lưu liền nhau trong một ma trận float32 (đã normalize),
+        kèm mảng id/name/description song song. Nhận diện chỉ đọc gallery,
+        không truy vấn database trên hot path.
+
+        Args:
+            dimension (int): Số chiều embedding
+            initial_capacity (int): Số dòng cấp phát ban đầu
+        """
+        self.dimension = dimension
+        # Copy-on-write: match() chỉ lấy view của các mảng trong lock rồi tính
+        # ngoài lock, nên các dòng đã có không bao giờ bị sửa tại chỗ
+        self._lock = threading.RLock()
+        self._reset(initial_capacity)
+
+    def _reset(self, capacity):
+        capacity = max(int(capacity), 1)
+        self._embeddings = np.zeros((capacity, self.dimension), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._names = []
+        self._descriptions = []
+        self._index = {}
+        self._size = 0
+
+    def _ensure_capacity(self, capacity):
+        if capacity <= self._embeddings.shape[0]:
+            return
+        new_capacity = max(capacity, self._embeddings.shape[0] * 2)
+        embeddings = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+        embeddings[:self._size] = self._embeddings[:self._size]
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._embeddings = embeddings
+        self._ids = ids
+
+    def _detach(self):
+        # Thay mảng/list bằng bản sao trước khi sửa các dòng reader có thể đang đọc
+        self._embeddings = self._embeddings.copy()
+        self._ids = self._ids.copy()
+        self._names = list(self._names)
+
+    def _normalize(self, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if embedding.shape[0] != self.dimension:
+            raise ValueError(f"Embedding phải có {self.dimension} chiều, nhận được {embedding.shape[0]}")
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding = embedding / norm
+        return embedding
+
+    def load(self, db_manager):
+        """
+        Nạp toàn bộ embedding từ database (chỉ gọi khi khởi động hoặc reload)
+
+        Args:
+            db_manager (DatabaseManager): Database manager
+
+        Returns:
+            int: Số khuôn mặt đã nạp
+        """
+        face_data = db_manager.get_all_face_embeddings()
+
+        with self._lock:
+            self._reset(max(len(face_data), 1))
+            for face in face_data:
+                self.add(face['id'], face['name'], face['embedding'], face.get('description'))
+
+        logger.info(f"Đã nạp {len(face_data)} embedding vào gallery")
+        return len(face_data)
+
+    def add(self, face_id, name, embedding, description=None):
+        """
+        Thêm (hoặc thay thế) một khuôn mặt trong gallery
+
+        Args:
+            face_id (int): ID của face trong database
+            name (str): Tên của người
+            embedding (np.ndarray): Vector embedding
+            description (str, optional): Mô tả
+        """
+        embedding = self._normalize(embedding)
+
+        with self._lock:
+            row = self._index.get(face_id)
+            if row is not None:
+                self._detach()
+                self._embeddings[row] = embedding
+                self._names[row] = name
+                self._descriptions[row] = description
+                return
+
+            self._ensure_capacity(self._size + 1)
+            row = self._size
+            self._embeddings[row] = embedding
+            self._ids[row] = face_id
+            self._names.append(name)
+            self._descriptions.append(description)
+            self._index[face_id] = row
+            self._size += 1
+
+    def update(self, face_id, name, embedding, description=None):
+        """
+        Cập nhật khuôn mặt đã có trong gallery
+
+        Returns:
+            bool: True nếu face_id tồn tại trong gallery
+        """
+        with self._lock:
+            if face_id not in self._index:
+                return False
+            self.add(face_id, name, embedding, description)
+            return True
+
+    def remove(self, face_id):
+        """
+        Xóa khuôn mặt khỏi gallery (đưa dòng cuối vào chỗ trống để ma trận liền nhau)
+
+        Returns:
+            bool: True nếu face_id tồn tại trong gallery
+        """
+        with self._lock:
+            row = self._index.pop(face_id, None)
+            if row is None:
+                return False
+
+            last = self._size - 1
+            self._detach()
+            if row != last:
+                self._embeddings[row] = self._embeddings[last]
+                self._ids[row] = self._ids[last]
+                self._names[row] = self._names[last]
+                self._descriptions[row] = self._descriptions[last]
+                self._index[int(self._ids[row])] = row
+
+            self._names.pop()
+            self._descriptions.pop()
+            self._size = last
+            return True
+
+    def match(self, query_embeddings, threshold, top_k=1):
+        """
+        So khớp một batch embedding với gallery
+
+        Args:
+            query_embeddings (np.ndarray): (Q, D) hoặc (D,) embedding cần tìm
+            threshold (float): Ngưỡng similarity
+            top_k (int): Số ứng viên trả về cho mỗi query
+
+        Returns:
+            list: Mỗi query một dict {'best_match', 'best_similarity', 'threshold',
+                  'found_match', 'candidates'} giống find_matching_face, thêm
+                  'nearest' là top_k ứng viên chưa lọc theo ngưỡng
+        """
+        with self._lock:
+            embeddings = self._embeddings[:self._size]
+            gallery_ids = self._ids[:self._size]
+            gallery_names = self._names
+
+        indices, scores = match_embeddings(query_embeddings, embeddings, top_k)
+        ids = gallery_ids[indices]
+        names = [[gallery_names[i] for i in row] for row in indices]
+
+        results = []
+        for q in range(indices.shape[0]):
+            candidates = [
+                {
+                    'id': int(ids[q, j]),
+                    'name': names[q][j],
+                    'similarity': float(scores[q, j]),
+                    'confidence': float(scores[q, j]) - threshold
+                }
+                for j in range(indices.shape[1])
+            ]
+            best_similarity = candidates[0]['similarity'] if candidates else 0.0
+            best_match = candidates[0] if candidates and best_similarity >= threshold else None
+            results.append({
+                'best_match': best_match,
+                'best_similarity': best_similarity,
+                'threshold': threshold,
+                'found_match': best_match is not None,
+                'candidates': [c for c in candidates if c['similarity'] >= threshold],
+                'nearest': candidates
+            })
+        return results
+
+    def snapshot(self):
+        """
+        Lấy bản chụp nhất quán của gallery để so khớp
+
+        Returns:
+            tuple: (embeddings (N, D) float32, ids (N,) int64, names list)
+        """
+        with self._lock:
+            return (
+                self._embeddings[:self._size].copy(),
+                self._ids[:self._size].copy(),
+                list(self._names)
+            )
+
+    def records(self):
+        """
+        Gallery dưới dạng list dict giống get_all_face_embeddings()
+
+        Returns:
+            list: Danh sách dict {'id', 'name', 'description', 'embedding'}
+        """
+        with self._lock:
+            return [
+                {
+                    'id': int(self._ids[i]),
+                    'name': self._names[i],
+                    'description': self._descriptions[i],
+                    'embedding': self._embeddings[i].copy()
+                }
+                for i in range(self._size)
+            ]
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, face_id):
+        return face_id in self._index
+
+if __name__ == "__main__":
+    import time
+
+    # Test gallery
+    gallery = FaceGallery()
+
+    for i in range(5):
+        gallery.add(i + 1, f"Person {i + 1}", np.random.rand(EMBEDDING_DIMENSION).astype(np.float32))
+
+    gallery.remove(2)
+    embeddings, ids, names = gallery.snapshot()
+    print(f"Gallery size: {len(gallery)}, ids: {ids.tolist()}, names: {names}")
+    print(f"Norms: {np.linalg.norm(embeddings, axis=1)}")
+
+    # Benchmark so khớp với gallery lớn
+    num_faces = 100000
+    big_gallery = FaceGallery(initial_capacity=num_faces)
+    embeddings = np.random.randn(num_faces, EMBEDDING_DIMENSION).astype(np.float32)
+    for i in range(num_faces):
+        big_gallery.add(i + 1, f"Person {i + 1}", embeddings[i])
+
+    query = embeddings[1234] + 0.1 * np.random.randn(EMBEDDING_DIMENSION).astype(np.float32)
+    big_gallery.match(query, threshold=0.6, top_k=5)
+    start = time.time()
+    for _ in range(20):
+        result = big_gallery.match(query, threshold=0.6, top_k=5)[0]
+    elapsed = (time.time() - start) / 20
+    print(f"Match 1 query vs {num_faces} faces: {elapsed * 1000:.2f} ms, best: {result['best_match']}")
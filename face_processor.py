@@ -3,13 +3,24 @@ import numpy as np
 from ultralytics import YOLO
 import insightface
 from insightface.app import FaceAnalysis
+from insightface.app.common import FaceBatch
+from insightface.utils import face_align
 import logging
+from face_gallery import FaceGallery
+from micro_batcher import MicroBatcher
 from config import (
     FACE_DETECTION_CONFIDENCE, 
     FACE_SIMILARITY_THRESHOLD,
     EMBEDDING_DIMENSION,
+    EMBEDDING_MICRO_BATCHING,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WAIT_MS,
     INPUT_IMAGE_SIZE,
-    FACE_CROP_SIZE
+    FACE_CROP_SIZE,
+    ORT_SESSION_PROFILE,
+    ORT_INTRA_OP_THREADS,
+    ORT_OPTIMIZED_MODEL_DIR,
+    ORT_SHARED_SESSIONS
 )
 
 # Setup logging
@@ -42,12 +53,30 @@ class FaceProcessor:
         
         # Khởi tạo InsightFace
         try:
-            self.face_app = FaceAnalysis(providers=['CPUExecutionProvider'])
+            self.face_app = FaceAnalysis(
+                providers=['CPUExecutionProvider'],
+                session_profile=ORT_SESSION_PROFILE,
+                intra_op_num_threads=ORT_INTRA_OP_THREADS,
+                optimized_model_dir=ORT_OPTIMIZED_MODEL_DIR,
+                shared_session=ORT_SHARED_SESSIONS
+            )
             self.face_app.prepare(ctx_id=0, det_size=(640, 640))
             logger.info("Đã khởi tạo InsightFace thành công")
         except Exception as e:
             logger.error(f"Lỗi khởi tạo InsightFace: {e}")
             raise
+        
+        # Gom crop của các request đồng thời thành một lần chạy model recognition
+        self.rec_model = self.face_app.models.get('recognition')
+        self.embedding_batcher = None
+        if EMBEDDING_MICRO_BATCHING and self.rec_model is not None:
+            self.embedding_batcher = MicroBatcher(
+                self._embed_crops,
+                max_batch_size=EMBEDDING_BATCH_SIZE,
+                max_wait_ms=EMBEDDING_BATCH_WAIT_MS,
+                name='embedding-batcher'
+            )
+            logger.info(f"Bật micro-batching embedding (batch={EMBEDDING_BATCH_SIZE}, wait={EMBEDDING_BATCH_WAIT_MS}ms)")
     
     def detect_faces_yolo(self, image):
         """
@@ -100,19 +129,25 @@ class FaceProcessor:
             list: Danh sách các dict chứa face info và embedding
         """
         try:
-            faces = self.face_app.get(image)
+            if self.embedding_batcher is not None:
+                faces = self._detect_and_embed(image)
+            else:
+                faces = self.face_app.get(image, as_batch=True)
             
             face_data = []
-            for face in faces:
-                if face.embedding is not None:
-                    # Normalize embedding
-                    embedding = face.normed_embedding
-                    
+            if len(faces) > 0 and faces.embeddings is not None:
+                # Normalize toàn bộ embedding một lần trên mảng (N, D)
+                embeddings = faces.normed_embeddings
+                bboxes = faces.bboxes.astype(int).tolist()
+                scores = faces.det_scores.tolist() if faces.det_scores is not None else [1.0] * len(faces)
+                landmarks = faces.kpss.astype(int).tolist() if faces.kpss is not None else [None] * len(faces)
+                
+                for i in range(len(faces)):
                     face_info = {
-                        'bbox': face.bbox.astype(int).tolist(),
-                        'embedding': embedding,
-                        'confidence': float(face.det_score) if hasattr(face, 'det_score') else 1.0,
-                        'landmarks': face.kps.astype(int).tolist() if face.kps is not None else None
+                        'bbox': bboxes[i],
+                        'embedding': embeddings[i],
+                        'confidence': float(scores[i]),
+                        'landmarks': landmarks[i]
                     }
                     face_data.append(face_info)
             
@@ -123,6 +158,46 @@ class FaceProcessor:
             logger.error(f"Lỗi trích xuất embedding: {e}")
             return []
     
+    def _embed_crops(self, crops):
+        """Chạy model recognition một lần cho cả batch crop đã align"""
+        return list(self.rec_model.get_feat(crops))
+    
+    def _detect_and_embed(self, image):
+        """
+        Detect faces rồi trích xuất embedding qua micro-batcher
+        
+        Chỉ chạy detection và recognition (các model landmark/genderage
+        không được dùng ở đây nên được bỏ qua).
+        
+        Args:
+            image (np.ndarray): Ảnh đầu vào
+        
+        Returns:
+            FaceBatch: bboxes, kpss, det_scores, embeddings dạng mảng xếp chồng
+        """
+        bboxes, kpss = self.face_app.det_model.detect(image, max_num=0, metric='default')
+        if bboxes.shape[0] == 0:
+            return FaceBatch.from_faces([])
+        if kpss is None:
+            return self.face_app.get(image, as_batch=True)
+        
+        image_size = self.rec_model.input_size[0]
+        crops = face_align.norm_crop_batch(image, kpss, image_size=image_size)
+        embeddings = self.embedding_batcher.map(crops)
+        
+        return FaceBatch(
+            bboxes=bboxes[:, 0:4],
+            kpss=kpss,
+            det_scores=bboxes[:, 4],
+            embeddings=np.stack([embedding.flatten() for embedding in embeddings])
+        )
+    
+    def close(self):
+        """Dừng micro-batcher"""
+        if self.embedding_batcher is not None:
+            self.embedding_batcher.close()
+            self.embedding_batcher = None
+    
     def process_image(self, image_path):
         """
         Xử lý ảnh hoàn chỉnh: detect faces và extract embeddings
@@ -140,6 +215,47 @@ class FaceProcessor:
                 logger.error(f"Không thể đọc ảnh: {image_path}")
                 return None
             
+            return self.process_array(image, image_path=image_path)
+            
+        except Exception as e:
+            logger.error(f"Lỗi xử lý ảnh {image_path}: {e}")
+            return None
+    
+    def process_bytes(self, image_bytes):
+        """
+        Xử lý ảnh đã mã hóa (JPEG/PNG...) trực tiếp trong bộ nhớ, không ghi file tạm
+        
+        Args:
+            image_bytes (bytes): Nội dung file ảnh
+        
+        Returns:
+            dict: Kết quả xử lý bao gồm face info và embeddings
+        """
+        try:
+            buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+            image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+            if image is None:
+                logger.error("Không thể giải mã ảnh từ bytes")
+                return None
+            
+            return self.process_array(image)
+            
+        except Exception as e:
+            logger.error(f"Lỗi xử lý ảnh từ bytes: {e}")
+            return None
+    
+    def process_array(self, image, image_path=None):
+        """
+        Xử lý ảnh đã giải mã: detect faces và extract embeddings
+        
+        Args:
+            image (np.ndarray): Ảnh BGR (như cv2.imread/cv2.imdecode trả về)
+            image_path (str, optional): Đường dẫn gốc để ghi vào kết quả
+        
+        Returns:
+            dict: Kết quả xử lý bao gồm face info và embeddings
+        """
+        try:
             # Chuyển sang RGB cho InsightFace
             image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
@@ -156,7 +272,7 @@ class FaceProcessor:
             return result
             
         except Exception as e:
-            logger.error(f"Lỗi xử lý ảnh {image_path}: {e}")
+            logger.error(f"Lỗi xử lý ảnh: {e}")
             return None
     
     @staticmethod
@@ -215,41 +331,40 @@ class FaceProcessor:
         
         Args:
             query_embedding (np.ndarray): Embedding cần tìm
-            database_embeddings (list): List các tuple (id, name, embedding)
+            database_embeddings (list | FaceGallery): List các dict {'id', 'name', 'embedding'}
+                hoặc FaceGallery đã nạp sẵn
             threshold (float): Ngưỡng similarity
         
         Returns:
             dict: Kết quả tìm kiếm
         """
+        return self.find_matching_faces([query_embedding], database_embeddings, threshold)[0]
+    
+    def find_matching_faces(self, query_embeddings, database_embeddings, threshold=None, top_k=1):
+        """
+        Tìm face matching cho nhiều embedding cùng lúc (một phép nhân ma trận)
+        
+        Args:
+            query_embeddings (list | np.ndarray): Các embedding cần tìm, shape (Q, D)
+            database_embeddings (list | FaceGallery): List các dict {'id', 'name', 'embedding'}
+                hoặc FaceGallery đã nạp sẵn
+            threshold (float): Ngưỡng similarity
+            top_k (int): Số ứng viên trả về cho mỗi embedding
+        
+        Returns:
+            list: Mỗi embedding một dict kết quả tìm kiếm
+        """
         if threshold is None:
             threshold = self.face_similarity_threshold
         
-        best_match = None
-        best_similarity = 0.0
+        if isinstance(database_embeddings, FaceGallery):
+            gallery = database_embeddings
+        else:
+            gallery = FaceGallery(initial_capacity=len(database_embeddings))
+            for db_face in database_embeddings:
+                gallery.add(db_face['id'], db_face['name'], db_face['embedding'])
         
-        for db_face in database_embeddings:
-            face_id = db_face['id']
-            name = db_face['name']  
-            db_embedding = db_face['embedding']
-            
-            similarity = self.calculate_cosine_similarity(query_embedding, db_embedding)
-            
-            if similarity > best_similarity:
-                best_similarity = similarity
-                if similarity >= threshold:
-                    best_match = {
-                        'id': face_id,
-                        'name': name,
-                        'similarity': similarity,
-                        'confidence': similarity - threshold
-                    }
-        
-        return {
-            'best_match': best_match,
-            'best_similarity': best_similarity,
-            'threshold': threshold,
-            'found_match': best_match is not None
-        }
+        return gallery.match(np.asarray(query_embeddings, dtype=np.float32), threshold, top_k=top_k)
 
 import os
 
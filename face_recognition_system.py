@@ -3,6 +3,7 @@ import numpy as np
 import os
 from face_processor import FaceProcessor
 from database_manager import DatabaseManager
+from face_gallery import FaceGallery
 import logging
 from config import TEST_IMAGE_1, TEST_IMAGE_2
 
@@ -10,13 +11,42 @@ from config import TEST_IMAGE_1, TEST_IMAGE_2
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Số khuôn mặt gần nhất trả về trong debug_similarities khi không tìm thấy match
+DEBUG_SIMILARITY_TOP_K = 5
+
 class FaceRecognitionSystem:
-    def __init__(self):
-        """Khởi tạo hệ thống nhận diện khuôn mặt"""
+    def __init__(self, db_manager=None):
+        """
+        Khởi tạo hệ thống nhận diện khuôn mặt
+        
+        Args:
+            db_manager (DatabaseManager, optional): Dùng chung connection pool có sẵn
+        """
         self.face_processor = FaceProcessor()
-        self.db_manager = DatabaseManager()
+        self.db_manager = db_manager if db_manager is not None else DatabaseManager()
+        
+        # Gallery embedding trong bộ nhớ, nạp một lần khi khởi động
+        self.gallery = FaceGallery()
+        self.gallery.load(self.db_manager)
         logger.info("Đã khởi tạo Face Recognition System")
     
+    @staticmethod
+    def decode_base64_image(base64_image):
+        """
+        Giải mã base64 (có hoặc không có tiền tố data URL) thành bytes của file ảnh
+        
+        Args:
+            base64_image (str): Base64 encoded image
+        
+        Returns:
+            bytes: Nội dung file ảnh
+        """
+        import base64
+        
+        if base64_image.startswith('data:image'):
+            base64_image = base64_image.split(',')[1]
+        return base64.b64decode(base64_image)
+    
     def register_face_from_base64(self, base64_image, person_name, description=None):
         """
         Đăng ký khuôn mặt từ base64 image
@@ -29,32 +59,9 @@ class FaceRecognitionSystem:
         Returns:
             dict: Kết quả đăng ký
         """
-        import tempfile
-        import base64
-        from PIL import Image
-        from io import BytesIO
-        
         try:
-            # Decode base64 to image
-            if base64_image.startswith('data:image'):
-                base64_image = base64_image.split(',')[1]
-            
-            image_data = base64.b64decode(base64_image)
-            image = Image.open(BytesIO(image_data))
-            
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-                image.save(temp_file.name, 'JPEG')
-                temp_path = temp_file.name
-            
-            # Use existing register_face method
-            result = self.register_face(temp_path, person_name, description)
-            
-            # Clean up temp file
-            import os
-            os.unlink(temp_path)
-            
-            return result
+            image_data = self.decode_base64_image(base64_image)
+            return self.register_face_from_bytes(image_data, person_name, description)
             
         except Exception as e:
             logger.error(f"Lỗi đăng ký từ base64: {e}")
@@ -75,30 +82,29 @@ class FaceRecognitionSystem:
         Returns:
             dict: Kết quả nhận diện
         """
-        import tempfile
-        import base64
-        from PIL import Image
-        from io import BytesIO
+        try:
+            image_data = self.decode_base64_image(base64_image)
+        except Exception as e:
+            logger.error(f"Lỗi nhận diện từ base64: {e}")
+            return {
+                'success': False,
+                'message': f'Lỗi xử lý ảnh base64: {str(e)}'
+            }
+        return self.recognize_best_face_from_bytes(image_data, threshold)
+
+    def recognize_best_face_from_bytes(self, image_bytes, threshold=0.6):
+        """
+        Nhận diện khuôn mặt đầu tiên trong nội dung file ảnh, trả về match tốt nhất
+        
+        Args:
+            image_bytes (bytes): Nội dung file ảnh (JPEG/PNG...)
+            threshold (float): Ngưỡng similarity
         
+        Returns:
+            dict: Kết quả nhận diện (giống recognize_face_from_base64)
+        """
         try:
-            # Decode base64 to image
-            if base64_image.startswith('data:image'):
-                base64_image = base64_image.split(',')[1]
-            
-            image_data = base64.b64decode(base64_image)
-            image = Image.open(BytesIO(image_data))
-            
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-                image.save(temp_file.name, 'JPEG')
-                temp_path = temp_file.name
-            
-            # Process image and extract embedding
-            face_result = self.face_processor.process_image(temp_path)
-            
-            # Clean up temp file
-            import os
-            os.unlink(temp_path)
+            face_result = self.face_processor.process_bytes(image_bytes)
             
             if not face_result or face_result['total_faces'] == 0:
                 return {
@@ -111,11 +117,9 @@ class FaceRecognitionSystem:
             
             logger.info(f"Đã xử lý {face_result['total_faces']} khuôn mặt trong ảnh")
 
-            # Get database embeddings
-            database_embeddings = self.db_manager.get_all_face_embeddings()
-            logger.info(f"Database có {len(database_embeddings)} khuôn mặt")
+            logger.info(f"Gallery có {len(self.gallery)} khuôn mặt")
             
-            if not database_embeddings:
+            if len(self.gallery) == 0:
                 return {
                     'success': True,
                     'message': 'Database trống, chưa có khuôn mặt nào được đăng ký',
@@ -128,16 +132,13 @@ class FaceRecognitionSystem:
             face_embedding = face_result['faces'][0]['embedding']
             logger.info(f"Query embedding shape: {face_embedding.shape}")
             
-            # Debug: Log database embeddings info
-            for i, db_face in enumerate(database_embeddings):
-                logger.info(f"DB face {i}: id={db_face['id']}, name={db_face['name']}, embedding_shape={db_face['embedding'].shape}")
-            
             # Find matching face with custom threshold
-            match_result = self.face_processor.find_matching_face(
-                face_embedding, 
-                database_embeddings,
-                threshold=threshold
-            )
+            match_result = self.face_processor.find_matching_faces(
+                [face_embedding],
+                self.gallery,
+                threshold=threshold,
+                top_k=DEBUG_SIMILARITY_TOP_K
+            )[0]
             
             logger.info(f"Match result: best_similarity={match_result['best_similarity']:.4f}, threshold={threshold}, found_match={match_result['found_match']}")
             
@@ -153,12 +154,9 @@ class FaceRecognitionSystem:
                 }
             else:
                 logger.info(f"NO MATCH FOUND: best_similarity={match_result['best_similarity']:.4f} < threshold={threshold}")
-                # Thêm debug cho similarity values
-                similarities = []
-                for db_face in database_embeddings:
-                    sim = self.face_processor.calculate_cosine_similarity(face_embedding, db_face['embedding'])
-                    similarities.append(f"{db_face['name']}={sim:.4f}")
-                logger.info(f"All similarities: {', '.join(similarities)}")
+                # Debug: similarity của các khuôn mặt gần nhất (top-k đã có sẵn từ lần so khớp)
+                similarities = [f"{c['name']}={c['similarity']:.4f}" for c in match_result['nearest']]
+                logger.info(f"Top {len(similarities)} similarities: {', '.join(similarities)}")
                 
                 return {
                     'success': True,
@@ -171,12 +169,12 @@ class FaceRecognitionSystem:
                 }
             
         except Exception as e:
-            logger.error(f"Lỗi nhận diện từ base64: {e}")
+            logger.error(f"Lỗi nhận diện khuôn mặt: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
             return {
                 'success': False,
-                'message': f'Lỗi xử lý ảnh base64: {str(e)}'
+                'message': f'Lỗi nhận diện: {str(e)}'
             }
 
     def compare_faces_from_base64(self, base64_image1, base64_image2, threshold=0.6):
@@ -191,40 +189,34 @@ class FaceRecognitionSystem:
         Returns:
             dict: Kết quả so sánh
         """
-        import tempfile
-        import base64
-        from PIL import Image
-        from io import BytesIO
+        try:
+            image1_data = self.decode_base64_image(base64_image1)
+            image2_data = self.decode_base64_image(base64_image2)
+        except Exception as e:
+            logger.error(f"Lỗi so sánh từ base64: {e}")
+            return {
+                'success': False,
+                'message': f'Lỗi xử lý ảnh base64: {str(e)}',
+                'similarity': None,
+                'match': None
+            }
+        return self.compare_faces_from_bytes(image1_data, image2_data, threshold)
+
+    def compare_faces_from_bytes(self, image1_bytes, image2_bytes, threshold=0.6):
+        """
+        So sánh 2 khuôn mặt từ nội dung file ảnh, kết quả gọn cho API
+        
+        Args:
+            image1_bytes (bytes): Nội dung file ảnh thứ nhất
+            image2_bytes (bytes): Nội dung file ảnh thứ hai
+            threshold (float): Ngưỡng similarity
         
+        Returns:
+            dict: Kết quả so sánh (giống compare_faces_from_base64)
+        """
         try:
-            # Decode base64 images
-            if base64_image1.startswith('data:image'):
-                base64_image1 = base64_image1.split(',')[1]
-            if base64_image2.startswith('data:image'):
-                base64_image2 = base64_image2.split(',')[1]
-            
-            image1_data = base64.b64decode(base64_image1)
-            image2_data = base64.b64decode(base64_image2)
-            
-            image1 = Image.open(BytesIO(image1_data))
-            image2 = Image.open(BytesIO(image2_data))
-            
-            # Save to temporary files
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file1:
-                image1.save(temp_file1.name, 'JPEG')
-                temp_path1 = temp_file1.name
-                
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file2:
-                image2.save(temp_file2.name, 'JPEG')
-                temp_path2 = temp_file2.name
-            
-            # Use existing compare method
-            result = self.compare_two_images(temp_path1, temp_path2)
-            
-            # Clean up temp files
-            import os
-            os.unlink(temp_path1)
-            os.unlink(temp_path2)
+            # Compare in memory
+            result = self.compare_images_from_bytes(image1_bytes, image2_bytes, threshold=threshold)
             
             # Extract comparison data and format for FastAPI
             if result['success'] and result.get('comparison'):
@@ -249,15 +241,13 @@ class FaceRecognitionSystem:
                     'match': None
                 }
             
-            return result
-            
         except Exception as e:
-            logger.error(f"Lỗi so sánh từ base64: {e}")
+            logger.error(f"Lỗi so sánh khuôn mặt: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
             return {
                 'success': False,
-                'message': f'Lỗi xử lý ảnh base64: {str(e)}',
+                'message': f'Lỗi so sánh: {str(e)}',
                 'similarity': None,
                 'match': None
             }
@@ -277,34 +267,31 @@ class FaceRecognitionSystem:
         try:
             # Xử lý ảnh và trích xuất embedding
             result = self.face_processor.process_image(image_path)
-            
-            if not result or result['total_faces'] == 0:
-                return {
-                    'success': False,
-                    'message': 'Không tìm thấy khuôn mặt trong ảnh',
-                    'face_count': 0
-                }
-            
-            if result['total_faces'] > 1:
-                logger.warning(f"Tìm thấy {result['total_faces']} khuôn mặt, chỉ sử dụng khuôn mặt đầu tiên")
-            
-            # Lấy embedding của khuôn mặt đầu tiên
-            face_embedding = result['faces'][0]['embedding']
-            face_confidence = result['faces'][0]['confidence']
-            
-            # Lưu vào database
-            face_id = self.db_manager.save_face_embedding(person_name, face_embedding, description)
-            
+            return self._register_processed(result, person_name, description)
+        
+        except Exception as e:
+            logger.error(f"Lỗi đăng ký khuôn mặt: {e}")
             return {
-                'success': True,
-                'message': f'Đã đăng ký thành công khuôn mặt cho {person_name}',
-                'face_id': face_id,
-                'person_name': person_name,
-                'description': description,
-                'face_count': result['total_faces'],
-                'confidence': face_confidence,
-                'embedding_shape': face_embedding.shape
+                'success': False,
+                'message': f'Lỗi đăng ký: {str(e)}',
+                'face_count': 0
             }
+    
+    def register_face_from_bytes(self, image_bytes, person_name, description=None):
+        """
+        Đăng ký khuôn mặt mới từ nội dung file ảnh trong bộ nhớ
+        
+        Args:
+            image_bytes (bytes): Nội dung file ảnh (JPEG/PNG...)
+            person_name (str): Tên của người
+            description (str, optional): Mô tả thêm về người này
+        
+        Returns:
+            dict: Kết quả đăng ký
+        """
+        try:
+            result = self.face_processor.process_bytes(image_bytes)
+            return self._register_processed(result, person_name, description)
         
         except Exception as e:
             logger.error(f"Lỗi đăng ký khuôn mặt: {e}")
@@ -314,12 +301,44 @@ class FaceRecognitionSystem:
                 'face_count': 0
             }
     
-    def recognize_face(self, image_path):
+    def _register_processed(self, result, person_name, description=None):
+        """Lưu embedding của khuôn mặt đầu tiên trong kết quả process_*"""
+        if not result or result['total_faces'] == 0:
+            return {
+                'success': False,
+                'message': 'Không tìm thấy khuôn mặt trong ảnh',
+                'face_count': 0
+            }
+        
+        if result['total_faces'] > 1:
+            logger.warning(f"Tìm thấy {result['total_faces']} khuôn mặt, chỉ sử dụng khuôn mặt đầu tiên")
+        
+        # Lấy embedding của khuôn mặt đầu tiên
+        face_embedding = result['faces'][0]['embedding']
+        face_confidence = result['faces'][0]['confidence']
+        
+        # Lưu vào database
+        face_id = self.db_manager.save_face_embedding(person_name, face_embedding, description)
+        self.gallery.add(face_id, person_name, face_embedding, description)
+        
+        return {
+            'success': True,
+            'message': f'Đã đăng ký thành công khuôn mặt cho {person_name}',
+            'face_id': face_id,
+            'person_name': person_name,
+            'description': description,
+            'face_count': result['total_faces'],
+            'confidence': face_confidence,
+            'embedding_shape': face_embedding.shape
+        }
+    
+    def recognize_face(self, image_path, threshold=None):
         """
         Nhận diện khuôn mặt từ ảnh
         
         Args:
             image_path (str): Đường dẫn đến ảnh
+            threshold (float, optional): Ngưỡng similarity, nếu None sử dụng config
         
         Returns:
             dict: Kết quả nhận diện
@@ -327,68 +346,33 @@ class FaceRecognitionSystem:
         try:
             # Xử lý ảnh và trích xuất embedding
             result = self.face_processor.process_image(image_path)
-            
-            if not result or result['total_faces'] == 0:
-                return {
-                    'success': False,
-                    'message': 'Không tìm thấy khuôn mặt trong ảnh',
-                    'matches': []
-                }
-            
-            # Lấy tất cả embeddings từ database
-            database_embeddings = self.db_manager.get_all_face_embeddings()
-            
-            if not database_embeddings:
-                return {
-                    'success': False,
-                    'message': 'Database trống, chưa có khuôn mặt nào được đăng ký',
-                    'matches': []
-                }
-            
-            # Nhận diện từng khuôn mặt trong ảnh
-            matches = []
-            for i, face in enumerate(result['faces']):
-                face_embedding = face['embedding']
-                
-                # Tìm matching face trong database
-                match_result = self.face_processor.find_matching_face(
-                    face_embedding, 
-                    database_embeddings
-                )
-                
-                face_match = {
-                    'face_index': i,
-                    'bbox': face['bbox'],
-                    'confidence': face['confidence'],
-                    'match_found': match_result['found_match'],
-                    'best_similarity': match_result['best_similarity'],
-                    'threshold': match_result['threshold']
-                }
-                
-                if match_result['best_match']:
-                    face_match.update({
-                        'person_id': match_result['best_match']['id'],
-                        'person_name': match_result['best_match']['name'],
-                        'match_similarity': match_result['best_match']['similarity'],
-                        'match_confidence': match_result['best_match']['confidence']
-                    })
-                else:
-                    face_match.update({
-                        'person_id': None,
-                        'person_name': 'Unknown',
-                        'match_similarity': match_result['best_similarity'],
-                        'match_confidence': 0.0
-                    })
-                
-                matches.append(face_match)
-            
+            recognition = self._recognize_processed(result, threshold)
+            if recognition['success']:
+                recognition['image_path'] = image_path
+            return recognition
+        
+        except Exception as e:
+            logger.error(f"Lỗi nhận diện khuôn mặt: {e}")
             return {
-                'success': True,
-                'message': f'Đã xử lý {len(matches)} khuôn mặt',
-                'total_faces': result['total_faces'],
-                'matches': matches,
-                'image_path': image_path
+                'success': False,
+                'message': f'Lỗi nhận diện: {str(e)}',
+                'matches': []
             }
+    
+    def recognize_face_from_bytes(self, image_bytes, threshold=None):
+        """
+        Nhận diện tất cả khuôn mặt trong nội dung file ảnh trong bộ nhớ
+        
+        Args:
+            image_bytes (bytes): Nội dung file ảnh (JPEG/PNG...)
+            threshold (float, optional): Ngưỡng similarity, nếu None sử dụng config
+        
+        Returns:
+            dict: Kết quả nhận diện (giống recognize_face)
+        """
+        try:
+            result = self.face_processor.process_bytes(image_bytes)
+            return self._recognize_processed(result, threshold)
         
         except Exception as e:
             logger.error(f"Lỗi nhận diện khuôn mặt: {e}")
@@ -398,58 +382,147 @@ class FaceRecognitionSystem:
                 'matches': []
             }
     
-    def compare_two_images(self, image1_path, image2_path):
+    def _recognize_processed(self, result, threshold=None):
+        """So khớp tất cả khuôn mặt trong kết quả process_* với gallery"""
+        if not result or result['total_faces'] == 0:
+            return {
+                'success': False,
+                'message': 'Không tìm thấy khuôn mặt trong ảnh',
+                'matches': []
+            }
+        
+        if len(self.gallery) == 0:
+            return {
+                'success': False,
+                'message': 'Database trống, chưa có khuôn mặt nào được đăng ký',
+                'matches': []
+            }
+        
+        # Nhận diện tất cả khuôn mặt trong ảnh bằng một lần so khớp
+        match_results = self.face_processor.find_matching_faces(
+            [face['embedding'] for face in result['faces']],
+            self.gallery,
+            threshold=threshold
+        )
+        
+        matches = []
+        for i, (face, match_result) in enumerate(zip(result['faces'], match_results)):
+            face_match = {
+                'face_index': i,
+                'bbox': face['bbox'],
+                'confidence': face['confidence'],
+                'match_found': match_result['found_match'],
+                'best_similarity': match_result['best_similarity'],
+                'threshold': match_result['threshold']
+            }
+            
+            if match_result['best_match']:
+                face_match.update({
+                    'person_id': match_result['best_match']['id'],
+                    'person_name': match_result['best_match']['name'],
+                    'match_similarity': match_result['best_match']['similarity'],
+                    'match_confidence': match_result['best_match']['confidence']
+                })
+            else:
+                face_match.update({
+                    'person_id': None,
+                    'person_name': 'Unknown',
+                    'match_similarity': match_result['best_similarity'],
+                    'match_confidence': 0.0
+                })
+            
+            matches.append(face_match)
+        
+        return {
+            'success': True,
+            'message': f'Đã xử lý {len(matches)} khuôn mặt',
+            'total_faces': result['total_faces'],
+            'matches': matches
+        }
+    
+    def update_face(self, face_id, person_name, embedding, description=None):
+        """
+        Cập nhật embedding trong database và gallery
+        
+        Args:
+            face_id (int): ID của face
+            person_name (str): Tên mới
+            embedding (np.ndarray): Embedding mới
+            description (str, optional): Mô tả mới
+        
+        Returns:
+            bool: True nếu cập nhật thành công
+        """
+        success = self.db_manager.update_face_embedding(face_id, person_name, embedding, description)
+        if success:
+            self.gallery.add(face_id, person_name, embedding, description)
+        return success
+    
+    def delete_face(self, face_id):
+        """
+        Xóa face khỏi database và gallery
+        
+        Args:
+            face_id (int): ID của face cần xóa
+        
+        Returns:
+            bool: True nếu xóa thành công
+        """
+        success = self.db_manager.delete_face(face_id)
+        if success:
+            self.gallery.remove(face_id)
+        return success
+    
+    def reload_gallery(self):
+        """
+        Nạp lại gallery từ database (khi database bị sửa từ process khác)
+        
+        Returns:
+            int: Số khuôn mặt trong gallery
+        """
+        return self.gallery.load(self.db_manager)
+    
+    def compare_two_images(self, image1_path, image2_path, threshold=None):
         """
         So sánh khuôn mặt giữa 2 ảnh
         
         Args:
             image1_path (str): Đường dẫn ảnh thứ nhất
             image2_path (str): Đường dẫn ảnh thứ hai
+            threshold (float, optional): Ngưỡng similarity, nếu None sử dụng config
         
         Returns:
             dict: Kết quả so sánh
         """
         try:
-            # Xử lý ảnh 1
             result1 = self.face_processor.process_image(image1_path)
-            if not result1 or result1['total_faces'] == 0:
-                return {
-                    'success': False,
-                    'message': f'Không tìm thấy khuôn mặt trong ảnh {image1_path}',
-                    'comparison': None
-                }
-            
-            # Xử lý ảnh 2
             result2 = self.face_processor.process_image(image2_path)
-            if not result2 or result2['total_faces'] == 0:
-                return {
-                    'success': False,
-                    'message': f'Không tìm thấy khuôn mặt trong ảnh {image2_path}',
-                    'comparison': None
-                }
-            
-            # Lấy embedding của khuôn mặt đầu tiên từ mỗi ảnh
-            embedding1 = result1['faces'][0]['embedding']
-            embedding2 = result2['faces'][0]['embedding']
-            
-            # So sánh
-            comparison = self.face_processor.compare_faces(embedding1, embedding2)
-            
+            return self._compare_processed(result1, result2, image1_path, image2_path, threshold)
+        
+        except Exception as e:
+            logger.error(f"Lỗi so sánh ảnh: {e}")
             return {
-                'success': True,
-                'message': 'So sánh thành công',
-                'image1': {
-                    'path': image1_path,
-                    'faces_count': result1['total_faces'],
-                    'confidence': result1['faces'][0]['confidence']
-                },
-                'image2': {
-                    'path': image2_path,
-                    'faces_count': result2['total_faces'],
-                    'confidence': result2['faces'][0]['confidence']
-                },
-                'comparison': comparison
+                'success': False,
+                'message': f'Lỗi so sánh: {str(e)}',
+                'comparison': None
             }
+    
+    def compare_images_from_bytes(self, image1_bytes, image2_bytes, threshold=None):
+        """
+        So sánh khuôn mặt giữa 2 ảnh trong bộ nhớ
+        
+        Args:
+            image1_bytes (bytes): Nội dung file ảnh thứ nhất
+            image2_bytes (bytes): Nội dung file ảnh thứ hai
+            threshold (float, optional): Ngưỡng similarity, nếu None sử dụng config
+        
+        Returns:
+            dict: Kết quả so sánh (giống compare_two_images)
+        """
+        try:
+            result1 = self.face_processor.process_bytes(image1_bytes)
+            result2 = self.face_processor.process_bytes(image2_bytes)
+            return self._compare_processed(result1, result2, 'image1', 'image2', threshold)
         
         except Exception as e:
             logger.error(f"Lỗi so sánh ảnh: {e}")
@@ -459,6 +532,45 @@ class FaceRecognitionSystem:
                 'comparison': None
             }
     
+    def _compare_processed(self, result1, result2, image1_label, image2_label, threshold=None):
+        """So sánh khuôn mặt đầu tiên của 2 kết quả process_*"""
+        if not result1 or result1['total_faces'] == 0:
+            return {
+                'success': False,
+                'message': f'Không tìm thấy khuôn mặt trong ảnh {image1_label}',
+                'comparison': None
+            }
+        
+        if not result2 or result2['total_faces'] == 0:
+            return {
+                'success': False,
+                'message': f'Không tìm thấy khuôn mặt trong ảnh {image2_label}',
+                'comparison': None
+            }
+        
+        # Lấy embedding của khuôn mặt đầu tiên từ mỗi ảnh
+        embedding1 = result1['faces'][0]['embedding']
+        embedding2 = result2['faces'][0]['embedding']
+        
+        # So sánh
+        comparison = self.face_processor.compare_faces(embedding1, embedding2, threshold=threshold)
+        
+        return {
+            'success': True,
+            'message': 'So sánh thành công',
+            'image1': {
+                'path': image1_label,
+                'faces_count': result1['total_faces'],
+                'confidence': result1['faces'][0]['confidence']
+            },
+            'image2': {
+                'path': image2_label,
+                'faces_count': result2['total_faces'],
+                'confidence': result2['faces'][0]['confidence']
+            },
+            'comparison': comparison
+        }
+    
     def visualize_results(self, image_path, recognition_result):
         """
         Vẽ bounding box và kết quả nhận diện lên ảnh
@@ -515,6 +627,7 @@ class FaceRecognitionSystem:
     
     def close(self):
         """Đóng các kết nối"""
+        self.face_processor.close()
         self.db_manager.close()
         logger.info("Đã đóng Face Recognition System")
 
@@ -185,7 +185,7 @@ class InteractiveFaceApp:
             print(f"👥 Tổng số người đã đăng ký: {total}")
             
             if total > 0:
-                embeddings = self.system.db_manager.get_all_face_embeddings()
+                embeddings = self.system.gallery.records()
                 print("\nChi tiết:")
                 for i, emb in enumerate(embeddings, 1):
                     print(f"  {i:2d}. 🆔 ID: {emb['id']:3d} | 👤 {emb['name']}")
@@ -0,0 +1,130 @@
+import threading
+import queue
+import time
+import logging
+from concurrent.futures import Future
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5.0, name='micro-batcher'):
+        """
+        Gom các item được gửi đồng thời từ nhiều thread thành một batch
+
+        Thread nền lấy item đầu tiên trong hàng đợi, chờ thêm tối đa
+        max_wait_ms (hoặc đến khi đủ max_batch_size item), gọi batch_fn một
+        lần rồi trả kết quả về đúng thread đã gửi.
+
+        Args:
+            batch_fn (callable): Hàm nhận list item, trả về list kết quả cùng thứ tự
+            max_batch_size (int): Số item tối đa mỗi batch
+            max_wait_ms (float): Thời gian chờ gom batch tối đa (mili giây)
+            name (str): Tên thread nền
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self._queue = queue.Queue()
+        self._closed = False
+        # Kiểm tra _closed và put cùng trong lock để không item nào nằm sau sentinel None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """
+        Gửi một item, trả về Future chứa kết quả
+
+        Args:
+            item: Dữ liệu đầu vào của batch_fn
+
+        Returns:
+            concurrent.futures.Future: Kết quả của item
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher đã đóng")
+            self._queue.put((item, future))
+        return future
+
+    def map(self, items, timeout=None):
+        """
+        Gửi nhiều item và chờ toàn bộ kết quả (có thể nằm ở nhiều batch)
+
+        Args:
+            items (list): Danh sách item
+            timeout (float, optional): Số giây chờ tối đa
+
+        Returns:
+            list: Kết quả theo đúng thứ tự items
+        """
+        futures = [self.submit(item) for item in items]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+
+            batch = self._collect(entry)
+            futures = [future for _, future in batch]
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"batch_fn trả về {len(results)} kết quả cho {len(batch)} item")
+            except Exception as e:
+                logger.error(f"Lỗi xử lý batch {len(batch)} item: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def close(self):
+        """Dừng thread nền sau khi xử lý hết các item đang chờ"""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+        self._thread.join()
+
+if __name__ == "__main__":
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    batch_sizes = []
+
+    def fake_embed(items):
+        batch_sizes.append(len(items))
+        time.sleep(0.01)  # Giả lập một lần chạy model
+        return [np.full(4, item, dtype=np.float32) for item in items]
+
+    batcher = MicroBatcher(fake_embed, max_batch_size=16, max_wait_ms=5)
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        start = time.time()
+        results = list(pool.map(lambda i: batcher.submit(i).result(), range(256)))
+        elapsed = time.time() - start
+
+    assert all(result[0] == i for i, result in enumerate(results))
+    print(f"256 request trong {elapsed:.3f}s, {len(batch_sizes)} batch, trung bình {np.mean(batch_sizes):.1f} item/batch")
+    batcher.close()
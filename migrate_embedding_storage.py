@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Script chuyển cột 'embedding' của table faces từ JSON sang BLOB float32/float16
+"""
+
+import argparse
+import sys
+import pymysql
+from config import DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME, EMBEDDING_STORAGE_FORMAT
+from database_manager import encode_embedding, decode_embedding
+
+BATCH_SIZE = 1000
+
+def convert_rows(cursor, rows, storage_format, keep_updated_at):
+    """Ghi embedding_blob cho các dòng (face_id, embedding JSON)"""
+    # Giữ nguyên updated_at để phân biệt dòng do app sửa trong lúc đang chuyển
+    query = ("UPDATE faces SET embedding_blob = %s, updated_at = updated_at WHERE face_id = %s"
+             if keep_updated_at else "UPDATE faces SET embedding_blob = %s WHERE face_id = %s")
+    updates = [
+        (encode_embedding(decode_embedding(embedding), storage_format), face_id)
+        for face_id, embedding in rows
+    ]
+    cursor.executemany(query, updates)
+
+def migrate_embedding_storage(storage_format='float32'):
+    """
+    Chuyển toàn bộ embedding sang BLOB little-endian
+
+    Phần lớn dữ liệu được chuyển theo batch trong khi app vẫn ghi. Các dòng
+    được thêm hoặc sửa trong lúc đó được chuyển lại dưới LOCK TABLES faces
+    WRITE, ngay trước khi thay cột (DDL của MySQL không rollback được).
+
+    Args:
+        storage_format (str): 'float32' hoặc 'float16'
+
+    Returns:
+        bool: True nếu chuyển xong
+    """
+    connection = None
+    locked = False
+    try:
+        connection = pymysql.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            user=DB_USER,
+            password=DB_PASS,
+            database=DB_NAME,
+            charset='utf8mb4'
+        )
+
+        with connection.cursor() as cursor:
+            print("🔄 Đang kiểm tra cấu trúc table 'faces'...")
+
+            cursor.execute("DESCRIBE faces;")
+            columns = {col[0]: col[1] for col in cursor.fetchall()}
+
+            if 'embedding' not in columns:
+                print("❌ Table 'faces' không có cột 'embedding'")
+                return False
+
+            print(f"📊 Cột embedding hiện tại: {columns['embedding']}")
+
+            # Thêm cột tạm để giữ dữ liệu cũ cho đến khi chuyển xong
+            if 'embedding_blob' not in columns:
+                cursor.execute("ALTER TABLE faces ADD COLUMN embedding_blob BLOB NULL AFTER embedding")
+            else:
+                # Cột tạm từ lần chạy lỗi trước có thể đã cũ so với embedding, chuyển lại từ đầu
+                cursor.execute("UPDATE faces SET embedding_blob = NULL" +
+                               (", updated_at = updated_at" if 'updated_at' in columns else ""))
+            connection.commit()
+
+            # Không có updated_at thì không biết dòng nào bị sửa, chuyển lại tất cả khi khóa bảng
+            keep_updated_at = 'updated_at' in columns
+            cursor.execute("SELECT NOW()")
+            started_at = cursor.fetchone()[0]
+
+            cursor.execute("SELECT COUNT(*) FROM faces WHERE embedding_blob IS NULL")
+            total = cursor.fetchone()[0]
+            print(f"\n🔄 Đang chuyển {total} embedding sang {storage_format}...")
+
+            converted = 0
+            last_id = 0
+            while True:
+                cursor.execute(
+                    "SELECT face_id, embedding FROM faces "
+                    "WHERE embedding_blob IS NULL AND face_id > %s "
+                    "ORDER BY face_id LIMIT %s",
+                    (last_id, BATCH_SIZE)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                convert_rows(cursor, rows, storage_format, keep_updated_at)
+                connection.commit()
+
+                converted += len(rows)
+                last_id = rows[-1][0]
+                print(f"  • {converted}/{total}")
+
+            # Chặn app ghi, chuyển các dòng mới thêm/sửa trong lúc chạy batch
+            print("\n🔒 Khóa table 'faces' để chuyển các dòng thay đổi trong lúc chạy...")
+            cursor.execute("LOCK TABLES faces WRITE")
+            locked = True
+            if keep_updated_at:
+                cursor.execute(
+                    "SELECT face_id, embedding FROM faces "
+                    "WHERE embedding_blob IS NULL OR updated_at >= %s",
+                    (started_at,)
+                )
+            else:
+                cursor.execute("SELECT face_id, embedding FROM faces")
+            rows = cursor.fetchall()
+            convert_rows(cursor, rows, storage_format, keep_updated_at)
+            connection.commit()
+            print(f"  • {len(rows)} dòng chuyển lại")
+
+            cursor.execute("SELECT COUNT(*) FROM faces WHERE embedding_blob IS NULL")
+            missing = cursor.fetchone()[0]
+            if missing:
+                raise RuntimeError(f"Còn {missing} dòng chưa có embedding_blob, không xóa cột embedding")
+
+            # Thay cột cũ bằng cột BLOB
+            cursor.execute("ALTER TABLE faces DROP COLUMN embedding")
+            cursor.execute("ALTER TABLE faces CHANGE COLUMN embedding_blob embedding BLOB NOT NULL")
+            connection.commit()
+            cursor.execute("UNLOCK TABLES")
+            locked = False
+
+            print(f"✅ Đã chuyển {converted} embedding (+{len(rows)} dòng chuyển lại) sang BLOB {storage_format}!")
+
+            print("\n📊 CẤU TRÚC TABLE 'faces' SAU KHI CHUYỂN:")
+            cursor.execute("DESCRIBE faces;")
+            for col in cursor.fetchall():
+                status = "🆕" if col[0] == 'embedding' else "  "
+                print(f"{status} {col[0]} ({col[1]})")
+        return True
+
+    except Exception as e:
+        print(f"❌ Lỗi: {e}")
+        print("⚠️ Table 'faces' có thể mới chuyển một phần (cột embedding_blob), chạy lại script")
+        return False
+
+    finally:
+        if connection:
+            if locked:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("UNLOCK TABLES")
+                except Exception:
+                    pass
+            connection.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chuyển embedding từ JSON sang BLOB")
+    parser.add_argument('--format', choices=['float32', 'float16'],
+                        default=EMBEDDING_STORAGE_FORMAT if EMBEDDING_STORAGE_FORMAT != 'json' else 'float32',
+                        help="Định dạng BLOB (mặc định theo config)")
+    parser.add_argument('--yes', action='store_true', help="Không hỏi xác nhận")
+    args = parser.parse_args()
+
+    print(f"🔧 CHUYỂN CỘT 'embedding' SANG BLOB {args.format}")
+    print("="*50)
+
+    # Xác nhận từ user
+    if args.yes:
+        confirm = 'y'
+    else:
+        confirm = input("Bạn có chắc chắn muốn chuyển định dạng embedding? (y/n): ")
+
+    if confirm.lower() in ['y', 'yes']:
+        if not migrate_embedding_storage(args.format):
+            sys.exit(1)
+    else:
+        print("❌ Đã hủy thao tác")
@@ -0,0 +1,66 @@
+"""
+Import-time benchmark for the insightface package.
+
+Every statement runs in a fresh interpreter so module caches do not leak
+between rounds. The run fails if an optional heavy dependency is pulled in
+by one of the lean entry points.
+
+    python benchmark_import.py [--rounds 5]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+#statement -> whether it must stay free of the heavy optional dependencies
+STATEMENTS = [
+    ('import insightface', True),
+    ('from insightface.app import FaceAnalysis', True),
+    ('from insightface.model_zoo import get_model', True),
+    ('from insightface.utils import face_align', True),
+    ('from insightface.data import get_image', True),
+]
+
+HEAVY_MODULES = ['albumentations', 'mxnet', 'skimage', 'insightface.thirdparty.face3d',
+                 'insightface.app.mask_renderer', 'requests', 'tqdm']
+
+PROBE = '''
+import json, sys, time
+t = time.perf_counter()
+%s
+elapsed = time.perf_counter() - t
+print(json.dumps({'elapsed': elapsed, 'heavy': [m for m in %r if m in sys.modules]}))
+'''
+
+
+def measure(statement, rounds):
+    timings = []
+    heavy = []
+    for _ in range(rounds):
+        out = subprocess.run([sys.executable, '-c', PROBE % (statement, HEAVY_MODULES)],
+                             check=True, capture_output=True, text=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        timings.append(result['elapsed'])
+        heavy = result['heavy']
+    timings.sort()
+    return timings[len(timings) // 2], heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description='insightface import-time benchmark')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for statement, lean in STATEMENTS:
+        median, heavy = measure(statement, args.rounds)
+        status = 'ok'
+        if lean and heavy:
+            status = 'HEAVY: %s' % ', '.join(heavy)
+            failed = True
+        print('%-50s %8.1f ms  %s' % (statement, median * 1000, status))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
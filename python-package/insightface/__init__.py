@@ -13,9 +13,20 @@ except ImportError:
 
 __version__ = '0.7.3'
 
-from . import model_zoo
-from . import utils
-from . import app
-from . import data
-from . import thirdparty
+import importlib
+
+#submodules are imported on first attribute access (PEP 562), so that
+#`import insightface` does not pay for model_zoo/app/data/thirdparty and their
+#optional dependencies until they are used
+_submodules = ['model_zoo', 'utils', 'app', 'data', 'thirdparty']
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + _submodules)
 
@@ -1,2 +1,13 @@
+import importlib
+
 from .face_analysis import *
-from .mask_renderer import *
+
+#mask_renderer pulls in albumentations and the compiled face3d package, load it on first use
+_lazy_attrs = {'MaskRenderer': '.mask_renderer', 'MaskAugmentation': '.mask_renderer'}
+
+
+def __getattr__(name):
+    if name in _lazy_attrs:
+        module = importlib.import_module(_lazy_attrs[name], __name__)
+        return getattr(module, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -3,32 +3,48 @@ from numpy.linalg import norm as l2norm
 #from easydict import EasyDict
 
 class Face(dict):
+    #fields are stored once, as dict items, attribute access reads them;
+    #the only slot caches normed_embedding as (embedding, normed) so any way
+    #of replacing the embedding (attribute, item, update()) invalidates it
+    __slots__ = ('_normed_cache',)
 
     def __init__(self, d=None, **kwargs):
-        if d is None:
-            d = {}
-        if kwargs:
-            d.update(**kwargs)
-        for k, v in d.items():
-            setattr(self, k, v)
-        # Class attributes
-        #for k in self.__class__.__dict__.keys():
-        #    if not (k.startswith('__') and k.endswith('__')) and not k in ('update', 'pop'):
-        #        setattr(self, k, getattr(self, k))
+        convert = self._convert
+        if d is not None:
+            super(Face, self).__init__({k: convert(v) for k, v in d.items()})
+        for k, v in kwargs.items():
+            super(Face, self).__setitem__(k, convert(v))
+        self._normed_cache = None
 
-    def __setattr__(self, name, value):
+    @classmethod
+    def _convert(cls, value):
+        #nested dicts (also inside lists/tuples) become Face, as item or attribute
         if isinstance(value, (list, tuple)):
-            value = [self.__class__(x)
-                    if isinstance(x, dict) else x for x in value]
-        elif isinstance(value, dict) and not isinstance(value, self.__class__):
-            value = self.__class__(value)
-        super(Face, self).__setattr__(name, value)
-        super(Face, self).__setitem__(name, value)
+            return [cls(x) if isinstance(x, dict) else x for x in value]
+        if isinstance(value, dict) and not isinstance(value, cls):
+            return cls(value)
+        return value
+
+    def __setitem__(self, name, value):
+        super(Face, self).__setitem__(name, self._convert(value))
 
-    __setitem__ = __setattr__
+    def __setattr__(self, name, value):
+        if name == '_normed_cache':
+            object.__setattr__(self, name, value)
+        else:
+            self[name] = value
 
     def __getattr__(self, name):
-        return None
+        #unset fields read as None
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self.get(name)
+
+    def __delattr__(self, name):
+        try:
+            del self[name]
+        except KeyError:
+            raise AttributeError(name) from None
 
     @property
     def embedding_norm(self):
@@ -38,12 +54,97 @@ class Face(dict):
 
     @property 
     def normed_embedding(self):
-        if self.embedding is None:
+        #computed once per assigned embedding (in-place edits of the array are not tracked)
+        embedding = self.embedding
+        if embedding is None:
             return None
-        return self.embedding / self.embedding_norm
+        cache = self._normed_cache
+        if cache is None or cache[0] is not embedding:
+            cache = (embedding, embedding / l2norm(embedding))
+            self._normed_cache = cache
+        return cache[1]
 
     @property 
     def sex(self):
         if self.gender is None:
             return None
         return 'M' if self.gender==1 else 'F'
+
+
+class FaceBatch:
+    """Columnar results for the faces of one image.
+
+    Every field is one stacked array: ``bboxes`` (N, 4), ``kpss`` (N, K, 2),
+    ``det_scores`` (N,), ``embeddings`` (N, D) and any per-face model output
+    (e.g. ``landmark_2d_106`` (N, 106, 2), ``gender`` (N,)) in ``fields``.
+    Indexing or iterating yields ``Face`` objects, so code written for the
+    list returned by ``FaceAnalysis.get`` keeps working.
+    """
+
+    __slots__ = ('fields', '_normed_embeddings', '_faces')
+
+    def __init__(self, bboxes=None, kpss=None, det_scores=None, embeddings=None, **fields):
+        self.fields = {}
+        for key, value in [('bbox', bboxes), ('kps', kpss), ('det_score', det_scores), ('embedding', embeddings)]:
+            if value is not None:
+                self.fields[key] = np.asarray(value)
+        for key, value in fields.items():
+            if value is not None:
+                self.fields[key] = np.asarray(value)
+        self._normed_embeddings = None
+        self._faces = None
+
+    @classmethod
+    def from_faces(cls, faces):
+        faces = list(faces)
+        batch = cls()
+        if len(faces) == 0:
+            batch.fields['bbox'] = np.zeros((0, 4), dtype=np.float32)
+            return batch
+        keys = []
+        for face in faces:
+            for key in face:
+                if key not in keys:
+                    keys.append(key)
+        for key in keys:
+            values = [face.get(key) for face in faces]
+            #only fields present on every face can be stacked
+            if all(value is not None for value in values):
+                batch.fields[key] = np.stack([np.asarray(value) for value in values])
+        batch._faces = faces
+        return batch
+
+    def __len__(self):
+        bboxes = self.fields.get('bbox')
+        return 0 if bboxes is None else bboxes.shape[0]
+
+    def __getattr__(self, name):
+        #bboxes/kpss/det_scores/embeddings plus any stacked model output
+        key = {'bboxes': 'bbox', 'kpss': 'kps', 'det_scores': 'det_score', 'embeddings': 'embedding'}.get(name, name)
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self.fields.get(key)
+
+    @property
+    def normed_embeddings(self):
+        embeddings = self.fields.get('embedding')
+        if embeddings is None:
+            return None
+        if self._normed_embeddings is None:
+            norms = l2norm(embeddings, axis=1, keepdims=True)
+            self._normed_embeddings = embeddings / norms
+        return self._normed_embeddings
+
+    def to_faces(self):
+        if self._faces is None:
+            self._faces = [Face({key: value[i] for key, value in self.fields.items()}) for i in range(len(self))]
+        return self._faces
+
+    def __getitem__(self, index):
+        return self.to_faces()[index]
+
+    def __iter__(self):
+        return iter(self.to_faces())
+
+    def __repr__(self):
+        return 'FaceBatch(%d faces, fields=%s)' % (len(self), sorted(self.fields))
@@ -16,7 +16,7 @@ from numpy.linalg import norm
 
 from ..model_zoo import model_zoo
 from ..utils import DEFAULT_MP_NAME, ensure_available
-from .common import Face
+from .common import Face, FaceBatch
 
 __all__ = ['FaceAnalysis']
 
@@ -55,12 +55,45 @@ class FaceAnalysis:
             else:
                 model.prepare(ctx_id)
 
-    def get(self, img, max_num=0, det_metric='default'):
+    def get(self, img, max_num=0, det_metric='default', as_batch=False):
+        #as_batch=True returns a columnar FaceBatch (stacked bboxes, kpss,
+        #embeddings, ...) instead of a list of Face
         bboxes, kpss = self.det_model.detect(img,
                                              max_num=max_num,
                                              metric=det_metric)
-        if bboxes.shape[0] == 0:
-            return []
+        ret = self._build_faces(bboxes, kpss)
+        if len(ret) > 0:
+            self._run_models(img, ret)
+        if as_batch:
+            return FaceBatch.from_faces(ret)
+        return ret
+
+    def get_batch(self, imgs, max_num=0, det_metric='default', batch_size=32, as_batch=False):
+        #detect on up to batch_size letterboxed images per detector run, then run
+        #every per-face model once on all faces of those images
+        rets = []
+        for start in range(0, len(imgs), batch_size):
+            chunk = imgs[start:start+batch_size]
+            if hasattr(self.det_model, 'detect_batch'):
+                dets = self.det_model.detect_batch(chunk,
+                                                   max_num=max_num,
+                                                   metric=det_metric)
+            else:
+                dets = [self.det_model.detect(img, max_num=max_num, metric=det_metric) for img in chunk]
+            face_imgs = []
+            faces = []
+            for img, (bboxes, kpss) in zip(chunk, dets):
+                ret = self._build_faces(bboxes, kpss)
+                rets.append(ret)
+                face_imgs.extend([img] * len(ret))
+                faces.extend(ret)
+            if len(faces) > 0:
+                self._run_models(face_imgs, faces)
+        if as_batch:
+            return [FaceBatch.from_faces(ret) for ret in rets]
+        return rets
+
+    def _build_faces(self, bboxes, kpss):
         ret = []
         for i in range(bboxes.shape[0]):
             bbox = bboxes[i, 0:4]
@@ -69,13 +102,22 @@ class FaceAnalysis:
             if kpss is not None:
                 kps = kpss[i]
             face = Face(bbox=bbox, kps=kps, det_score=det_score)
-            for taskname, model in self.models.items():
-                if taskname=='detection':
-                    continue
-                model.get(img, face)
             ret.append(face)
         return ret
 
+    def _run_models(self, img, faces):
+        #img is either the source image of all faces or a list with one image per face
+        #run every per-face model once on all faces
+        for taskname, model in self.models.items():
+            if taskname=='detection':
+                continue
+            if hasattr(model, 'get_batch'):
+                model.get_batch(img, faces)
+            else:
+                imgs = img if isinstance(img, list) else [img] * len(faces)
+                for _img, face in zip(imgs, faces):
+                    model.get(_img, face)
+
     def draw_on(self, img, faces):
         import cv2
         dimg = img.copy()
@@ -3,6 +3,7 @@
 from argparse import ArgumentParser
 
 from .model_download import ModelDownloadCommand
+from .model_benchmark import ModelBenchmarkCommand
 from .rec_add_mask_param import RecAddMaskParamCommand
 
 def main():
@@ -11,6 +12,7 @@ def main():
 
     # Register commands
     ModelDownloadCommand.register_subcommand(commands_parser)
+    ModelBenchmarkCommand.register_subcommand(commands_parser)
     RecAddMaskParamCommand.register_subcommand(commands_parser)
 
     args = parser.parse_args()
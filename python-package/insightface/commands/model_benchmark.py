@@ -0,0 +1,75 @@
+
+from argparse import ArgumentParser
+import json
+import os.path as osp
+
+from . import BaseInsightFaceCLICommand
+
+
+def model_benchmark_command_factory(args):
+    return ModelBenchmarkCommand(args.models, args.root, args.batch_sizes, args.threads, args.execution_modes,
+                                 args.session_profile, args.providers, args.images, args.det_size,
+                                 args.warmup, args.repeat, args.output)
+
+
+class ModelBenchmarkCommand(BaseInsightFaceCLICommand):
+    @staticmethod
+    def register_subcommand(parser: ArgumentParser):
+        benchmark_parser = parser.add_parser("model.benchmark")
+        benchmark_parser.add_argument(
+            "models", type=str, nargs="+", help="Model files, directories or model pack names under root"
+        )
+        benchmark_parser.add_argument(
+            "--root", type=str, default='~/.insightface', help="Path to location of the model packs"
+        )
+        benchmark_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+        benchmark_parser.add_argument(
+            "--threads", type=int, nargs="+", default=[1, 0],
+            help="intra_op_num_threads values, 0 for the onnxruntime default, -k for cpu_count // k"
+        )
+        benchmark_parser.add_argument(
+            "--execution-modes", type=str, nargs="+", default=['sequential'], choices=['sequential', 'parallel']
+        )
+        benchmark_parser.add_argument("--session-profile", type=str, default='default')
+        benchmark_parser.add_argument("--providers", type=str, nargs="+", default=['CPUExecutionProvider'])
+        benchmark_parser.add_argument(
+            "--images", type=str, nargs="*", default=None, help="Input images, random ones if not given"
+        )
+        benchmark_parser.add_argument("--det-size", type=int, nargs=2, default=[640, 640])
+        benchmark_parser.add_argument("--warmup", type=int, default=5)
+        benchmark_parser.add_argument("--repeat", type=int, default=50)
+        benchmark_parser.add_argument("--output", type=str, default=None, help="Write the JSON report here")
+        benchmark_parser.set_defaults(func=model_benchmark_command_factory)
+
+    def __init__(self, models, root, batch_sizes, threads, execution_modes, session_profile, providers,
+                 images, det_size, warmup, repeat, output):
+        self._models = models
+        self._root = root
+        self._batch_sizes = batch_sizes
+        self._threads = threads
+        self._execution_modes = execution_modes
+        self._session_profile = session_profile
+        self._providers = providers
+        self._images = images
+        self._det_size = det_size
+        self._warmup = warmup
+        self._repeat = repeat
+        self._output = output
+
+    def run(self):
+        import cv2
+        from ..model_zoo.benchmark import run_benchmark
+        images = None
+        if self._images:
+            images = [cv2.imread(path) for path in self._images]
+            for path, img in zip(self._images, images):
+                assert img is not None, 'can not read image %s' % path
+        report = run_benchmark(self._models, self._batch_sizes, self._threads, self._execution_modes,
+                               self._session_profile, self._providers, self._root, images,
+                               self._warmup, self._repeat, tuple(self._det_size))
+        if self._output is None:
+            print(json.dumps(report, indent=2))
+        else:
+            with open(osp.expanduser(self._output), 'w') as f:
+                json.dump(report, f, indent=2)
+            print('benchmark report written to %s' % self._output)
@@ -3,7 +3,6 @@ import numpy as np
 import os
 import os.path as osp
 import sys
-import mxnet as mx
 
 
 class RecBuilder():
@@ -15,7 +14,10 @@ class RecBuilder():
         self.max_label = -1
         assert not osp.exists(path), '%s exists' % path
         os.makedirs(path)
-        self.writer = mx.recordio.MXIndexedRecordIO(os.path.join(path, 'train.idx'), 
+        #mxnet is only needed to write record files, import it on use
+        import mxnet as mx
+        self.recordio = mx.recordio
+        self.writer = self.recordio.MXIndexedRecordIO(os.path.join(path, 'train.idx'), 
                                                     os.path.join(path, 'train.rec'),
                                                     'w')
         self.meta = []
@@ -29,11 +31,11 @@ class RecBuilder():
         for img in imgs:
             idx = self.widx
             image_meta = {'image_index': idx, 'image_classes': [label]}
-            header = mx.recordio.IRHeader(0, label, idx, 0)
+            header = self.recordio.IRHeader(0, label, idx, 0)
             if isinstance(img, np.ndarray):
-                s = mx.recordio.pack_img(header,img,quality=95,img_fmt='.jpg')
+                s = self.recordio.pack_img(header,img,quality=95,img_fmt='.jpg')
             else:
-                s = mx.recordio.pack(header, img)
+                s = self.recordio.pack(header, img)
             self.writer.write_idx(idx, s)
             self.meta.append(image_meta)
             self.widx += 1
@@ -46,16 +48,16 @@ class RecBuilder():
         #assert label >= 0
         #assert label > self.last_label
         idx = self.widx
-        header = mx.recordio.IRHeader(0, label, idx, 0)
+        header = self.recordio.IRHeader(0, label, idx, 0)
         if isinstance(label, list):
             idlabel = label[0]
         else:
             idlabel = label
         image_meta = {'image_index': idx, 'image_classes': [idlabel]}
         if isinstance(img, np.ndarray):
-            s = mx.recordio.pack_img(header,img,quality=95,img_fmt='.jpg')
+            s = self.recordio.pack_img(header,img,quality=95,img_fmt='.jpg')
         else:
-            s = mx.recordio.pack(header, img)
+            s = self.recordio.pack(header, img)
         self.writer.write_idx(idx, s)
         self.meta.append(image_meta)
         self.widx += 1
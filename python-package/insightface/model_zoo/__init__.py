@@ -4,3 +4,4 @@ from .retinaface import RetinaFace
 from .scrfd import SCRFD
 from .landmark import Landmark
 from .attribute import Attribute
+from .session_factory import create_session, create_session_options, SESSION_PROFILES
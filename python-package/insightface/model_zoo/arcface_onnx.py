@@ -7,9 +7,10 @@
 from __future__ import division
 import numpy as np
 import cv2
-import onnx
 import onnxruntime
 from ..utils import face_align
+from .model_meta import load_model_meta
+from .session_factory import cpu_session
 
 __all__ = [
     'ArcFaceONNX',
@@ -24,13 +25,13 @@ class ArcFaceONNX:
         self.taskname = 'recognition'
         find_sub = False
         find_mul = False
-        model = onnx.load(self.model_file)
-        graph = model.graph
-        for nid, node in enumerate(graph.node[:8]):
-            #print(nid, node.name)
-            if node.name.startswith('Sub') or node.name.startswith('_minus'):
+        #first graph node names, cached next to the model file so the protobuf is parsed once
+        head_nodes = load_model_meta(self.model_file)['head_nodes']
+        for nid, name in enumerate(head_nodes):
+            #print(nid, name)
+            if name.startswith('Sub') or name.startswith('_minus'):
                 find_sub = True
-            if node.name.startswith('Mul') or node.name.startswith('_mul'):
+            if name.startswith('Mul') or name.startswith('_mul'):
                 find_mul = True
         if find_sub and find_mul:
             #mxnet arcface model
@@ -49,6 +50,8 @@ class ArcFaceONNX:
         input_name = input_cfg.name
         self.input_size = tuple(input_shape[2:4][::-1])
         self.input_shape = input_shape
+        #dynamic batch axis: all faces of an image can go through one run
+        self.batchable = not isinstance(input_shape[0], int)
         outputs = self.session.get_outputs()
         output_names = []
         for out in outputs:
@@ -60,13 +63,26 @@ class ArcFaceONNX:
 
     def prepare(self, ctx_id, **kwargs):
         if ctx_id<0:
-            self.session.set_providers(['CPUExecutionProvider'])
+            self.session = cpu_session(self.session)
 
     def get(self, img, face):
         aimg = face_align.norm_crop(img, landmark=face.kps, image_size=self.input_size[0])
         face.embedding = self.get_feat(aimg).flatten()
         return face.embedding
 
+    def get_batch(self, img, faces):
+        if len(faces)==0:
+            return []
+        #img is either the source image of all faces or a list with one image per face
+        imgs = img if isinstance(img, (list, tuple)) else [img] * len(faces)
+        if not self.batchable:
+            return [self.get(_img, face) for _img, face in zip(imgs, faces)]
+        aimgs = face_align.norm_crop_batch(imgs, [face.kps for face in faces], image_size=self.input_size[0])
+        feats = self.get_feat(aimgs)
+        for face, feat in zip(faces, feats):
+            face.embedding = feat.flatten()
+        return [face.embedding for face in faces]
+
     def compute_sim(self, feat1, feat2):
         from numpy.linalg import norm
         feat1 = feat1.ravel()
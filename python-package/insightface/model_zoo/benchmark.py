@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# @Organization  : insightface.ai
+# @Function      : Stage-wise latency/throughput benchmark of model_zoo models
+
+import glob
+import os
+import os.path as osp
+import platform
+import time
+
+import cv2
+import numpy as np
+import onnxruntime
+
+from .. import __version__
+from .model_zoo import get_model
+
+__all__ = ['STAGES', 'find_model_files', 'summarize', 'benchmark_model', 'run_benchmark']
+
+#blobFromImages, session.run and the task's decoding, timed separately per batch
+STAGES = ['preprocess', 'inference', 'postprocess', 'total']
+
+
+def find_model_files(name, root='~/.insightface'):
+    """All .onnx files behind name: a file, a directory or a model pack under root/models."""
+    if name.endswith('.onnx'):
+        return [name]
+    model_dir = name if osp.isdir(name) else osp.join(osp.expanduser(root), 'models', name)
+    paths = sorted(glob.glob(osp.join(model_dir, '*.onnx')))
+    if len(paths) == 0:
+        raise ValueError('no onnx model found for %s' % name)
+    return paths
+
+
+def summarize(costs, batch_size):
+    """Latency percentiles (ms) and throughput of per-batch costs in seconds."""
+    costs = np.asarray(costs, dtype=np.float64)
+    p50, p95, p99 = np.percentile(costs, [50, 95, 99]) * 1000.0
+    return {
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'mean_ms': float(costs.mean() * 1000.0),
+        'images_per_sec': float(batch_size * len(costs) / costs.sum()),
+    }
+
+
+def _input_size(model, det_size):
+    if model.taskname == 'detection' and model.input_size is None:
+        return tuple(det_size)
+    return tuple(model.input_size)
+
+
+def _postprocess_fn(model, input_size):
+    #the decoding each task runs in FaceAnalysis after session.run, faces are plain dicts here
+    taskname = getattr(model, 'taskname', None) or ''
+    if taskname == 'recognition':
+        def postprocess(net_outs, imgs):
+            feats = net_outs[0]
+            return feats / np.linalg.norm(feats, axis=1, keepdims=True)
+    elif taskname == 'detection':
+        def postprocess(net_outs, imgs):
+            return [model._postprocess(img, 1.0, *model._decode(net_outs, i, input_size[1], input_size[0], model.det_thresh),
+                                       max_num=0, metric='default') for i, img in enumerate(imgs)]
+    elif taskname.startswith('landmark'):
+        M = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+        def postprocess(net_outs, imgs):
+            return [model._postprocess(pred, M, {}) for pred in net_outs[0]]
+    elif taskname == 'genderage' or taskname.startswith('attribute'):
+        def postprocess(net_outs, imgs):
+            return [model._postprocess(pred, {}) for pred in net_outs[0]]
+    else:
+        return None
+    return postprocess
+
+
+def benchmark_model(model, batch_sizes=(1,), images=None, warmup=5, repeat=50, det_size=(640, 640), seed=0):
+    """Time preprocess/inference/postprocess of one model_zoo model.
+
+    Args:
+        model: Model returned by get_model (recognition, detection, landmark
+            or attribute).
+        batch_sizes (list): Batch sizes to run, only 1 for models whose ONNX
+            graph has a fixed batch axis.
+        images (list): BGR images, resized to the model input; random images
+            if None.
+        warmup (int): Untimed runs per batch size.
+        repeat (int): Timed runs per batch size.
+        det_size (tuple): Input size of detection models without a fixed one.
+        seed (int): Seed of the random images.
+
+    Returns:
+        list of dict, one per batch size, with per-stage latency percentiles
+        and images/sec (see summarize).
+    """
+    input_size = _input_size(model, det_size)
+    postprocess = _postprocess_fn(model, input_size)
+    if postprocess is None:
+        raise ValueError('no benchmark for %s models' % model.taskname)
+    if images is None:
+        rng = np.random.RandomState(seed)
+        images = [rng.randint(0, 256, (input_size[1], input_size[0], 3), dtype=np.uint8) for _ in range(max(batch_sizes))]
+    else:
+        images = [cv2.resize(img, input_size) for img in images]
+    mean = (model.input_mean, model.input_mean, model.input_mean)
+
+    results = []
+    for batch_size in batch_sizes:
+        if batch_size > 1 and not model.batchable:
+            continue
+        imgs = [images[i % len(images)] for i in range(batch_size)]
+        costs = dict((stage, []) for stage in STAGES)
+        for it in range(warmup + repeat):
+            ta = time.perf_counter()
+            blob = cv2.dnn.blobFromImages(imgs, 1.0 / model.input_std, input_size, mean, swapRB=True)
+            tb = time.perf_counter()
+            net_outs = model.session.run(model.output_names, {model.input_name: blob})
+            tc = time.perf_counter()
+            postprocess(net_outs, imgs)
+            td = time.perf_counter()
+            if it < warmup:
+                continue
+            costs['preprocess'].append(tb - ta)
+            costs['inference'].append(tc - tb)
+            costs['postprocess'].append(td - tc)
+            costs['total'].append(td - ta)
+        results.append({
+            'batch_size': batch_size,
+            'stages': dict((stage, summarize(costs[stage], batch_size)) for stage in STAGES),
+        })
+    return results
+
+
+def run_benchmark(names, batch_sizes=(1,), intra_op_threads=(0,), execution_modes=('sequential',),
+                  session_profile='default', providers=None, root='~/.insightface', images=None,
+                  warmup=5, repeat=50, det_size=(640, 640), verbose=True):
+    """Sweep batch sizes, intra-op threads and execution modes over models.
+
+    Args:
+        names (list): Model files, directories or model pack names (every
+            .onnx of a pack is benchmarked).
+        intra_op_threads (list): intra_op_num_threads values, 0 for the
+            onnxruntime default, -k for cpu_count // k.
+        execution_modes (list): 'sequential' and/or 'parallel'.
+        session_profile (str): Base profile, see SESSION_PROFILES.
+        providers (list): Execution providers, CPU only if None.
+        Other arguments as in benchmark_model.
+
+    Returns:
+        dict with the environment under 'meta' and one entry per model,
+        thread count, execution mode and batch size under 'results'.
+    """
+    providers = providers or ['CPUExecutionProvider']
+    report = {
+        'meta': {
+            'insightface': __version__,
+            'onnxruntime': onnxruntime.__version__,
+            'providers': providers,
+            'session_profile': session_profile,
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'warmup': warmup,
+            'repeat': repeat,
+        },
+        'results': [],
+    }
+    for name in names:
+        for model_file in find_model_files(name, root):
+            for threads, execution_mode in [(t, m) for t in intra_op_threads for m in execution_modes]:
+                model = get_model(model_file, providers=providers, session_profile=session_profile,
+                                  intra_op_num_threads=threads, execution_mode=execution_mode)
+                if model is None or _postprocess_fn(model, det_size) is None:
+                    if verbose:
+                        print('skip %s: unsupported model' % model_file)
+                    break
+                for result in benchmark_model(model, batch_sizes, images, warmup, repeat, det_size):
+                    entry = {
+                        'model': osp.basename(model_file),
+                        'model_file': osp.abspath(model_file),
+                        'model_size_mb': osp.getsize(model_file) / (1024.0 * 1024.0),
+                        'task': model.taskname,
+                        'input_size': list(_input_size(model, det_size)),
+                        'intra_op_num_threads': threads,
+                        'execution_mode': execution_mode,
+                    }
+                    entry.update(result)
+                    report['results'].append(entry)
+                    if verbose:
+                        stages = result['stages']
+                        print('%s threads=%d %s batch=%d: %s' % (
+                            entry['model'], threads, execution_mode, result['batch_size'],
+                            ', '.join('%s p50 %.2fms p99 %.2fms %.1f img/s' % (
+                                stage, stages[stage]['p50_ms'], stages[stage]['p99_ms'], stages[stage]['images_per_sec'])
+                                for stage in STAGES)))
+    return report
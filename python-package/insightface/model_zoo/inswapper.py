@@ -2,9 +2,8 @@ import time
 import numpy as np
 import onnxruntime
 import cv2
-import onnx
-from onnx import numpy_helper
 from ..utils import face_align
+from .model_meta import load_model_meta
 
 
 
@@ -13,9 +12,8 @@ class INSwapper():
     def __init__(self, model_file=None, session=None):
         self.model_file = model_file
         self.session = session
-        model = onnx.load(self.model_file)
-        graph = model.graph
-        self.emap = numpy_helper.to_array(graph.initializer[-1])
+        #last initializer, cached next to the model file so the protobuf is parsed once
+        self.emap = load_model_meta(self.model_file, with_initializer=True)['last_initializer']
         self.input_mean = 0.0
         self.input_std = 255.0
         #print('input mean and std:', model_file, self.input_mean, self.input_std)
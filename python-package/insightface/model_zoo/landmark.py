@@ -7,9 +7,10 @@
 from __future__ import division
 import numpy as np
 import cv2
-import onnx
 import onnxruntime
 from ..utils import face_align
+from .model_meta import load_model_meta
+from .session_factory import cpu_session
 from ..utils import transform
 from ..data import get_object
 
@@ -25,15 +26,15 @@ class Landmark:
         self.session = session
         find_sub = False
         find_mul = False
-        model = onnx.load(self.model_file)
-        graph = model.graph
-        for nid, node in enumerate(graph.node[:8]):
-            #print(nid, node.name)
-            if node.name.startswith('Sub') or node.name.startswith('_minus'):
+        #first graph node names, cached next to the model file so the protobuf is parsed once
+        head_nodes = load_model_meta(self.model_file)['head_nodes']
+        for nid, name in enumerate(head_nodes):
+            #print(nid, name)
+            if name.startswith('Sub') or name.startswith('_minus'):
                 find_sub = True
-            if node.name.startswith('Mul') or node.name.startswith('_mul'):
+            if name.startswith('Mul') or name.startswith('_mul'):
                 find_mul = True
-            if nid<3 and node.name=='bn_data':
+            if nid<3 and name=='bn_data':
                 find_sub = True
                 find_mul = True
         if find_sub and find_mul:
@@ -53,6 +54,8 @@ class Landmark:
         input_name = input_cfg.name
         self.input_size = tuple(input_shape[2:4][::-1])
         self.input_shape = input_shape
+        #dynamic batch axis: all faces of an image can go through one run
+        self.batchable = not isinstance(input_shape[0], int)
         outputs = self.session.get_outputs()
         output_names = []
         for out in outputs:
@@ -75,9 +78,9 @@ class Landmark:
 
     def prepare(self, ctx_id, **kwargs):
         if ctx_id<0:
-            self.session.set_providers(['CPUExecutionProvider'])
+            self.session = cpu_session(self.session)
 
-    def get(self, img, face):
+    def _crop(self, img, face):
         bbox = face.bbox
         w, h = (bbox[2] - bbox[0]), (bbox[3] - bbox[1])
         center = (bbox[2] + bbox[0]) / 2, (bbox[3] + bbox[1]) / 2
@@ -85,10 +88,9 @@ class Landmark:
         _scale = self.input_size[0]  / (max(w, h)*1.5)
         #print('param:', img.shape, bbox, center, self.input_size, _scale, rotate)
         aimg, M = face_align.transform(img, center, self.input_size[0], _scale, rotate)
-        input_size = tuple(aimg.shape[0:2][::-1])
-        #assert input_size==self.input_size
-        blob = cv2.dnn.blobFromImage(aimg, 1.0/self.input_std, input_size, (self.input_mean, self.input_mean, self.input_mean), swapRB=True)
-        pred = self.session.run(self.output_names, {self.input_name : blob})[0][0]
+        return aimg, M
+
+    def _postprocess(self, pred, M, face):
         if pred.shape[0] >= 3000:
             pred = pred.reshape((-1, 3))
         else:
@@ -111,4 +113,25 @@ class Landmark:
             face['pose'] = pose #pitch, yaw, roll
         return pred
 
+    def get(self, img, face):
+        aimg, M = self._crop(img, face)
+        input_size = tuple(aimg.shape[0:2][::-1])
+        #assert input_size==self.input_size
+        blob = cv2.dnn.blobFromImage(aimg, 1.0/self.input_std, input_size, (self.input_mean, self.input_mean, self.input_mean), swapRB=True)
+        pred = self.session.run(self.output_names, {self.input_name : blob})[0][0]
+        return self._postprocess(pred, M, face)
+
+    def get_batch(self, img, faces):
+        if len(faces)==0:
+            return []
+        #img is either the source image of all faces or a list with one image per face
+        imgs = img if isinstance(img, (list, tuple)) else [img] * len(faces)
+        if not self.batchable:
+            return [self.get(_img, face) for _img, face in zip(imgs, faces)]
+        crops = [self._crop(_img, face) for _img, face in zip(imgs, faces)]
+        aimgs = [aimg for aimg, _ in crops]
+        blob = cv2.dnn.blobFromImages(aimgs, 1.0/self.input_std, self.input_size, (self.input_mean, self.input_mean, self.input_mean), swapRB=True)
+        preds = self.session.run(self.output_names, {self.input_name : blob})[0]
+        return [self._postprocess(pred, M, face) for pred, (_, M), face in zip(preds, crops, faces)]
+
 
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# @Organization  : insightface.ai
+# @Function      : Sidecar cache of the ONNX graph details read by model_zoo models
+
+import hashlib
+import json
+import os
+import os.path as osp
+
+import numpy as np
+
+__all__ = ['load_model_meta']
+
+META_VERSION = 1
+#number of leading graph nodes inspected to guess the input normalization
+NUM_HEAD_NODES = 8
+
+
+def _file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(1048576)
+            if not data:
+                break
+            sha1.update(data)
+    return sha1.hexdigest()
+
+
+def _meta_paths(model_file):
+    return model_file + '.meta.json', model_file + '.meta.npy'
+
+
+def _read_meta(meta_file):
+    try:
+        with open(meta_file, 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != META_VERSION:
+        return None
+    return meta
+
+
+def _write_atomic(path, write_fn):
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    except OSError:
+        #read-only model directory: keep working without the cache
+        if osp.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _dump_json(meta, path):
+    with open(path, 'w') as f:
+        json.dump(meta, f)
+
+
+def _save_npy(array, path):
+    with open(path, 'wb') as f:
+        np.save(f, array)
+
+
+def _parse_model(model_file, with_initializer):
+    import onnx
+    from onnx import numpy_helper
+    model = onnx.load(model_file)
+    graph = model.graph
+    head_nodes = [node.name for node in graph.node[:NUM_HEAD_NODES]]
+    last_initializer = None
+    if with_initializer:
+        last_initializer = numpy_helper.to_array(graph.initializer[-1])
+    return head_nodes, last_initializer
+
+
+def load_model_meta(model_file, with_initializer=False):
+    """Graph details the model classes need, without re-parsing the protobuf.
+
+    The first load parses the ONNX file once and stores the result next to it
+    (``<model>.meta.json`` and, for the last initializer, ``<model>.meta.npy``).
+    The cache entry is keyed by path, size, mtime and sha1: a touched but
+    identical file only costs one hash, a changed file is parsed again.
+
+    Args:
+        model_file (str): Path of the .onnx file.
+        with_initializer (bool): Also return the last graph initializer
+            (the INSwapper ``emap``).
+
+    Returns:
+        dict: ``head_nodes`` (names of the first graph nodes) and, when
+        requested, ``last_initializer`` (np.ndarray).
+    """
+    model_file = osp.abspath(model_file)
+    meta_file, array_file = _meta_paths(model_file)
+    stat = os.stat(model_file)
+    meta = _read_meta(meta_file)
+
+    valid = False
+    sha1 = None
+    if meta is not None and meta['path'] == model_file and meta['size'] == stat.st_size:
+        if meta['mtime_ns'] == stat.st_mtime_ns:
+            valid = True
+        else:
+            sha1 = _file_sha1(model_file)
+            valid = sha1 == meta['sha1']
+            if valid:
+                meta['mtime_ns'] = stat.st_mtime_ns
+                _write_atomic(meta_file, lambda path: _dump_json(meta, path))
+
+    last_initializer = None
+    if valid and with_initializer and meta.get('has_initializer'):
+        try:
+            last_initializer = np.load(array_file)
+        except (OSError, ValueError):
+            last_initializer = None
+
+    if not valid or (with_initializer and last_initializer is None):
+        head_nodes, last_initializer = _parse_model(model_file, with_initializer)
+        meta = {
+            'version': META_VERSION,
+            'path': model_file,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha1': meta['sha1'] if valid else (sha1 or _file_sha1(model_file)),
+            'head_nodes': head_nodes,
+            'has_initializer': last_initializer is not None,
+        }
+        if last_initializer is not None:
+            _write_atomic(array_file, lambda path: _save_npy(last_initializer, path))
+        _write_atomic(meta_file, lambda path: _dump_json(meta, path))
+
+    result = {'head_nodes': meta['head_nodes']}
+    if with_initializer:
+        result['last_initializer'] = last_initializer
+    return result
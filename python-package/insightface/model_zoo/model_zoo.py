@@ -14,6 +14,7 @@ from .retinaface import *
 from .landmark import *
 from .attribute import Attribute
 from .inswapper import INSwapper
+from .session_factory import create_session, SESSION_OPTION_KEYS
 from ..utils import download_onnx
 
 __all__ = ['get_model']
@@ -37,7 +38,7 @@ class ModelRouter:
         self.onnx_file = onnx_file
 
     def get_model(self, **kwargs):
-        session = PickableInferenceSession(self.onnx_file, **kwargs)
+        session = create_session(self.onnx_file, session_class=PickableInferenceSession, **kwargs)
         print(f'Applied providers: {session._providers}, with options: {session._provider_options}')
         inputs = session.get_inputs()
         input_cfg = inputs[0]
@@ -93,6 +94,8 @@ def get_model(name, **kwargs):
     router = ModelRouter(model_file)
     providers = kwargs.get('providers', get_default_providers())
     provider_options = kwargs.get('provider_options', get_default_provider_options())
-    model = router.get_model(providers=providers, provider_options=provider_options)
+    #session_profile, thread counts, optimized_model_dir, shared_session, ... (see session_factory)
+    session_kwargs = {key: kwargs[key] for key in SESSION_OPTION_KEYS if key in kwargs}
+    model = router.get_model(providers=providers, provider_options=provider_options, **session_kwargs)
     return model
 
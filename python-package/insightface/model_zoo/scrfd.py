@@ -7,7 +7,6 @@
 from __future__ import division
 import datetime
 import numpy as np
-import onnx
 import onnxruntime
 import os
 import os.path as osp
@@ -58,16 +57,12 @@ def distance2kps(points, distance, max_shape=None):
     Returns:
         Tensor: Decoded bboxes.
     """
-    preds = []
-    for i in range(0, distance.shape[1], 2):
-        px = points[:, i%2] + distance[:, i]
-        py = points[:, i%2+1] + distance[:, i+1]
-        if max_shape is not None:
-            px = px.clamp(min=0, max=max_shape[1])
-            py = py.clamp(min=0, max=max_shape[0])
-        preds.append(px)
-        preds.append(py)
-    return np.stack(preds, axis=-1)
+    num_points = distance.shape[0]
+    preds = distance.reshape((num_points, distance.shape[1] // 2, 2)) + points[:, np.newaxis, 0:2]
+    if max_shape is not None:
+        np.clip(preds[:, :, 0], 0, max_shape[1], out=preds[:, :, 0])
+        np.clip(preds[:, :, 1], 0, max_shape[0], out=preds[:, :, 1])
+    return preds.reshape((num_points, distance.shape[1]))
 
 class SCRFD:
     def __init__(self, model_file=None, session=None):
@@ -99,6 +94,8 @@ class SCRFD:
         outputs = self.session.get_outputs()
         if len(outputs[0].shape) == 3:
             self.batched = True
+        #batched outputs and a dynamic batch axis: several images can go through one run
+        self.batchable = self.batched and not isinstance(input_shape[0], int)
         output_names = []
         for o in outputs:
             output_names.append(o.name)
@@ -132,7 +129,8 @@ class SCRFD:
 
     def prepare(self, ctx_id, **kwargs):
         if ctx_id<0:
-            self.session.set_providers(['CPUExecutionProvider'])
+            from .session_factory import cpu_session
+            self.session = cpu_session(self.session)
         nms_thresh = kwargs.get('nms_thresh', None)
         if nms_thresh is not None:
             self.nms_thresh = nms_thresh
@@ -147,31 +145,36 @@ class SCRFD:
                 self.input_size = input_size
 
     def forward(self, img, threshold):
-        scores_list = []
-        bboxes_list = []
-        kpss_list = []
         input_size = tuple(img.shape[0:2][::-1])
         blob = cv2.dnn.blobFromImage(img, 1.0/self.input_std, input_size, (self.input_mean, self.input_mean, self.input_mean), swapRB=True)
         net_outs = self.session.run(self.output_names, {self.input_name : blob})
+        return self._decode(net_outs, 0, blob.shape[2], blob.shape[3], threshold)
+
+    def forward_batch(self, imgs, threshold):
+        #all images must share one (letterboxed) size
+        input_size = tuple(imgs[0].shape[0:2][::-1])
+        blob = cv2.dnn.blobFromImages(imgs, 1.0/self.input_std, input_size, (self.input_mean, self.input_mean, self.input_mean), swapRB=True)
+        net_outs = self.session.run(self.output_names, {self.input_name : blob})
+        return [self._decode(net_outs, i, blob.shape[2], blob.shape[3], threshold) for i in range(len(imgs))]
 
-        input_height = blob.shape[2]
-        input_width = blob.shape[3]
+    def _decode(self, net_outs, batch_idx, input_height, input_width, threshold):
+        scores_list = []
+        bboxes_list = []
+        kpss_list = []
         fmc = self.fmc
         for idx, stride in enumerate(self._feat_stride_fpn):
-            # If model support batch dim, take first output
+            # If model support batch dim, take the outputs of image batch_idx
             if self.batched:
-                scores = net_outs[idx][0]
-                bbox_preds = net_outs[idx + fmc][0]
-                bbox_preds = bbox_preds * stride
+                scores = net_outs[idx][batch_idx]
+                bbox_preds = net_outs[idx + fmc][batch_idx]
                 if self.use_kps:
-                    kps_preds = net_outs[idx + fmc * 2][0] * stride
+                    kps_preds = net_outs[idx + fmc * 2][batch_idx]
             # If model doesn't support batching take output as is
             else:
                 scores = net_outs[idx]
                 bbox_preds = net_outs[idx + fmc]
-                bbox_preds = bbox_preds * stride
                 if self.use_kps:
-                    kps_preds = net_outs[idx + fmc * 2] * stride
+                    kps_preds = net_outs[idx + fmc * 2]
 
             height = input_height // stride
             width = input_width // stride
@@ -203,24 +206,20 @@ class SCRFD:
                 if len(self.center_cache)<100:
                     self.center_cache[key] = anchor_centers
 
+            #threshold first, then decode only the surviving anchors
             pos_inds = np.where(scores>=threshold)[0]
-            bboxes = distance2bbox(anchor_centers, bbox_preds)
             pos_scores = scores[pos_inds]
-            pos_bboxes = bboxes[pos_inds]
+            pos_centers = anchor_centers[pos_inds]
+            pos_bboxes = distance2bbox(pos_centers, bbox_preds[pos_inds] * stride)
             scores_list.append(pos_scores)
             bboxes_list.append(pos_bboxes)
             if self.use_kps:
-                kpss = distance2kps(anchor_centers, kps_preds)
-                #kpss = kps_preds
-                kpss = kpss.reshape( (kpss.shape[0], -1, 2) )
-                pos_kpss = kpss[pos_inds]
+                pos_kpss = distance2kps(pos_centers, kps_preds[pos_inds] * stride)
+                pos_kpss = pos_kpss.reshape( (pos_kpss.shape[0], kps_preds.shape[1]//2, 2) )
                 kpss_list.append(pos_kpss)
         return scores_list, bboxes_list, kpss_list
 
-    def detect(self, img, input_size = None, max_num=0, metric='default'):
-        assert input_size is not None or self.input_size is not None
-        input_size = self.input_size if input_size is None else input_size
-            
+    def _letterbox(self, img, input_size):
         im_ratio = float(img.shape[0]) / img.shape[1]
         model_ratio = float(input_size[1]) / input_size[0]
         if im_ratio>model_ratio:
@@ -233,9 +232,30 @@ class SCRFD:
         resized_img = cv2.resize(img, (new_width, new_height))
         det_img = np.zeros( (input_size[1], input_size[0], 3), dtype=np.uint8 )
         det_img[:new_height, :new_width, :] = resized_img
+        return det_img, det_scale
 
+    def detect(self, img, input_size = None, max_num=0, metric='default'):
+        assert input_size is not None or self.input_size is not None
+        input_size = self.input_size if input_size is None else input_size
+
+        det_img, det_scale = self._letterbox(img, input_size)
         scores_list, bboxes_list, kpss_list = self.forward(det_img, self.det_thresh)
+        return self._postprocess(img, det_scale, scores_list, bboxes_list, kpss_list, max_num, metric)
 
+    def detect_batch(self, imgs, input_size = None, max_num=0, metric='default'):
+        assert input_size is not None or self.input_size is not None
+        input_size = self.input_size if input_size is None else input_size
+        if len(imgs)==0:
+            return []
+        if not self.batchable:
+            return [self.detect(img, input_size, max_num, metric) for img in imgs]
+
+        letterboxed = [self._letterbox(img, input_size) for img in imgs]
+        outs = self.forward_batch([det_img for det_img, _ in letterboxed], self.det_thresh)
+        return [self._postprocess(img, det_scale, scores_list, bboxes_list, kpss_list, max_num, metric)
+                for img, (_, det_scale), (scores_list, bboxes_list, kpss_list) in zip(imgs, letterboxed, outs)]
+
+    def _postprocess(self, img, det_scale, scores_list, bboxes_list, kpss_list, max_num, metric):
         scores = np.vstack(scores_list)
         scores_ravel = scores.ravel()
         order = scores_ravel.argsort()[::-1]
@@ -272,33 +292,39 @@ class SCRFD:
                 kpss = kpss[bindex, :]
         return det, kpss
 
-    def nms(self, dets):
+    def nms(self, dets, block_size=64):
         thresh = self.nms_thresh
-        x1 = dets[:, 0]
-        y1 = dets[:, 1]
-        x2 = dets[:, 2]
-        y2 = dets[:, 3]
-        scores = dets[:, 4]
-
+        order = dets[:, 4].argsort()[::-1]
+        x1 = dets[order, 0]
+        y1 = dets[order, 1]
+        x2 = dets[order, 2]
+        y2 = dets[order, 3]
         areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-        order = scores.argsort()[::-1]
 
+        #blockwise greedy NMS: the next block of surviving boxes is compared
+        #with all surviving boxes in one shot, only kept boxes suppress others,
+        #and suppressed boxes drop out before the next block
+        alive = np.arange(order.shape[0])
         keep = []
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
-            xx1 = np.maximum(x1[i], x1[order[1:]])
-            yy1 = np.maximum(y1[i], y1[order[1:]])
-            xx2 = np.minimum(x2[i], x2[order[1:]])
-            yy2 = np.minimum(y2[i], y2[order[1:]])
-
+        while alive.size > 0:
+            rows = alive[:block_size]
+            xx1 = np.maximum(x1[rows, np.newaxis], x1[alive])
+            yy1 = np.maximum(y1[rows, np.newaxis], y1[alive])
+            xx2 = np.minimum(x2[rows, np.newaxis], x2[alive])
+            yy2 = np.minimum(y2[rows, np.newaxis], y2[alive])
             w = np.maximum(0.0, xx2 - xx1 + 1)
             h = np.maximum(0.0, yy2 - yy1 + 1)
             inter = w * h
-            ovr = inter / (areas[i] + areas[order[1:]] - inter)
-
-            inds = np.where(ovr <= thresh)[0]
-            order = order[inds + 1]
+            ovr = inter / (areas[rows, np.newaxis] + areas[alive] - inter)
+            over = ovr > thresh
+            suppressed = np.zeros(alive.size, dtype=bool)
+            for r in range(rows.size):
+                if suppressed[r]:
+                    continue
+                keep.append(order[rows[r]])
+                suppressed |= over[r]
+            suppressed[:rows.size] = True
+            alive = alive[~suppressed]
 
         return keep
 
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# @Organization  : insightface.ai
+# @Function      : Tunable, shareable ONNX Runtime sessions for model_zoo
+
+import os
+import os.path as osp
+import platform
+import threading
+import weakref
+
+import onnxruntime
+
+__all__ = ['SESSION_PROFILES', 'SESSION_OPTION_KEYS', 'create_session_options', 'create_session', 'cpu_session',
+           'clear_shared_sessions']
+
+#named performance profiles, explicit keyword arguments override them
+#  latency:    one request at a time gets every core
+#  throughput: many concurrent session.run calls, each on a few non-spinning threads
+SESSION_PROFILES = {
+    'default': {},
+    'latency': {
+        'intra_op_num_threads': 0,
+        'inter_op_num_threads': 1,
+        'execution_mode': 'sequential',
+        'graph_optimization_level': 'all',
+        'allow_spinning': True,
+    },
+    'throughput': {
+        'intra_op_num_threads': -4,
+        'inter_op_num_threads': 1,
+        'execution_mode': 'sequential',
+        'graph_optimization_level': 'all',
+        'allow_spinning': False,
+    },
+}
+
+#keyword arguments of get_model/FaceAnalysis that are forwarded to create_session
+SESSION_OPTION_KEYS = ['session_profile', 'intra_op_num_threads', 'inter_op_num_threads', 'execution_mode',
+                       'graph_optimization_level', 'allow_spinning', 'enable_cpu_mem_arena', 'enable_mem_pattern',
+                       'optimized_model_dir', 'shared_session']
+
+_OPT_LEVELS = {
+    'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_EXECUTION_MODES = {
+    'sequential': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+_shared_sessions = {}
+_shared_lock = threading.Lock()
+#create_session arguments of every session it made, to rebuild one for other providers
+_session_args = weakref.WeakKeyDictionary()
+
+
+def _resolve_threads(num_threads):
+    #0 keeps the onnxruntime default (one thread per physical core),
+    #a negative value -k means cpu_count // k
+    if num_threads is None or num_threads >= 0:
+        return num_threads
+    return max(1, (os.cpu_count() or 1) // -num_threads)
+
+
+def _profile_settings(session_profile, **overrides):
+    if session_profile not in SESSION_PROFILES:
+        raise ValueError('unknown session profile %s, expected one of %s' % (session_profile, sorted(SESSION_PROFILES)))
+    settings = dict(SESSION_PROFILES[session_profile])
+    for key, value in overrides.items():
+        if value is not None:
+            settings[key] = value
+    return settings
+
+
+def create_session_options(session_profile='default', intra_op_num_threads=None, inter_op_num_threads=None,
+                           execution_mode=None, graph_optimization_level=None, allow_spinning=None,
+                           enable_cpu_mem_arena=None, enable_mem_pattern=None):
+    """Build onnxruntime.SessionOptions from a named profile plus overrides.
+
+    Args:
+        session_profile (str): 'default', 'latency' or 'throughput'.
+        intra_op_num_threads (int): Threads inside one operator, 0 for the
+            onnxruntime default, -k for cpu_count // k.
+        inter_op_num_threads (int): Threads across operators (parallel mode).
+        execution_mode (str): 'sequential' or 'parallel'.
+        graph_optimization_level (str): 'disable', 'basic', 'extended' or 'all'.
+        allow_spinning (bool): Let idle intra-op threads spin for new work.
+        enable_cpu_mem_arena (bool): Use the CPU memory arena.
+        enable_mem_pattern (bool): Pre-plan allocations from the first run.
+
+    Returns:
+        onnxruntime.SessionOptions
+    """
+    settings = _profile_settings(session_profile or 'default',
+                                 intra_op_num_threads=intra_op_num_threads,
+                                 inter_op_num_threads=inter_op_num_threads,
+                                 execution_mode=execution_mode,
+                                 graph_optimization_level=graph_optimization_level,
+                                 allow_spinning=allow_spinning,
+                                 enable_cpu_mem_arena=enable_cpu_mem_arena,
+                                 enable_mem_pattern=enable_mem_pattern)
+    sess_options = onnxruntime.SessionOptions()
+    if settings.get('intra_op_num_threads') is not None:
+        sess_options.intra_op_num_threads = _resolve_threads(settings['intra_op_num_threads'])
+    if settings.get('inter_op_num_threads') is not None:
+        sess_options.inter_op_num_threads = _resolve_threads(settings['inter_op_num_threads'])
+    if settings.get('execution_mode') is not None:
+        sess_options.execution_mode = _EXECUTION_MODES[settings['execution_mode']]
+    if settings.get('graph_optimization_level') is not None:
+        sess_options.graph_optimization_level = _OPT_LEVELS[settings['graph_optimization_level']]
+    if settings.get('allow_spinning') is not None:
+        sess_options.add_session_config_entry('session.intra_op.allow_spinning', '1' if settings['allow_spinning'] else '0')
+    if settings.get('enable_cpu_mem_arena') is not None:
+        sess_options.enable_cpu_mem_arena = settings['enable_cpu_mem_arena']
+    if settings.get('enable_mem_pattern') is not None:
+        sess_options.enable_mem_pattern = settings['enable_mem_pattern']
+    return sess_options
+
+
+def _optimized_model_path(model_file, optimized_model_dir, providers, optimization_level):
+    #optimized graphs depend on the source file, the optimization level and
+    #the execution providers actually available here, so all of them are
+    #part of the cache file name
+    stat = os.stat(model_file)
+    available = set(onnxruntime.get_available_providers())
+    names = [p if isinstance(p, str) else p[0] for p in providers]
+    provider_tag = '-'.join(p for p in names if p in available).replace('ExecutionProvider', '')
+    name = '%s.%s.%s.%d.%d.%d.onnx' % (osp.splitext(osp.basename(model_file))[0], provider_tag or 'default',
+                                        platform.machine(), int(optimization_level),
+                                        stat.st_size, stat.st_mtime_ns)
+    return osp.join(osp.expanduser(optimized_model_dir), name)
+
+
+def _save_optimized_model(session_class, model_file, optimized_file, sess_options, providers, provider_options):
+    #written under a private name and renamed into place, so that processes
+    #starting together never load a half-written graph
+    os.makedirs(osp.dirname(optimized_file), exist_ok=True)
+    tmp_file = '%s.%d.%d.tmp.onnx' % (optimized_file[:-len('.onnx')], os.getpid(), threading.get_ident())
+    sess_options.optimized_model_filepath = tmp_file
+    try:
+        session = session_class(model_file, sess_options=sess_options, providers=providers,
+                                provider_options=provider_options)
+        os.replace(tmp_file, optimized_file)
+    finally:
+        if osp.exists(tmp_file):
+            os.remove(tmp_file)
+    return session
+
+
+def create_session(model_file, providers=None, provider_options=None, session_profile='default',
+                   optimized_model_dir=None, shared_session=False, session_class=None, **option_kwargs):
+    """Create (or reuse) an InferenceSession for model_file.
+
+    Args:
+        model_file (str): Path of the .onnx file.
+        providers (list): Execution providers, onnxruntime default if None.
+        provider_options (list): Per-provider options.
+        session_profile (str): Named profile, see SESSION_PROFILES.
+        optimized_model_dir (str): Directory for pre-optimized graphs. The
+            first load writes the graph optimized up to the 'extended' level
+            there, later loads read it back and only run the optimizations
+            above that level.
+        shared_session (bool): Return the session already created in this
+            process for the same file, providers and options, if any.
+        session_class (type): InferenceSession subclass to instantiate.
+        **option_kwargs: Overrides passed to create_session_options.
+
+    Returns:
+        onnxruntime.InferenceSession
+    """
+    session_class = session_class or onnxruntime.InferenceSession
+    args = dict(option_kwargs, model_file=model_file, providers=providers, provider_options=provider_options,
+                session_profile=session_profile, optimized_model_dir=optimized_model_dir,
+                shared_session=shared_session, session_class=session_class)
+    key = None
+    if shared_session:
+        #a shared session is never switched to other providers (see cpu_session),
+        #so the requested providers identify it
+        key = (osp.abspath(model_file), repr(providers), repr(provider_options), session_profile,
+               repr(optimized_model_dir), repr(sorted(option_kwargs.items())))
+        with _shared_lock:
+            session = _shared_sessions.get(key)
+        if session is not None:
+            return session
+
+    sess_options = create_session_options(session_profile, **option_kwargs)
+    session = None
+    if optimized_model_dir is None:
+        session = session_class(model_file, sess_options=sess_options, providers=providers, provider_options=provider_options)
+    else:
+        #graphs saved at the 'all' level carry layouts (NCHWc) specific to the
+        #CPU that wrote them, so the cache stops at 'extended' and 'all' is
+        #applied again on every load
+        level = sess_options.graph_optimization_level
+        full_level = int(level) > int(_OPT_LEVELS['extended'])
+        save_level = _OPT_LEVELS['extended'] if full_level else level
+        optimized_file = _optimized_model_path(model_file, optimized_model_dir, providers or [], save_level)
+        if not osp.exists(optimized_file):
+            if full_level:
+                save_options = create_session_options(session_profile, **option_kwargs)
+                save_options.graph_optimization_level = save_level
+                _save_optimized_model(onnxruntime.InferenceSession, model_file, optimized_file, save_options,
+                                      providers, provider_options)
+            else:
+                session = _save_optimized_model(session_class, model_file, optimized_file, sess_options,
+                                                providers, provider_options)
+        if session is None:
+            if not full_level:
+                sess_options.graph_optimization_level = _OPT_LEVELS['disable']
+            session = session_class(optimized_file, sess_options=sess_options, providers=providers,
+                                    provider_options=provider_options)
+
+    if key is not None:
+        with _shared_lock:
+            session = _shared_sessions.setdefault(key, session)
+    _session_args[session] = args
+    return session
+
+
+def cpu_session(session):
+    """Session running the same model on CPUExecutionProvider only.
+
+    Used by the models' prepare(ctx_id<0). A shared session is left untouched
+    for its other holders and a CPU session is created (or shared) instead,
+    any other session is switched in place with set_providers.
+    """
+    if session.get_providers() == ['CPUExecutionProvider']:
+        return session
+    args = _session_args.get(session)
+    if args is None or not args['shared_session']:
+        session.set_providers(['CPUExecutionProvider'])
+        return session
+    return create_session(**dict(args, providers=['CPUExecutionProvider'], provider_options=None))
+
+
+def clear_shared_sessions():
+    """Drop the process-wide shared sessions (they are freed once unreferenced)."""
+    with _shared_lock:
+        _shared_sessions.clear()
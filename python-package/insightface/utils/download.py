@@ -3,8 +3,6 @@ This code file mainly comes from https://github.com/dmlc/gluon-cv/blob/master/gl
 """
 import os
 import hashlib
-import requests
-from tqdm import tqdm
 
 
 def check_sha1(filename, sha1_hash):
@@ -67,6 +65,9 @@ def download_file(url, path=None, overwrite=False, sha1_hash=None):
         if not os.path.exists(dirname):
             os.makedirs(dirname)
 
+        #requests/tqdm are only needed when a file is actually fetched
+        import requests
+        from tqdm import tqdm
         print('Downloading %s from %s...' % (fname, url))
         r = requests.get(url, stream=True)
         if r.status_code != 200:
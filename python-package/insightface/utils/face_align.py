@@ -1,6 +1,5 @@
 import cv2
 import numpy as np
-from skimage import transform as trans
 
 
 arcface_dst = np.array(
@@ -8,8 +7,40 @@ arcface_dst = np.array(
      [41.5493, 92.3655], [70.7299, 92.2041]],
     dtype=np.float32)
 
-def estimate_norm(lmk, image_size=112,mode='arcface'):
-    assert lmk.shape == (5, 2)
+def umeyama(src, dst):
+    """Closed-form least-squares similarity transform (Umeyama, 2D).
+
+    Args:
+        src: (K, 2) or (N, K, 2) source points.
+        dst: (K, 2) or (N, K, 2) destination points, broadcast against src.
+
+    Returns:
+        (2, 3) or (N, 2, 3) affine matrices mapping src onto dst.
+    """
+    src = np.asarray(src, dtype=np.float64)
+    dst = np.asarray(dst, dtype=np.float64)
+    single = src.ndim == 2 and dst.ndim == 2
+    src, dst = np.broadcast_arrays(src.reshape((-1, ) + src.shape[-2:]),
+                                   dst.reshape((-1, ) + dst.shape[-2:]))
+    src_mean = src.mean(axis=1)
+    dst_mean = dst.mean(axis=1)
+    sx = src[:, :, 0] - src_mean[:, 0:1]
+    sy = src[:, :, 1] - src_mean[:, 1:2]
+    dx = dst[:, :, 0] - dst_mean[:, 0:1]
+    dy = dst[:, :, 1] - dst_mean[:, 1:2]
+    # M[:2, :2] = [[a, -b], [b, a]], i.e. scale * rotation
+    denom = (sx * sx + sy * sy).sum(axis=1)
+    a = (sx * dx + sy * dy).sum(axis=1) / denom
+    b = (sx * dy - sy * dx).sum(axis=1) / denom
+    M = np.empty((src.shape[0], 2, 3), dtype=np.float64)
+    M[:, 0, 0] = a
+    M[:, 0, 1] = -b
+    M[:, 1, 0] = b
+    M[:, 1, 1] = a
+    M[:, :, 2] = dst_mean - np.einsum('nij,nj->ni', M[:, :, 0:2], src_mean)
+    return M[0] if single else M
+
+def _norm_dst(image_size):
     assert image_size%112==0 or image_size%128==0
     if image_size%112==0:
         ratio = float(image_size)/112.0
@@ -19,11 +50,18 @@ def estimate_norm(lmk, image_size=112,mode='arcface'):
         diff_x = 8.0*ratio
     dst = arcface_dst * ratio
     dst[:,0] += diff_x
-    tform = trans.SimilarityTransform()
-    tform.estimate(lmk, dst)
-    M = tform.params[0:2, :]
+    return dst
+
+def estimate_norm(lmk, image_size=112,mode='arcface'):
+    assert lmk.shape == (5, 2)
+    M = umeyama(lmk, _norm_dst(image_size))
     return M
 
+def estimate_norm_batch(lmks, image_size=112, mode='arcface'):
+    lmks = np.asarray(lmks)
+    assert lmks.shape[1:] == (5, 2)
+    return umeyama(lmks.reshape(-1, 5, 2), _norm_dst(image_size))
+
 def norm_crop(img, landmark, image_size=112, mode='arcface'):
     M = estimate_norm(landmark, image_size, mode)
     warped = cv2.warpAffine(img, M, (image_size, image_size), borderValue=0.0)
@@ -34,6 +72,14 @@ def norm_crop2(img, landmark, image_size=112, mode='arcface'):
     warped = cv2.warpAffine(img, M, (image_size, image_size), borderValue=0.0)
     return warped, M
 
+def norm_crop_batch(img, landmarks, image_size=112, mode='arcface'):
+    #img is either the source image of all faces or a list with one image per face
+    if len(landmarks) == 0:
+        return []
+    Ms = estimate_norm_batch(landmarks, image_size, mode)
+    imgs = img if isinstance(img, (list, tuple)) else [img] * len(Ms)
+    return [cv2.warpAffine(_img, M, (image_size, image_size), borderValue=0.0) for _img, M in zip(imgs, Ms)]
+
 def square_crop(im, S):
     if im.shape[0] > im.shape[1]:
         height = S
@@ -53,15 +99,14 @@ def transform(data, center, output_size, scale, rotation):
     scale_ratio = scale
     rot = float(rotation) * np.pi / 180.0
     #translation = (output_size/2-center[0]*scale_ratio, output_size/2-center[1]*scale_ratio)
-    t1 = trans.SimilarityTransform(scale=scale_ratio)
+    #scale, move the scaled center to the origin, rotate, move it to the crop center
+    cos = np.cos(rot)
+    sin = np.sin(rot)
     cx = center[0] * scale_ratio
     cy = center[1] * scale_ratio
-    t2 = trans.SimilarityTransform(translation=(-1 * cx, -1 * cy))
-    t3 = trans.SimilarityTransform(rotation=rot)
-    t4 = trans.SimilarityTransform(translation=(output_size / 2,
-                                                output_size / 2))
-    t = t1 + t2 + t3 + t4
-    M = t.params[0:2]
+    M = np.array([[scale_ratio * cos, -scale_ratio * sin, output_size / 2 - (cos * cx - sin * cy)],
+                  [scale_ratio * sin, scale_ratio * cos, output_size / 2 - (sin * cx + cos * cy)]],
+                 dtype=np.float64)
     cropped = cv2.warpAffine(data,
                              M, (output_size, output_size),
                              borderValue=0.0)
@@ -69,28 +114,16 @@ def transform(data, center, output_size, scale, rotation):
 
 
 def trans_points2d(pts, M):
-    new_pts = np.zeros(shape=pts.shape, dtype=np.float32)
-    for i in range(pts.shape[0]):
-        pt = pts[i]
-        new_pt = np.array([pt[0], pt[1], 1.], dtype=np.float32)
-        new_pt = np.dot(M, new_pt)
-        #print('new_pt', new_pt.shape, new_pt)
-        new_pts[i] = new_pt[0:2]
-
-    return new_pts
+    new_pts = pts[:, 0:2] @ M[:, 0:2].T + M[:, 2]
+    return new_pts.astype(np.float32)
 
 
 def trans_points3d(pts, M):
     scale = np.sqrt(M[0][0] * M[0][0] + M[0][1] * M[0][1])
     #print(scale)
-    new_pts = np.zeros(shape=pts.shape, dtype=np.float32)
-    for i in range(pts.shape[0]):
-        pt = pts[i]
-        new_pt = np.array([pt[0], pt[1], 1.], dtype=np.float32)
-        new_pt = np.dot(M, new_pt)
-        #print('new_pt', new_pt.shape, new_pt)
-        new_pts[i][0:2] = new_pt[0:2]
-        new_pts[i][2] = pts[i][2] * scale
+    new_pts = np.empty(shape=pts.shape, dtype=np.float32)
+    new_pts[:, 0:2] = pts[:, 0:2] @ M[:, 0:2].T + M[:, 2]
+    new_pts[:, 2] = pts[:, 2] * scale
 
     return new_pts
 
@@ -100,4 +133,3 @@ def trans_points(pts, M):
         return trans_points2d(pts, M)
     else:
         return trans_points3d(pts, M)
-
@@ -9,10 +9,10 @@ import sys
 import argparse
 import glob
 import numpy.matlib
-import heapq
 import math
 from datetime import datetime as dt
 
+from scipy import sparse
 from sklearn import preprocessing
 sys.path.append('./recognition')
 from embedding import Embedding
@@ -86,27 +86,24 @@ def image2template_feature(img_feats=None,
     unique_subjectids = choose_ids[indices]
     template_feats = np.zeros((len(unique_templates), img_feats.shape[1]))
 
-    for count_template, uqt in enumerate(unique_templates):
-        (ind_t, ) = np.where(templates == uqt)
-        face_norm_feats = img_feats[ind_t]
-        face_medias = medias[ind_t]
-        unique_medias, unique_media_counts = np.unique(face_medias,
-                                                       return_counts=True)
-        media_norm_feats = []
-        for u, ct in zip(unique_medias, unique_media_counts):
-            (ind_m, ) = np.where(face_medias == u)
-            if ct == 1:
-                media_norm_feats += [face_norm_feats[ind_m]]
-            else:  # image features from the same video will be aggregated into one feature
-                media_norm_feats += [
-                    np.mean(face_norm_feats[ind_m], 0, keepdims=True)
-                ]
-        media_norm_feats = np.array(media_norm_feats)
-        # media_norm_feats = media_norm_feats / np.sqrt(np.sum(media_norm_feats ** 2, -1, keepdims=True))
-        template_feats[count_template] = np.sum(media_norm_feats, 0)
-        if count_template % 2000 == 0:
-            print('Finish Calculating {} template features.'.format(
-                count_template))
+    # one lexsort groups the images of the chosen templates by (template, media).
+    # Every image weighs 1 / (frames of its media), so a weighted segment sum
+    # per template is the sum of its media features, frames of the same video
+    # being averaged.
+    (ind_t, ) = np.where(np.isin(templates, unique_templates))
+    template_ids = np.searchsorted(unique_templates, templates[ind_t])
+    order = np.lexsort((medias[ind_t], template_ids))
+    ind_t = ind_t[order]
+    template_ids = template_ids[order]
+    face_medias = medias[ind_t]
+    media_start = np.flatnonzero(np.r_[True, (template_ids[1:] != template_ids[:-1]) |
+                                       (face_medias[1:] != face_medias[:-1])])
+    media_counts = np.diff(np.r_[media_start, len(ind_t)])
+    weights = np.repeat(1.0 / media_counts, media_counts)
+    segment_sum = sparse.csr_matrix((weights, (template_ids, ind_t)),
+                                    shape=(len(unique_templates), len(templates)))
+    template_feats[:] = segment_sum @ img_feats.astype(np.float64, copy=False)
+    print('Finish Calculating {} template features.'.format(len(unique_templates)))
     template_norm_feats = template_feats / np.sqrt(
         np.sum(template_feats**2, -1, keepdims=True))
     return template_norm_feats, unique_templates, unique_subjectids
@@ -119,23 +116,19 @@ def verification(template_norm_feats=None,
     # ==========================================================
     #         Compute set-to-set Similarity Score.
     # ==========================================================
-    template2id = np.zeros((max(unique_templates) + 1, 1), dtype=int)
-    for count_template, uqt in enumerate(unique_templates):
-        template2id[uqt] = count_template
+    template2id = np.zeros(max(unique_templates) + 1, dtype=int)
+    template2id[unique_templates] = np.arange(len(unique_templates))
+    id1 = template2id[p1]
+    id2 = template2id[p2]
 
     score = np.zeros((len(p1), ))  # save cosine distance between pairs
 
-    total_pairs = np.array(range(len(p1)))
     batchsize = 100000  # small batchsize instead of all pairs in one batch due to the memory limiation
-    sublists = [
-        total_pairs[i:i + batchsize] for i in range(0, len(p1), batchsize)
-    ]
-    total_sublists = len(sublists)
-    for c, s in enumerate(sublists):
-        feat1 = template_norm_feats[template2id[p1[s]]]
-        feat2 = template_norm_feats[template2id[p2[s]]]
-        similarity_score = np.sum(feat1 * feat2, -1)
-        score[s] = similarity_score.flatten()
+    total_sublists = (len(p1) + batchsize - 1) // batchsize
+    for c, start in enumerate(range(0, len(p1), batchsize)):
+        s = slice(start, start + batchsize)
+        score[s] = np.einsum('ij,ij->i', template_norm_feats[id1[s]],
+                             template_norm_feats[id2[s]])
         if c % 10 == 0:
             print('Finish {}/{} pairs.'.format(c, total_sublists))
     return score
@@ -147,57 +140,53 @@ def read_score(path):
     return img_feats
 
 
-def evaluation(query_feats, gallery_feats, mask):
+def evaluation(query_feats, gallery_feats, mask, max_block_size=1 << 24):
+    # ==========================================================
+    # Query blocks are scored against the gallery one at a time, so at most
+    # max_block_size similarities are held in memory whatever the gallery
+    # size. Per block we keep the rank of the mated gallery entry and merge
+    # the block negatives into the running top-k needed for the FAR thresholds.
+    # ==========================================================
     Fars = [0.01, 0.1]
     print(query_feats.shape)
     print(gallery_feats.shape)
 
     query_num = query_feats.shape[0]
     gallery_num = gallery_feats.shape[0]
-
-    similarity = np.dot(query_feats, gallery_feats.T)
-    print('similarity shape', similarity.shape)
-    top_inds = np.argsort(-similarity)
-    print(top_inds.shape)
-
-    # calculate top1
-    correct_num = 0
-    for i in range(query_num):
-        j = top_inds[i, 0]
-        if j == mask[i]:
-            correct_num += 1
-    print("top1 = {}".format(correct_num / query_num))
-    # calculate top5
-    correct_num = 0
-    for i in range(query_num):
-        j = top_inds[i, 0:5]
-        if mask[i] in j:
-            correct_num += 1
-    print("top5 = {}".format(correct_num / query_num))
-    # calculate 10
-    correct_num = 0
-    for i in range(query_num):
-        j = top_inds[i, 0:10]
-        if mask[i] in j:
-            correct_num += 1
-    print("top10 = {}".format(correct_num / query_num))
+    mask = np.asarray(mask)
+    block_num = max(1, max_block_size // gallery_num)
+    print('query block', (block_num, gallery_num))
 
     neg_pair_num = query_num * gallery_num - query_num
     print(neg_pair_num)
     required_topk = [math.ceil(query_num * x) for x in Fars]
-    top_sims = similarity
-    # calculate fars and tprs
-    pos_sims = []
-    for i in range(query_num):
-        gt = mask[i]
-        pos_sims.append(top_sims[i, gt])
-        top_sims[i, gt] = -2.0
-
-    pos_sims = np.array(pos_sims)
+    neg_topk = max(required_topk)
+
+    pos_sims = np.zeros((query_num, ))
+    ranks = np.zeros((query_num, ), dtype=np.int64)
+    neg_sims = np.zeros((0, ))
+    for start in range(0, query_num, block_num):
+        end = min(start + block_num, query_num)
+        similarity = np.dot(query_feats[start:end], gallery_feats.T)
+        rows = np.arange(end - start)
+        gt_sims = similarity[rows, mask[start:end]]
+        pos_sims[start:end] = gt_sims
+        # number of gallery entries scored above the mated one
+        ranks[start:end] = np.sum(similarity > gt_sims[:, np.newaxis], 1)
+        similarity[rows, mask[start:end]] = -2.0
+        block_neg = similarity.ravel()
+        if block_neg.size > neg_topk:
+            block_neg = np.partition(block_neg, -neg_topk)[-neg_topk:]
+        neg_sims = np.concatenate([neg_sims, block_neg])
+        if neg_sims.size > neg_topk:
+            neg_sims = np.partition(neg_sims, -neg_topk)[-neg_topk:]
+
+    for k in [1, 5, 10]:
+        print("top{} = {}".format(k, np.sum(ranks < k) / query_num))
+
     print(pos_sims.shape)
-    neg_sims = top_sims[np.where(top_sims > -2.0)]
-    print("neg_sims num = {}".format(len(neg_sims)))
-    neg_sims = heapq.nlargest(max(required_topk), neg_sims)  # heap sort
+    neg_sims = neg_sims[neg_sims > -2.0]
+    neg_sims = np.sort(neg_sims)[::-1]
     print("after sorting , neg_sims num = {}".format(len(neg_sims)))
     for far, pos in zip(Fars, required_topk):
         th = neg_sims[pos - 1]
@@ -207,9 +196,12 @@ def evaluation(query_feats, gallery_feats, mask):
 
 
 def gen_mask(query_ids, reg_ids):
+    reg_pos = {}
+    for i, x in enumerate(reg_ids):
+        reg_pos.setdefault(x, []).append(i)
     mask = []
     for query_id in query_ids:
-        pos = [i for i, x in enumerate(reg_ids) if query_id == x]
+        pos = reg_pos.get(query_id, [])
         if len(pos) != 1:
             raise RuntimeError(
                 "RegIdsError with id = {}， duplicate = {} ".format(
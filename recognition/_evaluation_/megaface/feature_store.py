@@ -0,0 +1,142 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import json
+import sys
+import argparse
+import struct
+
+import numpy as np
+
+# One directory per image set instead of one tiny .bin per image:
+#   store.json    {"dim": D}
+#   features.f32  float32 rows, appended batch by batch (memory-mapped to read)
+#   index.txt     relative image path of every row, in row order
+# Rows are written and fsynced before their index lines, so after an
+# interrupted run the store is truncated to the rows that have both (a torn
+# last index line without its '\n' is dropped) and generation resumes there.
+
+
+class FeatureStore(object):
+    def __init__(self, root, dim=None):
+        self.root = root
+        self.meta_path = os.path.join(root, 'store.json')
+        self.feature_path = os.path.join(root, 'features.f32')
+        self.index_path = os.path.join(root, 'index.txt')
+        self.dim = None
+        self.paths = []
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                self.dim = json.load(f)['dim']
+            assert dim is None or dim == self.dim, 'store %s has dim %d, not %d' % (
+                root, self.dim, dim)
+            self.paths = self._recover()
+        elif dim is not None:
+            self._create(dim)
+        # without dim a new store is created by the first append
+        self.path2row = dict((p, i) for i, p in enumerate(self.paths))
+
+    def _create(self, dim):
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+        self.dim = dim
+        open(self.feature_path, 'wb').close()
+        open(self.index_path, 'w').close()
+        with open(self.meta_path, 'w') as f:
+            json.dump({'dim': dim}, f)
+
+    def _recover(self):
+        with open(self.index_path, 'r') as f:
+            lines = f.read().split('\n')
+        # the last element is '' when every line was completely written
+        paths = lines[:-1]
+        row_bytes = 4 * self.dim
+        num = min(len(paths), os.path.getsize(self.feature_path) // row_bytes)
+        if num * row_bytes != os.path.getsize(self.feature_path):
+            with open(self.feature_path, 'r+b') as f:
+                f.truncate(num * row_bytes)
+        if num != len(paths) or lines[-1]:
+            paths = paths[:num]
+            with open(self.index_path, 'w') as f:
+                f.writelines(p + '\n' for p in paths)
+        return paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, path):
+        return path in self.path2row
+
+    def append(self, paths, features):
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        if self.dim is None:
+            self._create(features.shape[1])
+        assert features.shape == (len(paths), self.dim)
+        with open(self.feature_path, 'ab') as f:
+            f.write(features.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.index_path, 'a') as f:
+            f.writelines(p + '\n' for p in paths)
+        for p in paths:
+            self.path2row[p] = len(self.paths)
+            self.paths.append(p)
+
+    def features(self, mode='r'):
+        assert self.dim is not None, 'no feature store at %s' % self.root
+        if len(self.paths) == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self.feature_path, dtype=np.float32, mode=mode,
+                         shape=(len(self.paths), self.dim))
+
+    def export(self, out_dir, algo):
+        # official devkit layout: <out_dir>/<relative path>_<algo>.bin
+        header = struct.pack('4i', self.dim, 1, 4, 5)
+        features = self.features()
+        made_dirs = set()
+        for i, p in enumerate(self.paths):
+            if i % 100000 == 0:
+                print("exporting", i)
+            out_path = os.path.join(out_dir, "%s_%s.bin" % (p, algo))
+            feature_dir_out = os.path.dirname(out_path)
+            if feature_dir_out not in made_dirs:
+                if not os.path.exists(feature_dir_out):
+                    os.makedirs(feature_dir_out)
+                made_dirs.add(feature_dir_out)
+            with open(out_path, 'wb') as f:
+                f.write(header)
+                f.write(features[i].tobytes())
+
+
+def create_store(root, paths, dim):
+    """(Re)create the store at root with one zero row per path, to be filled
+    through store.features('r+')."""
+    for name in ['store.json', 'features.f32', 'index.txt']:
+        if os.path.exists(os.path.join(root, name)):
+            os.remove(os.path.join(root, name))
+    store = FeatureStore(root, dim)
+    with open(store.feature_path, 'r+b') as f:
+        f.truncate(len(paths) * 4 * dim)
+    with open(store.index_path, 'w') as f:
+        f.writelines(p + '\n' for p in paths)
+    store.paths = list(paths)
+    store.path2row = dict((p, i) for i, p in enumerate(store.paths))
+    return store
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(
+        description='export a feature store to the per-file megaface layout')
+    parser.add_argument('store', type=str, help='feature store directory')
+    parser.add_argument('output', type=str, help='output directory')
+    parser.add_argument('--algo', type=str, help='', default='insightface')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_arguments(sys.argv[1:])
+    store = FeatureStore(args.store)
+    store.export(args.output, args.algo)
+    print('exported', len(store))
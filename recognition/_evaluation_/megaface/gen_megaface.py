@@ -15,6 +15,7 @@ import sklearn
 from sklearn.preprocessing import normalize
 import mxnet as mx
 from mxnet import ndarray as nd
+from feature_store import FeatureStore
 
 
 def read_img(image_path):
@@ -58,13 +59,17 @@ def write_bin(path, feature):
         f.write(struct.pack("%df" % len(feature), *feature))
 
 
-def get_and_write(buffer, nets):
+def get_and_write(buffer, nets, store=None):
     imgs = []
     for k in buffer:
         imgs.append(k[0])
     features = get_feature(imgs, nets)
     #print(np.linalg.norm(feature))
     assert features.shape[0] == len(buffer)
+    if store is not None:
+        # k[1] is the relative image path, one appended row per image
+        store.append([k[1] for k in buffer], features)
+        return
     for ik, k in enumerate(buffer):
         out_path = k[1]
         feature = features[ik].flatten()
@@ -100,6 +105,12 @@ def main(args):
 
     facescrub_out = os.path.join(args.output, 'facescrub')
     megaface_out = os.path.join(args.output, 'megaface')
+    facescrub_store = None
+    megaface_store = None
+    if args.store:
+        # resumable: images already in the store are skipped
+        facescrub_store = FeatureStore(os.path.join(args.output, 'facescrub_store'))
+        megaface_store = FeatureStore(os.path.join(args.output, 'megaface_store'))
 
     i = 0
     succ = 0
@@ -111,23 +122,29 @@ def main(args):
         image_path = line.strip()
         _path = image_path.split('/')
         a, b = _path[-2], _path[-1]
+        if facescrub_store is not None and '/'.join([a, b]) in facescrub_store:
+            succ += 1
+            continue
         out_dir = os.path.join(facescrub_out, a)
-        if not os.path.exists(out_dir):
+        if facescrub_store is None and not os.path.exists(out_dir):
             os.makedirs(out_dir)
         image_path = os.path.join(args.facescrub_root, image_path)
         img = read_img(image_path)
         if img is None:
             print('read error:', image_path)
             continue
-        out_path = os.path.join(out_dir, b + "_%s.bin" % (args.algo))
+        if facescrub_store is not None:
+            out_path = '/'.join([a, b])
+        else:
+            out_path = os.path.join(out_dir, b + "_%s.bin" % (args.algo))
         item = (img, out_path)
         buffer.append(item)
         if len(buffer) == args.batch_size:
-            get_and_write(buffer, nets)
+            get_and_write(buffer, nets, facescrub_store)
             buffer = []
         succ += 1
     if len(buffer) > 0:
-        get_and_write(buffer, nets)
+        get_and_write(buffer, nets, facescrub_store)
         buffer = []
     print('fs stat', i, succ)
 
@@ -141,8 +158,11 @@ def main(args):
         image_path = line.strip()
         _path = image_path.split('/')
         a1, a2, b = _path[-3], _path[-2], _path[-1]
+        if megaface_store is not None and '/'.join([a1, a2, b]) in megaface_store:
+            succ += 1
+            continue
         out_dir = os.path.join(megaface_out, a1, a2)
-        if not os.path.exists(out_dir):
+        if megaface_store is None and not os.path.exists(out_dir):
             os.makedirs(out_dir)
             #continue
         #print(landmark)
@@ -151,15 +171,18 @@ def main(args):
         if img is None:
             print('read error:', image_path)
             continue
-        out_path = os.path.join(out_dir, b + "_%s.bin" % (args.algo))
+        if megaface_store is not None:
+            out_path = '/'.join([a1, a2, b])
+        else:
+            out_path = os.path.join(out_dir, b + "_%s.bin" % (args.algo))
         item = (img, out_path)
         buffer.append(item)
         if len(buffer) == args.batch_size:
-            get_and_write(buffer, nets)
+            get_and_write(buffer, nets, megaface_store)
             buffer = []
         succ += 1
     if len(buffer) > 0:
-        get_and_write(buffer, nets)
+        get_and_write(buffer, nets, megaface_store)
         buffer = []
     print('mf stat', i, succ)
 
@@ -189,6 +212,10 @@ def parse_arguments(argv):
                         default='./data/megaface_images')
     parser.add_argument('--output', type=str, help='', default='./feature_out')
     parser.add_argument('--model', type=str, help='', default='')
+    parser.add_argument('--store',
+                        action='store_true',
+                        help='write one memory-mapped feature store per set '
+                        'instead of a .bin file per image')
     return parser.parse_args(argv)
 
 
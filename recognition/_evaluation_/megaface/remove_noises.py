@@ -13,6 +13,7 @@ import struct
 import cv2
 import mxnet as mx
 from mxnet import ndarray as nd
+from feature_store import FeatureStore, create_store
 
 feature_dim = 512
 feature_ext = 1
@@ -43,10 +44,9 @@ def write_bin(path, feature):
         f.write(struct.pack("%df" % len(feature), *feature))
 
 
-def main(args):
-
+def read_facescrub_noises(path):
     fs_noise_map = {}
-    for line in open(args.facescrub_noises, 'r'):
+    for line in open(path, 'r'):
         if line.startswith('#'):
             continue
         line = line.strip()
@@ -54,6 +54,82 @@ def main(args):
         p = fname.rfind('_')
         fname = fname[0:p]
         fs_noise_map[line] = fname
+    return fs_noise_map
+
+
+def read_megaface_noises(path):
+    mf_noise_map = {}
+    for line in open(path, 'r'):
+        if line.startswith('#'):
+            continue
+        line = line.strip()
+        _vec = line.split("\t")
+        if len(_vec) > 1:
+            line = _vec[1]
+        mf_noise_map[line] = 1
+    return mf_noise_map
+
+
+def main_store(args):
+    # feature stores from gen_megaface.py --store: every row is copied (with
+    # the extra feature_ext column) and the noisy rows are overwritten in place
+    fs_noise_map = read_facescrub_noises(args.facescrub_noises)
+    print(len(fs_noise_map))
+
+    fs_in = FeatureStore(os.path.join(args.feature_dir_input, 'facescrub_store'))
+    dim = fs_in.dim
+    fs_out = create_store(os.path.join(args.feature_dir_out, 'facescrub_store'),
+                          fs_in.paths, dim + feature_ext)
+    feats = fs_out.features('r+')
+    feats[:, 0:dim] = fs_in.features()
+    fnames = [p.split('/') for p in fs_in.paths]
+    noise = np.array([b in fs_noise_map for a, b in fnames], dtype=bool)
+    unique_fnames, fname_ids = np.unique([a for a, b in fnames],
+                                         return_inverse=True)
+    print(np.sum(noise))
+    # identity centers from the clean images, noisy ones are replaced by the
+    # normalized center plus a small jitter
+    centers = np.zeros((len(unique_fnames), dim + feature_ext),
+                       dtype=np.float32)
+    np.add.at(centers, fname_ids[~noise], feats[~noise])
+    assert np.all(np.bincount(fname_ids[~noise], minlength=len(unique_fnames))[
+        np.unique(fname_ids[noise])] > 0)
+    g = np.zeros((np.sum(noise), dim + feature_ext), dtype=np.float32)
+    g[:, 0:dim] = np.random.uniform(-0.001, 0.001, (len(g), dim))
+    f = centers[fname_ids[noise]] + g
+    f /= np.linalg.norm(f, axis=1, keepdims=True)
+    feats[noise] = f
+    feats.flush()
+    del feats
+
+    mf_noise_map = read_megaface_noises(args.megaface_noises)
+    print(len(mf_noise_map))
+
+    mf_in = FeatureStore(os.path.join(args.feature_dir_input, 'megaface_store'))
+    mf_out = create_store(os.path.join(args.feature_dir_out, 'megaface_store'),
+                          mf_in.paths, dim + feature_ext)
+    feats = mf_out.features('r+')
+    feats_in = mf_in.features()
+    batch = 100000
+    for start in range(0, len(mf_in), batch):
+        feats[start:start + batch, 0:dim] = feats_in[start:start + batch]
+    noise = np.array([p in mf_noise_map for p in mf_in.paths], dtype=bool)
+    feats[noise, dim:] = 100.0
+    feats.flush()
+    del feats
+    print(np.sum(noise))
+
+    if args.export:
+        fs_out.export(os.path.join(args.feature_dir_out, 'facescrub'), args.algo)
+        mf_out.export(os.path.join(args.feature_dir_out, 'megaface'), args.algo)
+
+
+def main(args):
+    if args.store:
+        main_store(args)
+        return
+
+    fs_noise_map = read_facescrub_noises(args.facescrub_noises)
 
     print(len(fs_noise_map))
 
@@ -102,15 +178,7 @@ def main(args):
                                         "%s_%s.bin" % (b, args.algo))
         write_bin(feature_path_out, f)
 
-    mf_noise_map = {}
-    for line in open(args.megaface_noises, 'r'):
-        if line.startswith('#'):
-            continue
-        line = line.strip()
-        _vec = line.split("\t")
-        if len(_vec) > 1:
-            line = _vec[1]
-        mf_noise_map[line] = 1
+    mf_noise_map = read_megaface_noises(args.megaface_noises)
 
     print(len(mf_noise_map))
 
@@ -175,6 +243,12 @@ def parse_arguments(argv):
                         type=str,
                         help='',
                         default='./feature_out_clean')
+    parser.add_argument('--store',
+                        action='store_true',
+                        help='read and write feature stores (gen_megaface.py --store)')
+    parser.add_argument('--export',
+                        action='store_true',
+                        help='with --store, also write the per-file devkit layout')
     return parser.parse_args(argv)
 
 
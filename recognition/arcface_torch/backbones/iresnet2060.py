@@ -149,7 +149,8 @@ class IResNet(nn.Module):
             return func(x)
 
     def forward(self, x):
-        with torch.cuda.amp.autocast(self.fp16):
+        # fp16 autocast on GPU, bf16 on CPU
+        with torch.autocast(x.device.type, torch.float16 if x.is_cuda else torch.bfloat16, enabled=self.fp16):
             x = self.conv1(x)
             x = self.bn1(x)
             x = self.prelu(x)
@@ -132,7 +132,8 @@ class MobileFaceNet(Module):
                     m.bias.data.zero_()
 
     def forward(self, x):
-        with torch.cuda.amp.autocast(self.fp16):
+        # fp16 autocast on GPU, bf16 on CPU
+        with torch.autocast(x.device.type, torch.float16 if x.is_cuda else torch.bfloat16, enabled=self.fp16):
             for func in self.layers:
                 x = func(x)
         x = self.conv_sep(x.float() if self.fp16 else x)
@@ -0,0 +1,85 @@
+"""Micro-benchmark of the negative class center sampling in PartialFC_V2.
+
+Times PartialFC_V2.sample against the former full-width rand + topk + sort
+sampler for several num_classes/sample_rate settings, on a single gloo rank
+so it runs on CPU (--device cuda to time a GPU).
+
+    python benchmark_partial_fc.py --num-classes 100000 1000000 2000000 --sample-rate 0.1 0.2 0.3
+"""
+import argparse
+import time
+
+import torch
+from torch import distributed
+
+from losses import CombinedMarginLoss
+from partial_fc_v2 import PartialFC_V2
+
+
+def topk_sample(module, labels, index_positive):
+    # the former PartialFC_V2.sample
+    with torch.no_grad():
+        positive = torch.unique(labels[index_positive], sorted=True)
+        perm = torch.rand(size=[module.num_local], device=module.weight.device)
+        perm[positive] = 2.0
+        index = torch.topk(perm, k=module.num_sample)[1]
+        index = index.sort()[0]
+        labels[index_positive] = torch.searchsorted(index, labels[index_positive])
+    return module.weight[index]
+
+
+def timeit(fn, steps, device):
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(steps):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PartialFC_V2 sampling benchmark")
+    parser.add_argument("--num-classes", type=int, nargs="+", default=[100000, 1000000, 2000000])
+    parser.add_argument("--sample-rate", type=float, nargs="+", default=[0.1, 0.2, 0.3])
+    parser.add_argument("--batch-size", type=int, default=1024, help="labels gathered from all ranks")
+    parser.add_argument("--embedding-size", type=int, default=32)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--device", type=str, default="cpu")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    distributed.init_process_group(
+        backend="nccl" if device.type == "cuda" else "gloo",
+        init_method="tcp://127.0.0.1:12585", rank=0, world_size=1)
+    margin_loss = CombinedMarginLoss(64, 1.0, 0.5, 0.0)
+    torch.manual_seed(0)
+
+    print("%10s %6s %10s %12s %12s %8s" % ("classes", "rate", "sampled", "topk ms", "sample ms", "speedup"))
+    for num_classes in args.num_classes:
+        for sample_rate in args.sample_rate:
+            module = PartialFC_V2(margin_loss, args.embedding_size, num_classes, sample_rate).to(device)
+            labels = torch.randint(num_classes, (args.batch_size, 1), device=device)
+            index_positive = torch.ones_like(labels, dtype=torch.bool)
+
+            # the new sampler keeps every positive and returns num_sample sorted unique centers
+            sample_labels = labels.clone()
+            module.sample(sample_labels, index_positive)
+            index = module.weight_index
+            assert index.size(0) == module.num_sample
+            assert bool((index[1:] > index[:-1]).all())
+            assert torch.equal(index[sample_labels.view(-1)], labels.view(-1))
+
+            t_topk = timeit(lambda: topk_sample(module, labels.clone(), index_positive), args.steps, device)
+            t_sample = timeit(lambda: module.sample(labels.clone(), index_positive), args.steps, device)
+            print("%10d %6.2f %10d %12.2f %12.2f %7.1fx" % (
+                num_classes, sample_rate, module.num_sample, t_topk * 1000, t_sample * 1000, t_topk / t_sample))
+            del module
+
+    distributed.destroy_process_group()
+
+
+if __name__ == "__main__":
+    main()
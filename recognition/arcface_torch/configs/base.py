@@ -22,6 +22,10 @@ config.interclass_filtering_threshold = 0
 config.fp16 = False
 config.batch_size = 128
 
+# "cuda" trains with nccl on the GPU of LOCAL_RANK (falls back to cpu when no GPU is visible),
+# "cpu" trains with gloo, fp16 = True then means bf16 autocast
+config.device = "cuda"
+
 # For SGD 
 config.optimizer = "sgd"
 config.lr = 0.1
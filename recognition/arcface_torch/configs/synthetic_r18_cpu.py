@@ -0,0 +1,29 @@
+from easydict import EasyDict as edict
+
+# smoke / throughput test of the data and loss pipeline without a GPU
+# python train_v2.py configs/synthetic_r18_cpu
+
+config = edict()
+config.margin_list = (1.0, 0.5, 0.0)
+config.network = "r18"
+config.resume = False
+config.output = None
+config.embedding_size = 512
+config.sample_rate = 1.0
+config.fp16 = True
+config.device = "cpu"
+config.momentum = 0.9
+config.weight_decay = 5e-4
+config.batch_size = 32
+config.lr = 0.02
+config.verbose = 2000
+config.frequent = 10
+config.dali = False
+config.num_workers = 2
+
+config.rec = "synthetic"
+config.num_classes = 1000
+config.num_image = 3200
+config.num_epoch = 1
+config.warmup_epoch = 0
+config.val_targets = []
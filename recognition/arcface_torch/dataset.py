@@ -1,10 +1,8 @@
-import numbers
 import os
 import queue as Queue
 import threading
 from typing import Iterable
 
-import mxnet as mx
 import numpy as np
 import torch
 from functools import partial
@@ -14,6 +12,7 @@ from torchvision import transforms
 from torchvision.datasets import ImageFolder
 from utils.utils_distributed_sampler import DistributedSampler
 from utils.utils_distributed_sampler import get_dist_info, worker_init_fn
+from utils.utils_recordio import IndexedRecordIO, header_label, imdecode, unpack
 
 
 def get_dataloader(
@@ -24,7 +23,12 @@ def get_dataloader(
     dali_aug = False,
     seed = 2048,
     num_workers = 2,
+    device = None,
     ) -> Iterable:
+    # device: torch.device the batches are moved to, cuda:local_rank if None
+
+    if device is None:
+        device = torch.device("cuda", local_rank)
 
     rec = os.path.join(root_dir, 'train.rec')
     idx = os.path.join(root_dir, 'train.idx')
@@ -50,13 +54,14 @@ def get_dataloader(
 
     # DALI
     if dali:
+        assert device.type == "cuda", "DALI data loading requires a GPU"
         return dali_data_iter(
             batch_size=batch_size, rec_file=rec, idx_file=idx,
             num_threads=2, local_rank=local_rank, dali_aug=dali_aug)
 
     rank, world_size = get_dist_info()
     train_sampler = DistributedSampler(
-        train_set, num_replicas=world_size, rank=rank, shuffle=True, seed=seed)
+        train_set, num_replicas=world_size, rank=rank, shuffle=True, seed=seed, device=device)
 
     if seed is None:
         init_fn = None
@@ -65,11 +70,12 @@ def get_dataloader(
 
     train_loader = DataLoaderX(
         local_rank=local_rank,
+        device=device,
         dataset=train_set,
         batch_size=batch_size,
         sampler=train_sampler,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         drop_last=True,
         worker_init_fn=init_fn,
     )
@@ -77,16 +83,18 @@ def get_dataloader(
     return train_loader
 
 class BackgroundGenerator(threading.Thread):
-    def __init__(self, generator, local_rank, max_prefetch=6):
+    def __init__(self, generator, local_rank, max_prefetch=6, use_cuda=True):
         super(BackgroundGenerator, self).__init__()
         self.queue = Queue.Queue(max_prefetch)
         self.generator = generator
         self.local_rank = local_rank
+        self.use_cuda = use_cuda
         self.daemon = True
         self.start()
 
     def run(self):
-        torch.cuda.set_device(self.local_rank)
+        if self.use_cuda:
+            torch.cuda.set_device(self.local_rank)
         for item in self.generator:
             self.queue.put(item)
         self.queue.put(None)
@@ -105,15 +113,24 @@ class BackgroundGenerator(threading.Thread):
 
 
 class DataLoaderX(DataLoader):
+    """DataLoader that prefetches batches in a background thread.
+
+    On GPU the next batch is copied host-to-device on a side stream while the
+    current one is being used. On CPU there is nothing to copy: the background
+    thread alone keeps up to ``max_prefetch`` decoded batches ready, so loading
+    (and decoding when ``num_workers == 0``) overlaps with the training step.
+    """
 
-    def __init__(self, local_rank, **kwargs):
+    def __init__(self, local_rank, device=None, **kwargs):
         super(DataLoaderX, self).__init__(**kwargs)
-        self.stream = torch.cuda.Stream(local_rank)
+        self.device = torch.device("cuda", local_rank) if device is None else torch.device(device)
+        self.use_cuda = self.device.type == "cuda"
+        self.stream = torch.cuda.Stream(self.device) if self.use_cuda else None
         self.local_rank = local_rank
 
     def __iter__(self):
         self.iter = super(DataLoaderX, self).__iter__()
-        self.iter = BackgroundGenerator(self.iter, self.local_rank)
+        self.iter = BackgroundGenerator(self.iter, self.local_rank, use_cuda=self.use_cuda)
         self.preload()
         return self
 
@@ -121,12 +138,15 @@ class DataLoaderX(DataLoader):
         self.batch = next(self.iter, None)
         if self.batch is None:
             return None
+        if not self.use_cuda:
+            return None
         with torch.cuda.stream(self.stream):
             for k in range(len(self.batch)):
-                self.batch[k] = self.batch[k].to(device=self.local_rank, non_blocking=True)
+                self.batch[k] = self.batch[k].to(device=self.device, non_blocking=True)
 
     def __next__(self):
-        torch.cuda.current_stream().wait_stream(self.stream)
+        if self.use_cuda:
+            torch.cuda.current_stream().wait_stream(self.stream)
         batch = self.batch
         if batch is None:
             raise StopIteration
@@ -147,9 +167,9 @@ class MXFaceDataset(Dataset):
         self.local_rank = local_rank
         path_imgrec = os.path.join(root_dir, 'train.rec')
         path_imgidx = os.path.join(root_dir, 'train.idx')
-        self.imgrec = mx.recordio.MXIndexedRecordIO(path_imgidx, path_imgrec, 'r')
+        self.imgrec = IndexedRecordIO(path_imgidx, path_imgrec)
         s = self.imgrec.read_idx(0)
-        header, _ = mx.recordio.unpack(s)
+        header, _ = unpack(s)
         if header.flag > 0:
             self.header0 = (int(header.label[0]), int(header.label[1]))
             self.imgidx = np.array(range(1, int(header.label[0])))
@@ -159,12 +179,9 @@ class MXFaceDataset(Dataset):
     def __getitem__(self, index):
         idx = self.imgidx[index]
         s = self.imgrec.read_idx(idx)
-        header, img = mx.recordio.unpack(s)
-        label = header.label
-        if not isinstance(label, numbers.Number):
-            label = label[0]
-        label = torch.tensor(label, dtype=torch.long)
-        sample = mx.image.imdecode(img).asnumpy()
+        header, img = unpack(s)
+        label = torch.tensor(header_label(header), dtype=torch.long)
+        sample = imdecode(img)
         if self.transform is not None:
             sample = self.transform(sample)
         return sample, label
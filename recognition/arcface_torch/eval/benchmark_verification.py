@@ -0,0 +1,93 @@
+"""Benchmark of the threshold search used by verification.evaluate.
+
+Compares the sort/cumsum sweep against the former per-threshold loop on
+synthetic LFW-sized pairs and checks that both give identical results.
+
+    python -m eval.benchmark_verification --pairs 6000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from eval.verification import (LFold, calculate_accuracy, calculate_accuracy_sweep,
+                               calculate_val_far, _accept_counts)
+
+
+def loop_roc(thresholds, dist, actual_issame, nrof_folds):
+    tprs = np.zeros((nrof_folds, len(thresholds)))
+    fprs = np.zeros((nrof_folds, len(thresholds)))
+    accuracy = np.zeros(nrof_folds)
+    for fold_idx, (train_set, test_set) in enumerate(LFold(nrof_folds).split(np.arange(dist.size))):
+        acc_train = np.zeros(len(thresholds))
+        for threshold_idx, threshold in enumerate(thresholds):
+            _, _, acc_train[threshold_idx] = calculate_accuracy(threshold, dist[train_set], actual_issame[train_set])
+        best_threshold_index = np.argmax(acc_train)
+        for threshold_idx, threshold in enumerate(thresholds):
+            tprs[fold_idx, threshold_idx], fprs[fold_idx, threshold_idx], _ = calculate_accuracy(
+                threshold, dist[test_set], actual_issame[test_set])
+        _, _, accuracy[fold_idx] = calculate_accuracy(
+            thresholds[best_threshold_index], dist[test_set], actual_issame[test_set])
+    return tprs, fprs, accuracy
+
+
+def sweep_roc(thresholds, dist, actual_issame, nrof_folds):
+    tprs = np.zeros((nrof_folds, len(thresholds)))
+    fprs = np.zeros((nrof_folds, len(thresholds)))
+    accuracy = np.zeros(nrof_folds)
+    for fold_idx, (train_set, test_set) in enumerate(LFold(nrof_folds).split(np.arange(dist.size))):
+        _, _, acc_train = calculate_accuracy_sweep(thresholds, dist[train_set], actual_issame[train_set])
+        tprs[fold_idx], fprs[fold_idx], acc_test = calculate_accuracy_sweep(
+            thresholds, dist[test_set], actual_issame[test_set])
+        accuracy[fold_idx] = acc_test[np.argmax(acc_train)]
+    return tprs, fprs, accuracy
+
+
+def loop_far(thresholds, dist, actual_issame):
+    return np.array([calculate_val_far(threshold, dist, actual_issame)[1] for threshold in thresholds])
+
+
+def sweep_far(thresholds, dist, actual_issame):
+    _, false_accept, _, n_diff = _accept_counts(thresholds, dist, actual_issame)
+    return false_accept / float(n_diff)
+
+
+def timeit(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='verification threshold search benchmark')
+    parser.add_argument('--pairs', type=int, default=6000)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--folds', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    actual_issame = rng.rand(args.pairs) < 0.5
+    embeddings1 = rng.randn(args.pairs, args.dim)
+    embeddings2 = rng.randn(args.pairs, args.dim)
+    embeddings2[actual_issame] = embeddings1[actual_issame] + 0.8 * rng.randn(actual_issame.sum(), args.dim)
+    embeddings1 /= np.linalg.norm(embeddings1, axis=1, keepdims=True)
+    embeddings2 /= np.linalg.norm(embeddings2, axis=1, keepdims=True)
+    dist = np.sum(np.square(embeddings1 - embeddings2), 1)
+
+    thresholds = np.arange(0, 4, 0.01)
+    ref, t_loop = timeit(loop_roc, thresholds, dist, actual_issame, args.folds)
+    out, t_sweep = timeit(sweep_roc, thresholds, dist, actual_issame, args.folds)
+    assert all(np.array_equal(a, b) for a, b in zip(ref, out)), 'calculate_roc results differ'
+    print('calculate_roc  %d thresholds: loop %8.1f ms  sweep %6.1f ms  (x%.0f)' % (
+        len(thresholds), t_loop * 1000, t_sweep * 1000, t_loop / t_sweep))
+
+    thresholds = np.arange(0, 4, 0.001)
+    ref, t_loop = timeit(loop_far, thresholds, dist, actual_issame)
+    out, t_sweep = timeit(sweep_far, thresholds, dist, actual_issame)
+    assert np.array_equal(ref, out), 'calculate_val FAR curve differs'
+    print('calculate_val  %d thresholds: loop %8.1f ms  sweep %6.1f ms  (x%.0f, one fold)' % (
+        len(thresholds), t_loop * 1000, t_sweep * 1000, t_loop / t_sweep))
+
+
+if __name__ == '__main__':
+    main()
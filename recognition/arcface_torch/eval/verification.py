@@ -25,18 +25,21 @@
 
 
 import datetime
+import hashlib
+import json
 import os
 import pickle
 
-import mxnet as mx
+import cv2
 import numpy as np
 import sklearn
 import torch
-from mxnet import ndarray as nd
 from scipy import interpolate
 from sklearn.decomposition import PCA
 from sklearn.model_selection import KFold
 
+from utils.utils_recordio import imdecode
+
 
 class LFold:
     def __init__(self, n_splits=2, shuffle=False):
@@ -88,18 +91,12 @@ def calculate_roc(thresholds,
             dist = np.sum(np.square(diff), 1)
 
         # Find the best threshold for the fold
-        acc_train = np.zeros((nrof_thresholds))
-        for threshold_idx, threshold in enumerate(thresholds):
-            _, _, acc_train[threshold_idx] = calculate_accuracy(
-                threshold, dist[train_set], actual_issame[train_set])
+        _, _, acc_train = calculate_accuracy_sweep(
+            thresholds, dist[train_set], actual_issame[train_set])
         best_threshold_index = np.argmax(acc_train)
-        for threshold_idx, threshold in enumerate(thresholds):
-            tprs[fold_idx, threshold_idx], fprs[fold_idx, threshold_idx], _ = calculate_accuracy(
-                threshold, dist[test_set],
-                actual_issame[test_set])
-        _, _, accuracy[fold_idx] = calculate_accuracy(
-            thresholds[best_threshold_index], dist[test_set],
-            actual_issame[test_set])
+        tprs[fold_idx], fprs[fold_idx], acc_test = calculate_accuracy_sweep(
+            thresholds, dist[test_set], actual_issame[test_set])
+        accuracy[fold_idx] = acc_test[best_threshold_index]
 
     tpr = np.mean(tprs, 0)
     fpr = np.mean(fprs, 0)
@@ -121,6 +118,28 @@ def calculate_accuracy(threshold, dist, actual_issame):
     return tpr, fpr, acc
 
 
+def _accept_counts(thresholds, dist, actual_issame):
+    # number of same / different pairs with dist < threshold, for every threshold:
+    # sort once, then a searchsorted position indexes the cumulative same count
+    order = np.argsort(dist, kind='stable')
+    sorted_dist = dist[order]
+    cum_same = np.concatenate(([0], np.cumsum(actual_issame[order], dtype=np.int64)))
+    num_accept = np.searchsorted(sorted_dist, thresholds, side='left')
+    true_accept = cum_same[num_accept]
+    false_accept = num_accept - true_accept
+    return true_accept, false_accept, int(cum_same[-1]), dist.size - int(cum_same[-1])
+
+
+def calculate_accuracy_sweep(thresholds, dist, actual_issame):
+    """calculate_accuracy for all thresholds in O((pairs + thresholds) log pairs)."""
+    tp, fp, n_same, n_diff = _accept_counts(thresholds, dist, actual_issame)
+    tn = n_diff - fp
+    tpr = tp / n_same if n_same > 0 else np.zeros(len(thresholds))
+    fpr = fp / n_diff if n_diff > 0 else np.zeros(len(thresholds))
+    acc = (tp + tn) / dist.size
+    return tpr, fpr, acc
+
+
 def calculate_val(thresholds,
                   embeddings1,
                   embeddings2,
@@ -130,7 +149,6 @@ def calculate_val(thresholds,
     assert (embeddings1.shape[0] == embeddings2.shape[0])
     assert (embeddings1.shape[1] == embeddings2.shape[1])
     nrof_pairs = min(len(actual_issame), embeddings1.shape[0])
-    nrof_thresholds = len(thresholds)
     k_fold = LFold(n_splits=nrof_folds, shuffle=False)
 
     val = np.zeros(nrof_folds)
@@ -143,10 +161,9 @@ def calculate_val(thresholds,
     for fold_idx, (train_set, test_set) in enumerate(k_fold.split(indices)):
 
         # Find the threshold that gives FAR = far_target
-        far_train = np.zeros(nrof_thresholds)
-        for threshold_idx, threshold in enumerate(thresholds):
-            _, far_train[threshold_idx] = calculate_val_far(
-                threshold, dist[train_set], actual_issame[train_set])
+        _, false_accept, _, n_diff = _accept_counts(
+            thresholds, dist[train_set], actual_issame[train_set])
+        far_train = false_accept / float(n_diff)
         if np.max(far_train) >= far_target:
             f = interpolate.interp1d(far_train, thresholds, kind='slinear')
             threshold = f(far_target)
@@ -196,48 +213,124 @@ def evaluate(embeddings, actual_issame, nrof_folds=10, pca=0):
                                       nrof_folds=nrof_folds)
     return tpr, fpr, accuracy, val, val_std, far
 
-@torch.no_grad()
-def load_bin(path, image_size):
+def _resize_short(img, size):
+    # same as mx.image.resize_short (bicubic, shorter edge to size)
+    h, w = img.shape[:2]
+    if h > w:
+        new_w, new_h = size, size * h // w
+    else:
+        new_w, new_h = size * w // h, size
+    return cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_CUBIC)
+
+
+def _file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _bin_sha1(path, cache_dir):
+    # the sha1 is remembered with the size and mtime of the .bin, so it is
+    # only recomputed when the file was touched or changed
+    stat = os.stat(path)
+    key_file = os.path.join(cache_dir, '%s.sha1.json' % os.path.splitext(os.path.basename(path))[0])
+    try:
+        with open(key_file) as f:
+            key = json.load(f)
+        if key['path'] == os.path.abspath(path) and key['size'] == stat.st_size \
+                and key['mtime_ns'] == stat.st_mtime_ns:
+            return key['sha1']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    key = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+           'sha1': _file_sha1(path)}
+    tmp_file = '%s.%d.tmp' % (key_file, os.getpid())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_file, 'w') as f:
+            json.dump(key, f)
+        os.replace(tmp_file, key_file)
+    except OSError:
+        pass
+    return key['sha1']
+
+
+def _decode_bins(bins, image_size, images):
+    for idx in range(len(images)):
+        img = imdecode(bins[idx])
+        if img.shape[1] != image_size[0]:
+            img = _resize_short(img, image_size[0])
+        images[idx] = np.transpose(img, axes=(2, 0, 1))
+        if idx % 1000 == 0:
+            print('loading bin', idx)
+
+
+def load_bin(path, image_size, cache_dir=None):
+    """Load a verification .bin as uint8 NCHW images plus the issame list.
+
+    The decoded images are cached as ``<name>.<sha1>.<h>x<w>.npy`` (with the
+    labels in ``.issame.npy``) in cache_dir, by default next to the .bin, and
+    memory-mapped on later loads. The sha1 is kept in ``<name>.sha1.json``
+    and only recomputed when the size or mtime of the .bin changes. Flipped copies are not stored, test() flips
+    each batch on the fly. If the cache cannot be written the images are
+    decoded into memory.
+    """
+    cache_dir = os.path.dirname(os.path.abspath(path)) if cache_dir is None else cache_dir
+    name = os.path.splitext(os.path.basename(path))[0]
+    prefix = os.path.join(cache_dir, '%s.%s.%dx%d' % (name, _bin_sha1(path, cache_dir)[:16], image_size[0], image_size[1]))
+    images_file, issame_file = prefix + '.npy', prefix + '.issame.npy'
+    if os.path.exists(images_file) and os.path.exists(issame_file):
+        images = np.load(images_file, mmap_mode='r')
+        issame_list = np.load(issame_file).tolist()
+        print(images.shape)
+        return images, issame_list
+
     try:
         with open(path, 'rb') as f:
             bins, issame_list = pickle.load(f)  # py2
     except UnicodeDecodeError as e:
         with open(path, 'rb') as f:
             bins, issame_list = pickle.load(f, encoding='bytes')  # py3
-    data_list = []
-    for flip in [0, 1]:
-        data = torch.empty((len(issame_list) * 2, 3, image_size[0], image_size[1]))
-        data_list.append(data)
-    for idx in range(len(issame_list) * 2):
-        _bin = bins[idx]
-        img = mx.image.imdecode(_bin)
-        if img.shape[1] != image_size[0]:
-            img = mx.image.resize_short(img, image_size[0])
-        img = nd.transpose(img, axes=(2, 0, 1))
-        for flip in [0, 1]:
-            if flip == 1:
-                img = mx.ndarray.flip(data=img, axis=2)
-            data_list[flip][idx][:] = torch.from_numpy(img.asnumpy())
-        if idx % 1000 == 0:
-            print('loading bin', idx)
-    print(data_list[0].shape)
-    return data_list, issame_list
+    shape = (len(issame_list) * 2, 3, image_size[0], image_size[1])
+    tmp_file = '%s.%d.tmp.npy' % (prefix, os.getpid())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        images = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.uint8, shape=shape)
+    except OSError:
+        # read-only data dir: decode into memory without caching
+        images = np.empty(shape, dtype=np.uint8)
+        _decode_bins(bins, image_size, images)
+        print(images.shape)
+        return images, issame_list
+
+    _decode_bins(bins, image_size, images)
+    images.flush()
+    del images
+    np.save(issame_file, np.asarray(issame_list, dtype=bool))
+    os.replace(tmp_file, images_file)
+    images = np.load(images_file, mmap_mode='r')
+    print(images.shape)
+    return images, issame_list
+
 
 @torch.no_grad()
 def test(data_set, backbone, batch_size, nfolds=10):
     print('testing verification..')
-    data_list = data_set[0]
+    data = data_set[0]
     issame_list = data_set[1]
     embeddings_list = []
     time_consumed = 0.0
-    for i in range(len(data_list)):
-        data = data_list[i]
+    for flip in [0, 1]:
         embeddings = None
         ba = 0
         while ba < data.shape[0]:
             bb = min(ba + batch_size, data.shape[0])
             count = bb - ba
-            _data = data[bb - batch_size: bb]
+            _data = torch.from_numpy(np.array(data[bb - batch_size: bb]))
+            if flip == 1:
+                _data = torch.flip(_data, dims=[3])
             time0 = datetime.datetime.now()
             img = ((_data / 255) - 0.5) / 0.5
             net_out: torch.Tensor = backbone(img)
@@ -280,6 +373,8 @@ def dumpR(data_set,
           name='',
           data_extra=None,
           label_shape=None):
+    import mxnet as mx
+    from mxnet import ndarray as nd
     print('dump verification embedding..')
     data_list = data_set[0]
     issame_list = data_set[1]
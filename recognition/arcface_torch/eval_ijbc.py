@@ -16,6 +16,7 @@ import numpy as np
 import torch
 from skimage import transform as trans
 from backbones import get_model
+from scipy import sparse
 from sklearn.metrics import roc_curve, auc
 
 from menpo.visualize.viewmatplotlib import sample_colours_from_colourmap
@@ -215,31 +216,21 @@ def image2template_feature(img_feats=None, templates=None, medias=None):
     # 2. compute media feature.
     # 3. compute template feature.
     # ==========================================================
-    unique_templates = np.unique(templates)
-    template_feats = np.zeros((len(unique_templates), img_feats.shape[1]))
-
-    for count_template, uqt in enumerate(unique_templates):
-
-        (ind_t,) = np.where(templates == uqt)
-        face_norm_feats = img_feats[ind_t]
-        face_medias = medias[ind_t]
-        unique_medias, unique_media_counts = np.unique(face_medias,
-                                                       return_counts=True)
-        media_norm_feats = []
-        for u, ct in zip(unique_medias, unique_media_counts):
-            (ind_m,) = np.where(face_medias == u)
-            if ct == 1:
-                media_norm_feats += [face_norm_feats[ind_m]]
-            else:  # image features from the same video will be aggregated into one feature
-                media_norm_feats += [
-                    np.mean(face_norm_feats[ind_m], axis=0, keepdims=True)
-                ]
-        media_norm_feats = np.array(media_norm_feats)
-        # media_norm_feats = media_norm_feats / np.sqrt(np.sum(media_norm_feats ** 2, -1, keepdims=True))
-        template_feats[count_template] = np.sum(media_norm_feats, axis=0)
-        if count_template % 2000 == 0:
-            print('Finish Calculating {} template features.'.format(
-                count_template))
+    # one lexsort groups the images by (template, media). Every image weighs
+    # 1 / (frames of its media), so a weighted segment sum per template is the
+    # sum of its media features, frames of the same video being averaged.
+    unique_templates, template_ids = np.unique(templates, return_inverse=True)
+    order = np.lexsort((medias, template_ids))
+    template_ids = template_ids[order]
+    face_medias = medias[order]
+    media_start = np.flatnonzero(np.r_[True, (template_ids[1:] != template_ids[:-1]) |
+                                       (face_medias[1:] != face_medias[:-1])])
+    media_counts = np.diff(np.r_[media_start, len(order)])
+    weights = np.repeat(1.0 / media_counts, media_counts)
+    segment_sum = sparse.csr_matrix((weights, (template_ids, order)),
+                                    shape=(len(unique_templates), len(templates)))
+    template_feats = segment_sum @ img_feats.astype(np.float64, copy=False)
+    print('Finish Calculating {} template features.'.format(len(unique_templates)))
     # template_norm_feats = template_feats / np.sqrt(np.sum(template_feats ** 2, -1, keepdims=True))
     template_norm_feats = sklearn.preprocessing.normalize(template_feats)
     # print(template_norm_feats.shape)
@@ -256,23 +247,16 @@ def verification(template_norm_feats=None,
     # ==========================================================
     #         Compute set-to-set Similarity Score.
     # ==========================================================
-    template2id = np.zeros((max(unique_templates) + 1, 1), dtype=int)
-    for count_template, uqt in enumerate(unique_templates):
-        template2id[uqt] = count_template
-
+    template2id = np.zeros(max(unique_templates) + 1, dtype=int)
+    template2id[unique_templates] = np.arange(len(unique_templates))
+    id1 = template2id[p1]
+    id2 = template2id[p2]
     score = np.zeros((len(p1),))  # save cosine distance between pairs
-
-    total_pairs = np.array(range(len(p1)))
     batchsize = 100000  # small batchsize instead of all pairs in one batch due to the memory limiation
-    sublists = [
-        total_pairs[i:i + batchsize] for i in range(0, len(p1), batchsize)
-    ]
-    total_sublists = len(sublists)
-    for c, s in enumerate(sublists):
-        feat1 = template_norm_feats[template2id[p1[s]]]
-        feat2 = template_norm_feats[template2id[p2[s]]]
-        similarity_score = np.sum(feat1 * feat2, -1)
-        score[s] = similarity_score.flatten()
+    total_sublists = (len(p1) + batchsize - 1) // batchsize
+    for c, start in enumerate(range(0, len(p1), batchsize)):
+        s = slice(start, start + batchsize)
+        score[s] = np.einsum('ij,ij->i', template_norm_feats[id1[s]], template_norm_feats[id2[s]])
         if c % 10 == 0:
             print('Finish {}/{} pairs.'.format(c, total_sublists))
     return score
@@ -283,21 +267,16 @@ def verification2(template_norm_feats=None,
                   unique_templates=None,
                   p1=None,
                   p2=None):
-    template2id = np.zeros((max(unique_templates) + 1, 1), dtype=int)
-    for count_template, uqt in enumerate(unique_templates):
-        template2id[uqt] = count_template
+    template2id = np.zeros(max(unique_templates) + 1, dtype=int)
+    template2id[unique_templates] = np.arange(len(unique_templates))
+    id1 = template2id[p1]
+    id2 = template2id[p2]
     score = np.zeros((len(p1),))  # save cosine distance between pairs
-    total_pairs = np.array(range(len(p1)))
     batchsize = 100000  # small batchsize instead of all pairs in one batch due to the memory limiation
-    sublists = [
-        total_pairs[i:i + batchsize] for i in range(0, len(p1), batchsize)
-    ]
-    total_sublists = len(sublists)
-    for c, s in enumerate(sublists):
-        feat1 = template_norm_feats[template2id[p1[s]]]
-        feat2 = template_norm_feats[template2id[p2[s]]]
-        similarity_score = np.sum(feat1 * feat2, -1)
-        score[s] = similarity_score.flatten()
+    total_sublists = (len(p1) + batchsize - 1) // batchsize
+    for c, start in enumerate(range(0, len(p1), batchsize)):
+        s = slice(start, start + batchsize)
+        score[s] = np.einsum('ij,ij->i', template_norm_feats[id1[s]], template_norm_feats[id2[s]])
         if c % 10 == 0:
             print('Finish {}/{} pairs.'.format(c, total_sublists))
     return score
@@ -65,6 +65,9 @@ class PartialFC_V2(torch.nn.Module):
         )
         self.num_sample: int = int(self.sample_rate * self.num_local)
         self.last_batch_size: int = 0
+        # all_gather targets, allocated on the first forward and reused
+        self._gather_embeddings = None
+        self._gather_labels = None
 
         self.is_updated: bool = True
         self.init_weight_update: bool = True
@@ -76,6 +79,29 @@ class PartialFC_V2(torch.nn.Module):
         else:
             raise
 
+    def sample_negatives(self, num_negative: int, num_candidates: int):
+        """
+        Sorted, uniformly drawn subset of ``num_negative`` indices in ``[0, num_candidates)``.
+        Instead of a top-k over all local centers, draw slightly more random integers than
+        needed, deduplicate them (a uniform random subset of its size) and drop random extras.
+        """
+        device = self.weight.device
+        if num_negative == 0:
+            return torch.zeros(0, dtype=torch.long, device=device)
+        if 2 * num_negative > num_candidates:
+            # dense case, a permutation is as cheap as the rejection draws
+            return torch.randperm(num_candidates, device=device)[:num_negative].sort()[0]
+        # draws whose expected number of distinct values is a few percent above num_negative
+        num_draws = int(-num_candidates * math.log1p(-num_negative / num_candidates) * 1.1) + 64
+        while True:
+            candidates = torch.unique(
+                torch.randint(num_candidates, (num_draws,), device=device), sorted=True)
+            if candidates.size(0) >= num_negative:
+                break
+        keep = torch.ones(candidates.size(0), dtype=torch.bool, device=device)
+        keep[torch.randperm(candidates.size(0), device=device)[:candidates.size(0) - num_negative]] = False
+        return candidates[keep]
+
     def sample(self, labels, index_positive):
         """
             This functions will change the value of labels
@@ -89,12 +115,15 @@ class PartialFC_V2(torch.nn.Module):
                 pass
         """
         with torch.no_grad():
-            positive = torch.unique(labels[index_positive], sorted=True).cuda()
-            if self.num_sample - positive.size(0) >= 0:
-                perm = torch.rand(size=[self.num_local]).cuda()
-                perm[positive] = 2.0
-                index = torch.topk(perm, k=self.num_sample)[1].cuda()
-                index = index.sort()[0].cuda()
+            positive = torch.unique(labels[index_positive], sorted=True)
+            num_negative = self.num_sample - positive.size(0)
+            if num_negative >= 0:
+                # draw the negatives from the complement of the positives:
+                # j-th free slot v maps to v + #positives at or before it
+                negative = self.sample_negatives(num_negative, self.num_local - positive.size(0))
+                offset = positive - torch.arange(positive.size(0), device=positive.device)
+                negative += torch.searchsorted(offset, negative, right=True)
+                index = torch.cat([positive, negative]).sort()[0]
             else:
                 index = positive
             self.weight_index = index
@@ -129,13 +158,18 @@ class PartialFC_V2(torch.nn.Module):
         assert self.last_batch_size == batch_size, (
             f"last batch size do not equal current batch size: {self.last_batch_size} vs {batch_size}")
 
-        _gather_embeddings = [
-            torch.zeros((batch_size, self.embedding_size)).cuda()
-            for _ in range(self.world_size)
-        ]
-        _gather_labels = [
-            torch.zeros(batch_size).long().cuda() for _ in range(self.world_size)
-        ]
+        if (self._gather_embeddings is None
+                or self._gather_embeddings[0].dtype != local_embeddings.dtype
+                or self._gather_embeddings[0].device != local_embeddings.device):
+            self._gather_embeddings = [
+                torch.zeros((batch_size, self.embedding_size), dtype=local_embeddings.dtype, device=local_embeddings.device)
+                for _ in range(self.world_size)
+            ]
+            self._gather_labels = [
+                torch.zeros(batch_size, dtype=torch.long, device=local_labels.device) for _ in range(self.world_size)
+            ]
+        _gather_embeddings = self._gather_embeddings
+        _gather_labels = self._gather_labels
         _list_embeddings = AllGather(local_embeddings, *_gather_embeddings)
         distributed.all_gather(_gather_labels, local_labels)
 
@@ -154,7 +188,8 @@ class PartialFC_V2(torch.nn.Module):
         else:
             weight = self.weight
 
-        with torch.cuda.amp.autocast(self.fp16):
+        device_type = embeddings.device.type
+        with torch.autocast(device_type, torch.float16 if device_type == "cuda" else torch.bfloat16, enabled=self.fp16):
             norm_embeddings = normalize(embeddings)
             norm_weight_activated = normalize(weight)
             logits = linear(norm_embeddings, norm_weight_activated)
@@ -26,17 +26,19 @@ try:
     rank = int(os.environ["RANK"])
     local_rank = int(os.environ["LOCAL_RANK"])
     world_size = int(os.environ["WORLD_SIZE"])
-    distributed.init_process_group("nccl")
+    init_method = None
 except KeyError:
     rank = 0
     local_rank = 0
     world_size = 1
-    distributed.init_process_group(
-        backend="nccl",
-        init_method="tcp://127.0.0.1:12584",
-        rank=rank,
-        world_size=world_size,
-    )
+    init_method = "tcp://127.0.0.1:12584"
+
+
+def get_device(cfg):
+    # config.device = "cpu" (or no visible GPU) trains with gloo and bf16 autocast
+    if cfg.device == "cuda" and torch.cuda.is_available():
+        return torch.device("cuda", local_rank)
+    return torch.device("cpu")
 
 
 def main(args):
@@ -46,7 +48,15 @@ def main(args):
     # global control random seed
     setup_seed(seed=cfg.seed, cuda_deterministic=False)
 
-    torch.cuda.set_device(local_rank)
+    device = get_device(cfg)
+    distributed.init_process_group(
+        backend="nccl" if device.type == "cuda" else "gloo",
+        init_method=init_method,
+        rank=rank,
+        world_size=world_size,
+    )
+    if device.type == "cuda":
+        torch.cuda.set_device(local_rank)
 
     os.makedirs(cfg.output, exist_ok=True)
     init_logging(rank, cfg.output)
@@ -89,16 +99,19 @@ def main(args):
         cfg.dali,
         cfg.dali_aug,
         cfg.seed,
-        cfg.num_workers
+        cfg.num_workers,
+        device
     )
 
     backbone = get_model(
-        cfg.network, dropout=0.0, fp16=cfg.fp16, num_features=cfg.embedding_size).cuda()
+        cfg.network, dropout=0.0, fp16=cfg.fp16, num_features=cfg.embedding_size).to(device)
 
     backbone = torch.nn.parallel.DistributedDataParallel(
-        module=backbone, broadcast_buffers=False, device_ids=[local_rank], bucket_cap_mb=16,
+        module=backbone, broadcast_buffers=False,
+        device_ids=[local_rank] if device.type == "cuda" else None, bucket_cap_mb=16,
         find_unused_parameters=True)
-    backbone.register_comm_hook(None, fp16_compress_hook)
+    if device.type == "cuda":
+        backbone.register_comm_hook(None, fp16_compress_hook)
 
     backbone.train()
     # FIXME using gradient checkpoint if there are some unused parameters will cause error
@@ -116,7 +129,7 @@ def main(args):
         module_partial_fc = PartialFC_V2(
             margin_loss, cfg.embedding_size, cfg.num_classes,
             cfg.sample_rate, False)
-        module_partial_fc.train().cuda()
+        module_partial_fc.train().to(device)
         # TODO the params of partial fc must be last in the params list
         opt = torch.optim.SGD(
             params=[{"params": backbone.parameters()}, {"params": module_partial_fc.parameters()}],
@@ -126,7 +139,7 @@ def main(args):
         module_partial_fc = PartialFC_V2(
             margin_loss, cfg.embedding_size, cfg.num_classes,
             cfg.sample_rate, False)
-        module_partial_fc.train().cuda()
+        module_partial_fc.train().to(device)
         opt = torch.optim.AdamW(
             params=[{"params": backbone.parameters()}, {"params": module_partial_fc.parameters()}],
             lr=cfg.lr, weight_decay=cfg.weight_decay)
@@ -145,7 +158,7 @@ def main(args):
     start_epoch = 0
     global_step = 0
     if cfg.resume:
-        dict_checkpoint = torch.load(os.path.join(cfg.output, f"checkpoint_gpu_{rank}.pt"))
+        dict_checkpoint = torch.load(os.path.join(cfg.output, f"checkpoint_gpu_{rank}.pt"), map_location=device)
         start_epoch = dict_checkpoint["epoch"]
         global_step = dict_checkpoint["global_step"]
         backbone.module.load_state_dict(dict_checkpoint["state_dict_backbone"])
@@ -171,7 +184,8 @@ def main(args):
     )
 
     loss_am = AverageMeter()
-    amp = torch.cuda.amp.grad_scaler.GradScaler(growth_interval=100)
+    # bf16 on CPU has the fp32 exponent range, loss scaling is only needed for fp16 on GPU
+    amp = torch.cuda.amp.grad_scaler.GradScaler(growth_interval=100, enabled=device.type == "cuda")
 
     for epoch in range(start_epoch, cfg.num_epoch):
 
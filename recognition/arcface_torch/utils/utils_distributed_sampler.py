@@ -42,7 +42,7 @@ def get_dist_info():
     return rank, world_size
 
 
-def sync_random_seed(seed=None, device="cuda"):
+def sync_random_seed(seed=None, device=None):
     """Make sure different ranks share the same seed.
     All workers must call this function, otherwise it will deadlock.
     This method is generally used in `DistributedSampler`,
@@ -56,7 +56,7 @@ def sync_random_seed(seed=None, device="cuda"):
     Args:
         seed (int, Optional): The seed. Default to None.
         device (str): The device where the seed will be put on.
-            Default to 'cuda'.
+            Default to 'cuda' for the nccl backend and 'cpu' otherwise.
     Returns:
         int: Seed to be used.
     """
@@ -69,6 +69,10 @@ def sync_random_seed(seed=None, device="cuda"):
     if world_size == 1:
         return seed
 
+    if device is None:
+        # gloo only broadcasts cpu tensors
+        device = "cuda" if dist.get_backend() == "nccl" else "cpu"
+
     if rank == 0:
         random_num = torch.tensor(seed, dtype=torch.int32, device=device)
     else:
@@ -87,6 +91,7 @@ class DistributedSampler(_DistributedSampler):
         rank=None,  # local_rank
         shuffle=True,
         seed=0,
+        device=None,
     ):
 
         super().__init__(dataset, num_replicas=num_replicas, rank=rank, shuffle=shuffle)
@@ -97,7 +102,7 @@ class DistributedSampler(_DistributedSampler):
         # in the same order based on the same seed. Then different ranks
         # could use different indices to select non-overlapped data from the
         # same data list.
-        self.seed = sync_random_seed(seed)
+        self.seed = sync_random_seed(seed, device)
 
     def __iter__(self):
         # deterministically shuffle based on epoch
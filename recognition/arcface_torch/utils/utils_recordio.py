@@ -0,0 +1,127 @@
+import mmap
+import numbers
+import struct
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# MXNet RecordIO layout, see dmlc-core/include/dmlc/recordio.h:
+#   uint32 magic | uint32 lrecord (cflag << 29 | length) | data | pad to 4 bytes
+# cflag 0 is a whole record, 1/2/3 are the first/middle/last part of a record
+# that contained the magic number and was split there.
+_MAGIC = 0xced7230a
+_MAGIC_BYTES = struct.pack('<I', _MAGIC)
+_LENGTH_MASK = (1 << 29) - 1
+
+IRHeader = namedtuple('HEADER', ['flag', 'label', 'id', 'id2'])
+_IR_FORMAT = 'IfQQ'
+_IR_SIZE = struct.calcsize(_IR_FORMAT)
+
+
+def read_index(path_imgidx):
+    """Parse a ``key\\toffset`` .idx file into two int64 arrays."""
+    table = np.loadtxt(path_imgidx, dtype=np.int64, delimiter='\t', ndmin=2)
+    return table[:, 0], table[:, 1]
+
+
+def unpack(s):
+    """Drop-in for ``mx.recordio.unpack``.
+
+    Returns the IRHeader and a zero-copy memoryview of the payload. As with
+    mxnet, ``header.label`` is a float when ``flag == 0`` and a float32 array
+    of ``flag`` values otherwise.
+    """
+    s = memoryview(s)
+    flag, label, id1, id2 = struct.unpack_from(_IR_FORMAT, s)
+    offset = _IR_SIZE
+    if flag > 0:
+        label = np.frombuffer(s, dtype=np.float32, count=flag, offset=offset)
+        offset += 4 * flag
+    return IRHeader(flag, label, id1, id2), s[offset:]
+
+
+def imdecode(buf, to_rgb=True):
+    """Decode an encoded image to an HWC uint8 array, RGB like ``mx.image.imdecode``."""
+    img = cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError('failed to decode image record')
+    if to_rgb:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return img
+
+
+def header_label(header):
+    label = header.label
+    if not isinstance(label, numbers.Number):
+        label = label[0]
+    return label
+
+
+class IndexedRecordIO(object):
+    """Read-only, mxnet-free replacement for ``mx.recordio.MXIndexedRecordIO``.
+
+    The .rec file is memory-mapped and records are returned as memoryviews
+    into the mapping, so reads cost no syscall and no copy. The mapping is
+    opened lazily and dropped on pickling: forked DataLoader workers share
+    the parent's pages, spawned workers map the file again on first read.
+    """
+
+    def __init__(self, path_imgidx, path_imgrec):
+        self.path_imgidx = path_imgidx
+        self.path_imgrec = path_imgrec
+        keys, offsets = read_index(path_imgidx)
+        self.keys = keys
+        self._key_to_pos = {int(k): i for i, k in enumerate(keys)}
+        self._offsets = offsets
+        self._file = None
+        self._mmap = None
+
+    def _open(self):
+        self._file = open(self.path_imgrec, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+        self._file = None
+        self._mmap = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_file'] = None
+        state['_mmap'] = None
+        return state
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def read_at(self, offset):
+        if self._mmap is None:
+            self._open()
+        view = memoryview(self._mmap)
+        parts = []
+        while True:
+            magic, lrecord = struct.unpack_from('<II', view, offset)
+            if magic != _MAGIC:
+                raise IOError('invalid RecordIO magic at offset %d of %s' % (offset, self.path_imgrec))
+            cflag = lrecord >> 29
+            length = lrecord & _LENGTH_MASK
+            start = offset + 8
+            data = view[start:start + length]
+            if cflag == 0:
+                return data
+            parts.append(data)
+            if cflag == 3:
+                return _MAGIC_BYTES.join(bytes(p) for p in parts)
+            offset = start + ((length + 3) & ~3)
+
+    def read_idx(self, idx):
+        return self.read_at(int(self._offsets[self._key_to_pos[int(idx)]]))
+
+    def __len__(self):
+        return len(self.keys)